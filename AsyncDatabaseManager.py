@@ -0,0 +1,102 @@
+import asyncio
+import os
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from typing import List, Optional
+from Event import Event
+from DatabaseManager import DatabaseManager, db
+from WriteBatcher import WriteBatcher
+
+
+# 异步数据库访问层：在有界线程池中执行同步的DatabaseManager方法，避免阻塞事件循环
+class AsyncDatabaseManager:
+    def __init__(self, database: DatabaseManager, max_workers: Optional[int] = None):
+        """
+        初始化异步数据库访问层
+
+        Args:
+            database: 同步数据库管理器
+            max_workers: 同时执行数据库操作的最大线程数
+        """
+        if max_workers is None:
+            max_workers = int(os.getenv("DB_MAX_WORKERS", database.pool.max_readers + 1))
+        self.db = database
+        self.max_workers = max(1, max_workers)
+        self.executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="db")
+        # 单个事件的创建/更新/删除经组提交合并执行
+        self.writes = WriteBatcher(self)
+        self._sync_lock: Optional[asyncio.Lock] = None
+        self._sync_requested = 0
+        self._sync_completed = 0
+    
+    async def run(self, func, *args, **kwargs):
+        """在数据库线程池中执行任意同步函数"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, partial(func, *args, **kwargs))
+    
+    async def create_event(self, event: Event) -> Event:
+        return await self.writes.submit(self.db.create_event, event)
+    
+    async def get_events_in_range(self, start_date: str, end_date: str, tz: Optional[str] = None) -> List[Event]:
+        return await self.run(self.db.get_events_in_range, start_date, end_date, tz)
+    
+    async def get_all_events(self) -> List[Event]:
+        return await self.run(self.db.get_all_events)
+    
+    async def get_events_page(self, limit: int, after: Optional[tuple] = None,
+                              start_date: Optional[str] = None, end_date: Optional[str] = None) -> tuple:
+        return await self.run(self.db.get_events_page, limit, after, start_date, end_date)
+    
+    async def update_event(self, event: Event) -> Optional[Event]:
+        return await self.writes.submit(self.db.update_event, event)
+    
+    async def delete_event(self, event_id: str) -> bool:
+        return await self.writes.submit(self.db.delete_event, event_id)
+    
+    async def get_event_by_id(self, event_id: str) -> Optional[Event]:
+        return await self.run(self.db.get_event_by_id, event_id)
+    
+    async def get_daily_counts(self, start_date: str, end_date: str) -> dict:
+        return await self.run(self.db.get_daily_counts, start_date, end_date)
+    
+    async def search_events(self, query: str, limit: int = 20, start_date: Optional[str] = None,
+                            end_date: Optional[str] = None, prefix: bool = True) -> List[Event]:
+        return await self.run(self.db.search_events, query, limit, start_date, end_date, prefix)
+    
+    async def apply_batch(self, creates: List[Event] = (), updates: List[Event] = (),
+                          deletes: List[str] = ()) -> dict:
+        return await self.run(self.db.apply_batch, creates, updates, deletes)
+    
+    async def import_events(self, events: List[Event]) -> dict:
+        return await self.run(self.db.import_events, events)
+    
+    async def delete_events_in_range(self, start_date: str, end_date: str) -> dict:
+        return await self.run(self.db.delete_events_in_range, start_date, end_date)
+    
+    async def get_current_seq(self) -> int:
+        return await self.run(self.db.get_current_seq)
+    
+    async def get_changes_since(self, since_seq: int, start_date: str, end_date: str,
+                                tz: Optional[str] = None) -> dict:
+        return await self.run(self.db.get_changes_since, since_seq, start_date, end_date, tz)
+    
+    async def sync_external_changes(self):
+        """
+        应用其他worker的写入。并发的请求合并：正在同步时到达的请求只会再触发一次同步，
+        且每个请求返回时，它之前提交的变更都已应用
+        """
+        if self._sync_lock is None:
+            self._sync_lock = asyncio.Lock()
+        self._sync_requested += 1
+        requested = self._sync_requested
+        async with self._sync_lock:
+            if self._sync_completed >= requested:
+                return
+            target = self._sync_requested
+            await self.run(self.db.sync_external_changes)
+            self._sync_completed = target
+    
+    def shutdown(self):
+        self.executor.shutdown(wait=True)
+
+async_db = AsyncDatabaseManager(db)
@@ -0,0 +1,219 @@
+import asyncio
+import fcntl
+import json
+import os
+import time
+import uuid
+from typing import Awaitable, Callable, Dict, Optional, Set, Tuple
+from logger import logger
+from EventSerializer import dumps
+
+
+Handler = Callable[[dict], Awaitable[None]]
+
+# 单条消息（一行JSON）的最大长度，批量操作的广播可能较大
+LINE_LIMIT = 64 * 1024 * 1024
+
+
+# 广播背板：在多个worker/节点之间共享变更和在线人数
+class Backplane:
+    distributed = False
+
+    def __init__(self, presence_ttl: float = 15.0):
+        """
+        初始化背板
+
+        Args:
+            presence_ttl: 其他节点的在线人数超过该时间未刷新即视为该节点已离线 (秒)
+        """
+        self.node_id = uuid.uuid4().hex[:12]
+        self.presence_ttl = presence_ttl
+        self.handler: Optional[Handler] = None
+        self.remote_counts: Dict[str, Tuple[int, float]] = {}
+        self.stats = {"published": 0, "received": 0, "dropped": 0, "reconnects": 0}
+
+    async def start(self, handler: Handler):
+        """开始接收其他节点的消息，handler 按到达顺序逐条调用"""
+        self.handler = handler
+
+    async def publish(self, message: dict):
+        """发布消息给其他节点（不会回到本节点）"""
+
+    async def close(self):
+        pass
+
+    def update_remote_count(self, node: str, count: int) -> bool:
+        """记录其他节点的在线人数，返回总数是否变化"""
+        previous = self.remote_counts.get(node)
+        if count <= 0:
+            self.remote_counts.pop(node, None)
+        else:
+            self.remote_counts[node] = (count, time.monotonic() + self.presence_ttl)
+        return (previous[0] if previous else 0) != max(count, 0)
+
+    def expire_remote_counts(self) -> bool:
+        """移除过期节点，返回是否有节点被移除"""
+        now = time.monotonic()
+        expired = [node for node, (_, expires) in self.remote_counts.items() if expires < now]
+        for node in expired:
+            del self.remote_counts[node]
+        return bool(expired)
+
+    def remote_total(self) -> int:
+        return sum(count for count, _ in self.remote_counts.values())
+
+    def get_stats(self) -> dict:
+        stats = dict(self.stats)
+        stats["backend"] = type(self).__name__
+        stats["node_id"] = self.node_id
+        stats["remote_nodes"] = len(self.remote_counts)
+        return stats
+
+
+class LocalBackplane(Backplane):
+    """进程内默认实现：单个worker，发布的消息没有接收者"""
+
+
+class UnixSocketBackplane(Backplane):
+    """
+    基于Unix域套接字的本机背板：各worker通过文件锁选出一个代理进程，
+    代理把每行JSON消息转发给其他所有连接。代理所在的worker退出后，其余worker重新选举并重连
+    """
+    distributed = True
+
+    def __init__(self, path: str, presence_ttl: float = 15.0, max_buffer: int = 4 * 1024 * 1024):
+        """
+        Args:
+            path: 套接字路径，同一路径的worker组成一个集群
+            max_buffer: 单个连接未发送数据的上限 (字节)，超过后丢弃消息（代理端断开该连接）
+        """
+        super().__init__(presence_ttl)
+        self.path = path
+        self.max_buffer = max_buffer
+        self._lock_file = None
+        self._server: Optional[asyncio.AbstractServer] = None
+        self._peers: Set[asyncio.StreamWriter] = set()
+        self._writer: Optional[asyncio.StreamWriter] = None
+        self._task: Optional[asyncio.Task] = None
+        self._closed = False
+
+    async def start(self, handler: Handler):
+        await super().start(handler)
+        self._task = asyncio.create_task(self._run())
+
+    def _try_become_broker(self) -> bool:
+        if self._lock_file is None:
+            self._lock_file = open(self.path + ".lock", "a+")
+        try:
+            fcntl.flock(self._lock_file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            return False
+        return True
+
+    async def _start_broker(self):
+        # 持有文件锁才会走到这里，残留的套接字文件可以安全删除
+        if os.path.exists(self.path):
+            os.unlink(self.path)
+        self._server = await asyncio.start_unix_server(self._serve_peer, path=self.path, limit=LINE_LIMIT)
+        logger.info(f"背板代理已启动: {self.path}")
+
+    async def _serve_peer(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        self._peers.add(writer)
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                for peer in list(self._peers):
+                    if peer is writer:
+                        continue
+                    if peer.transport.get_write_buffer_size() > self.max_buffer:
+                        # 跟不上的worker断开，重连后会整体同步
+                        self._peers.discard(peer)
+                        peer.close()
+                        continue
+                    peer.write(line)
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            self._peers.discard(writer)
+            writer.close()
+
+    async def _run(self):
+        delay = 0.05
+        while not self._closed:
+            if self._server is None and self._try_become_broker():
+                await self._start_broker()
+            try:
+                reader, writer = await asyncio.open_unix_connection(self.path, limit=LINE_LIMIT)
+            except OSError:
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, 1.0)
+                continue
+
+            delay = 0.05
+            self._writer = writer
+            # 断开期间的变更无法补发：通知本节点从共享数据库整体同步
+            await self._deliver({"type": "resync", "node": None})
+            try:
+                while True:
+                    line = await reader.readline()
+                    if not line:
+                        break
+                    message = json.loads(line)
+                    if message.get("node") != self.node_id:
+                        await self._deliver(message)
+            except (ConnectionError, ValueError) as e:
+                logger.warning(f"背板连接中断: {e!r}")
+            finally:
+                self._writer = None
+                writer.close()
+            if not self._closed:
+                self.stats["reconnects"] += 1
+
+    async def _deliver(self, message: dict):
+        self.stats["received"] += 1
+        try:
+            await self.handler(message)
+        except Exception as e:
+            logger.error(f"处理背板消息失败: {e!r}")
+
+    async def publish(self, message: dict):
+        writer = self._writer
+        if writer is None or writer.transport.get_write_buffer_size() > self.max_buffer:
+            self.stats["dropped"] += 1
+            return
+        message["node"] = self.node_id
+        writer.write(dumps(message).encode() + b"\n")
+        self.stats["published"] += 1
+
+    async def close(self):
+        self._closed = True
+        if self._writer is not None:
+            self._writer.close()
+        if self._task is not None:
+            self._task.cancel()
+        if self._server is not None:
+            self._server.close()
+            for peer in list(self._peers):
+                peer.close()
+            if os.path.exists(self.path):
+                os.unlink(self.path)
+        if self._lock_file is not None:
+            self._lock_file.close()
+
+
+def create_backplane() -> Backplane:
+    """
+    按环境变量创建背板：BACKPLANE=local|unix，BACKPLANE_PATH 为套接字路径。
+    未指定且 WORKERS > 1 时使用 unix
+    """
+    kind = os.getenv("BACKPLANE")
+    if kind is None:
+        kind = "unix" if int(os.getenv("WORKERS", 1)) > 1 else "local"
+    ttl = float(os.getenv("PRESENCE_TTL", 15))
+    if kind == "unix":
+        return UnixSocketBackplane(os.getenv("BACKPLANE_PATH", "/tmp/calendar-backplane.sock"), ttl)
+    if kind != "local":
+        raise ValueError(f"未知的背板类型: {kind}")
+    return LocalBackplane(ttl)
@@ -0,0 +1,155 @@
+import os
+import re
+import threading
+import time
+from datetime import date, datetime, timedelta, timezone, tzinfo
+from typing import Optional, Tuple
+import pytz
+
+
+# 日历时区：事件的 date / time 都是该时区的本地日期和时间
+CALENDAR_TZ = pytz.timezone(os.getenv("CALENDAR_TZ", "Asia/Shanghai"))
+
+# 日期在数据库中另有整数形式：1970-01-01 起的天数 (day) 和当天0点起的分钟数 (minute，全天事件为NULL)
+EPOCH_ORDINAL = date(1970, 1, 1).toordinal()
+MIN_DAY = date.min.toordinal() - EPOCH_ORDINAL
+MAX_DAY = date.max.toordinal() - EPOCH_ORDINAL
+
+DATE_RE = re.compile(r"\d{4}-\d{2}-\d{2}")
+TIME_RE = re.compile(r"(\d{1,2}):(\d{2})(?::\d{2}(?:\.\d+)?)?")
+
+
+def parse_date(value: str) -> str:
+    """校验 YYYY-MM-DD 格式的日期，不合法时抛出ValueError"""
+    if not isinstance(value, str) or not DATE_RE.fullmatch(value):
+        raise ValueError(f"日期必须是 YYYY-MM-DD 格式: {value}")
+    try:
+        date.fromisoformat(value)
+    except ValueError:
+        raise ValueError(f"日期不存在: {value}")
+    return value
+
+
+def parse_time(value: Optional[str]) -> Optional[str]:
+    """校验时间并规范为 HH:MM（秒被舍去），空值表示全天事件"""
+    if value is None or value == "":
+        return None
+    match = TIME_RE.fullmatch(value) if isinstance(value, str) else None
+    if match is None or int(match.group(1)) > 23 or int(match.group(2)) > 59:
+        raise ValueError(f"时间必须是 HH:MM 格式: {value}")
+    return f"{int(match.group(1)):02d}:{match.group(2)}"
+
+
+def day_number(value: str) -> int:
+    """YYYY-MM-DD -> 1970-01-01 起的天数"""
+    return date.fromisoformat(value).toordinal() - EPOCH_ORDINAL
+
+
+def day_to_date(day: int) -> str:
+    return date.fromordinal(day + EPOCH_ORDINAL).isoformat()
+
+
+def minute_of_day(value: Optional[str]) -> Optional[int]:
+    """HH:MM -> 当天0点起的分钟数，全天事件为None"""
+    if not value:
+        return None
+    hours, _, minutes = value.partition(":")
+    return int(hours) * 60 + int(minutes[:2])
+
+
+def get_timezone(name: Optional[str]) -> Optional[tzinfo]:
+    """按IANA名称取时区；为空或与日历时区相同时返回None，名称未知时抛出ValueError"""
+    if not name or name == CALENDAR_TZ.zone:
+        return None
+    try:
+        return pytz.timezone(name)
+    except pytz.UnknownTimeZoneError:
+        raise ValueError(f"未知的时区: {name}")
+
+
+def parse_timezone(value: Optional[str]) -> Optional[str]:
+    """校验时区名称（用于模型字段），不合法时抛出ValueError"""
+    get_timezone(value)
+    return value or None
+
+
+class ClientWindow:
+    """
+    客户端时区中的日期范围 [start_date, end_date]，换算为日历时区的 (day, minute) 区间
+
+    有具体时间的事件按时刻判断是否落在客户端的这些天内；
+    全天事件没有时刻，按日期本身判断（在任何时区都显示在同一天）
+    """
+    __slots__ = ("start_day", "end_day", "lower", "upper")
+
+    def __init__(self, start_date: str, end_date: str, tz: tzinfo):
+        self.start_day = day_number(start_date)
+        self.end_day = day_number(end_date)
+        self.lower = self._calendar_key(date.fromisoformat(start_date), tz)
+        self.upper = self._calendar_key(date.fromisoformat(end_date) + timedelta(days=1), tz)
+
+    @staticmethod
+    def _calendar_key(day: date, tz: tzinfo) -> Tuple[int, int]:
+        moment = tz.localize(datetime(day.year, day.month, day.day)).astimezone(CALENDAR_TZ)
+        return moment.toordinal() - EPOCH_ORDINAL, moment.hour * 60 + moment.minute
+
+    def calendar_range(self) -> Tuple[str, str]:
+        """需要从日历时区读取的日期范围（覆盖两种判断方式）"""
+        return (day_to_date(min(self.start_day, self.lower[0])),
+                day_to_date(max(self.end_day, self.upper[0])))
+
+    def contains(self, event_date: str, event_time: Optional[str]) -> bool:
+        day = day_number(event_date)
+        if not event_time:
+            return self.start_day <= day <= self.end_day
+        return self.lower <= (day, minute_of_day(event_time)) < self.upper
+
+
+class MonotonicClock:
+    """
+    写入时间戳：启动时对齐一次系统时间，之后按单调时钟推进，定期重新对齐。
+    系统时间被回拨时也不会倒退，同一进程内的时间戳严格递增（至少相差1微秒）
+    """
+    def __init__(self, tz: tzinfo = CALENDAR_TZ, resync: float = 60.0):
+        self.tz = tz
+        self.resync_us = int(resync * 1_000_000)
+        self._lock = threading.Lock()
+        self._last = 0
+        self._sync()
+
+    def _sync(self):
+        self._wall = time.time_ns() // 1000
+        self._mono = time.monotonic_ns() // 1000
+        # 时区偏移随对齐一起更新（夏令时切换最多延迟一个对齐周期）
+        offset = datetime.fromtimestamp(self._wall // 1_000_000, self.tz).utcoffset()
+        self._offset = timezone(offset)
+        self._second = None
+
+    def _advance(self) -> int:
+        mono = time.monotonic_ns() // 1000
+        if mono - self._mono >= self.resync_us:
+            self._sync()
+        now = self._wall + mono - self._mono
+        if now <= self._last:
+            now = self._last + 1
+        self._last = now
+        return now
+
+    def now_us(self) -> int:
+        """当前时刻（Unix纪元起的微秒数）"""
+        with self._lock:
+            return self._advance()
+
+    def now_iso(self) -> str:
+        """当前时刻的ISO 8601文本（日历时区，总是带微秒），例如 2024-03-15T09:30:00.000123+08:00"""
+        with self._lock:
+            second, micros = divmod(self._advance(), 1_000_000)
+            if second != self._second:
+                # 同一秒内只格式化一次日期、时间和偏移部分
+                text = datetime.fromtimestamp(second, self._offset).isoformat()
+                self._prefix, self._suffix = text[:19], text[19:]
+                self._second = second
+            return f"{self._prefix}.{micros:06d}{self._suffix}"
+
+
+clock = MonotonicClock()
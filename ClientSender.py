@@ -0,0 +1,80 @@
+import asyncio
+from typing import Awaitable, Callable, Union
+from fastapi import WebSocket
+from logger import logger
+from Metrics import metrics
+
+
+SEND_FAILURES = metrics.counter("calendar_ws_send_failures_total", "WebSocket帧发送失败次数",
+                                "reason", ("timeout", "error"))
+SEND_TIMEOUTS = SEND_FAILURES.labels("timeout")
+SEND_ERRORS = SEND_FAILURES.labels("error")
+
+
+Frame = Union[str, bytes]
+
+
+# 单个WebSocket连接的有界发送队列，由独立的写任务按顺序发送
+class ClientSender:
+    def __init__(self, websocket: WebSocket, on_error: Callable[[WebSocket], Awaitable[None]],
+                 max_queue: int = 256, send_timeout: float = 10.0):
+        """
+        初始化发送队列
+
+        Args:
+            websocket: 目标连接
+            on_error: 发送失败或超时时的回调
+            max_queue: 队列高水位，超过后由调用方执行慢消费者策略
+            send_timeout: 单帧发送超时 (秒)
+        """
+        self.websocket = websocket
+        self.on_error = on_error
+        self.send_timeout = send_timeout
+        self.queue: "asyncio.Queue[Frame]" = asyncio.Queue(maxsize=max_queue)
+        self.dropped = 0
+        # 协商后的帧格式，None 为默认的JSON文本
+        self.wire = None
+        self.closed = False
+        self.task: asyncio.Task = None
+    
+    def start(self):
+        self.task = asyncio.create_task(self._run())
+    
+    def enqueue(self, frame: Frame) -> bool:
+        """放入一帧，队列已满时返回False"""
+        if self.closed:
+            return True
+        try:
+            self.queue.put_nowait(frame)
+            return True
+        except asyncio.QueueFull:
+            self.dropped += 1
+            return False
+    
+    @property
+    def depth(self) -> int:
+        return self.queue.qsize()
+    
+    async def _run(self):
+        websocket = self.websocket
+        queue = self.queue
+        try:
+            while True:
+                frame = await queue.get()
+                if isinstance(frame, bytes):
+                    await asyncio.wait_for(websocket.send_bytes(frame), self.send_timeout)
+                else:
+                    await asyncio.wait_for(websocket.send_text(frame), self.send_timeout)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            if not self.closed:
+                (SEND_TIMEOUTS if isinstance(e, asyncio.TimeoutError) else SEND_ERRORS).inc()
+                logger.error(f"发送消息失败: {e!r}")
+                await self.on_error(websocket)
+    
+    def stop(self):
+        """停止写任务并丢弃未发送的帧"""
+        self.closed = True
+        if self.task is not None and self.task is not asyncio.current_task():
+            self.task.cancel()
@@ -0,0 +1,329 @@
+import asyncio
+import os
+import random
+import time
+from typing import Awaitable, Callable, Dict, Optional, Tuple
+from fastapi import WebSocket
+from pydantic import BaseModel, validator
+from logger import logger
+from ClientSender import ClientSender
+from SubscriptionIndex import SubscriptionIndex
+from EventSerializer import dumps
+from Presence import PresenceBroadcaster
+from Heartbeat import HeartbeatMonitor
+from Backplane import Backplane, LocalBackplane, create_backplane
+from Event import Event
+from WireFormat import WireFormat, get_stats as get_wire_stats
+from Recurrence import series_end, occurs_in_range
+from Metrics import metrics, COUNT_BUCKETS
+from CalendarTime import parse_date, parse_timezone, get_timezone, ClientWindow
+
+
+FANOUT_CLIENTS = metrics.histogram("calendar_broadcast_clients", "每次广播的接收客户端数",
+                                   buckets=COUNT_BUCKETS).default
+FANOUT_SECONDS = metrics.histogram("calendar_broadcast_seconds", "每次广播查找订阅并入队的耗时").default
+CONNECTION_EVENTS = metrics.counter("calendar_ws_connection_events_total", "WebSocket连接建立/断开/驱逐次数",
+                                    "event", ("connect", "disconnect", "evict", "reap", "reject"))
+CONNECTS = CONNECTION_EVENTS.labels("connect")
+DISCONNECTS = CONNECTION_EVENTS.labels("disconnect")
+EVICTIONS = CONNECTION_EVENTS.labels("evict")
+REAPS = CONNECTION_EVENTS.labels("reap")
+REJECTS = CONNECTION_EVENTS.labels("reject")
+FRAMES_DROPPED = metrics.counter("calendar_ws_frames_dropped_total", "发送队列已满被丢弃的帧数").default
+
+
+class ViewRange(BaseModel):
+    start_date: str
+    end_date: str
+    tz: Optional[str] = None    # 客户端时区，日期范围按该时区理解
+    
+    _check_start = validator("start_date", allow_reuse=True)(parse_date)
+    _check_end = validator("end_date", allow_reuse=True)(parse_date)
+    _check_tz = validator("tz", allow_reuse=True)(parse_timezone)
+    
+    def calendar_range(self) -> Tuple[str, str]:
+        """日历时区中覆盖该视图的日期范围（订阅和增量同步使用，可能比视图多出首尾各一天）"""
+        zone = get_timezone(self.tz)
+        if zone is None:
+            return self.start_date, self.end_date
+        return ClientWindow(self.start_date, self.end_date, zone).calendar_range()
+
+# WebSocket连接管理器
+class ConnectionManager:
+    def __init__(self, send_queue_size: int = None, slow_consumer_policy: str = None,
+                 send_timeout: float = None, backplane: Backplane = None, max_connections: int = None,
+                 retry_after: float = None):
+        """
+        初始化连接管理器
+
+        Args:
+            send_queue_size: 每个连接发送队列的高水位
+            slow_consumer_policy: 队列满时的策略，"disconnect" 断开慢消费者，"drop" 丢弃新消息
+            send_timeout: 单帧发送超时 (秒)
+            backplane: 与其他worker共享变更和在线人数的背板，默认只有本进程
+            max_connections: 本worker的连接数上限，0 表示不限制
+            retry_after: 超过上限时建议客户端的重连等待时间 (秒)，实际值带随机抖动
+        """
+        self.send_queue_size = send_queue_size or int(os.getenv("WS_SEND_QUEUE_SIZE", 256))
+        self.slow_consumer_policy = slow_consumer_policy or os.getenv("WS_SLOW_CONSUMER_POLICY", "disconnect")
+        self.send_timeout = send_timeout or float(os.getenv("WS_SEND_TIMEOUT", 10))
+        self.max_connections = (max_connections if max_connections is not None
+                                else int(os.getenv("WS_MAX_CONNECTIONS", 10000)))
+        self.retry_after = retry_after or float(os.getenv("WS_RETRY_AFTER", 5))
+        
+        self.active_connections: Dict[WebSocket, ClientSender] = {}
+        self.client_view_ranges: Dict[WebSocket, ViewRange] = {}
+        self.subscriptions = SubscriptionIndex()
+        self.presence = PresenceBroadcaster(self)
+        self.heartbeat = HeartbeatMonitor(self)
+        self.backplane = backplane or LocalBackplane()
+        # 收到其他worker的变更后、向本地客户端广播前调用（刷新本进程的缓存）
+        self.on_remote_change: Optional[Callable[[], Awaitable[None]]] = None
+        self._heartbeat_task: Optional[asyncio.Task] = None
+        self._published_count = None
+        self.stats = {
+            "frames_enqueued": 0,
+            "frames_dropped": 0,
+            "slow_consumers_evicted": 0,
+            "connections_rejected": 0,
+        }
+    
+    async def connect(self, websocket: WebSocket) -> bool:
+        """接受连接；超过连接数上限时告知客户端稍后重试并关闭，返回是否已接纳"""
+        await websocket.accept()
+        if self.max_connections and len(self.active_connections) >= self.max_connections:
+            await self.reject(websocket)
+            return False
+        sender = ClientSender(websocket, self.disconnect_websocket,
+                              max_queue=self.send_queue_size, send_timeout=self.send_timeout)
+        sender.start()
+        self.active_connections[websocket] = sender
+        self.heartbeat.touch(websocket)
+        CONNECTS.inc()
+        logger.info(f"新客户端连接，当前在线用户: {len(self.active_connections)}")
+        self.presence.mark_changed()
+        return True
+    
+    def disconnect(self, websocket: WebSocket) -> bool:
+        sender = self.active_connections.pop(websocket, None)
+        if sender is not None:
+            sender.stop()
+        if websocket in self.client_view_ranges:
+            del self.client_view_ranges[websocket]
+        self.subscriptions.remove(websocket)
+        self.presence.forget(websocket)
+        self.heartbeat.forget(websocket)
+        if sender is None:
+            return False
+        DISCONNECTS.inc()
+        logger.info(f"客户端断开连接，当前在线用户: {len(self.active_connections)}")
+        self.presence.mark_changed()
+        return True
+    
+    async def reject(self, websocket: WebSocket):
+        """
+        连接数已满：发送带抖动的 retry_after 后以 1013 (Try Again Later) 关闭，
+        避免被拒绝的客户端在同一时刻集中重连
+        """
+        self.stats["connections_rejected"] += 1
+        REJECTS.inc()
+        retry_after = round(self.retry_after * (1 + random.random()), 1)
+        logger.warning(f"连接数已达上限 ({self.max_connections})，拒绝新连接")
+        try:
+            await websocket.send_text(dumps({"type": "overloaded", "retry_after": retry_after}))
+            await websocket.close(code=1013)
+        except Exception:
+            pass
+    
+    def reap(self, websocket: WebSocket) -> bool:
+        """回收心跳超时的连接，返回是否确实移除了连接"""
+        if not self.disconnect(websocket):
+            return False
+        REAPS.inc()
+        asyncio.create_task(self.evict(websocket, code=1001))
+        return True
+    
+    @staticmethod
+    def encode(message) -> str:
+        """消息可以是字典或已经编码好的JSON文本"""
+        if isinstance(message, str):
+            return message
+        return dumps(message)
+    
+    def enqueue_frame(self, websocket: WebSocket, sender: ClientSender, frame, encoded: dict = None) -> None:
+        """
+        放入一帧JSON文本，按客户端协商的格式转换
+
+        Args:
+            encoded: 同一帧发给多个客户端时传入，按格式缓存转换结果
+        """
+        wire = sender.wire
+        if wire is not None:
+            if encoded is None:
+                frame = wire.encode(frame)
+            else:
+                converted = encoded.get(wire)
+                if converted is None:
+                    converted = encoded[wire] = wire.encode(frame)
+                frame = converted
+        if sender.enqueue(frame):
+            self.stats["frames_enqueued"] += 1
+            return
+        
+        # 发送队列超过高水位：慢消费者
+        self.stats["frames_dropped"] += 1
+        FRAMES_DROPPED.inc()
+        if self.slow_consumer_policy == "disconnect" and self.disconnect(websocket):
+            self.stats["slow_consumers_evicted"] += 1
+            EVICTIONS.inc()
+            logger.warning(f"客户端发送队列已满 ({sender.depth})，断开慢消费者")
+            asyncio.create_task(self.evict(websocket))
+    
+    async def send_personal_message(self, message: dict, websocket: WebSocket):
+        sender = self.active_connections.get(websocket)
+        if sender is not None:
+            self.enqueue_frame(websocket, sender, self.encode(message))
+    
+    def _fanout(self, message, clients, start: float):
+        """把同一帧（每次广播只序列化一次）放入各客户端的发送队列，并记录扇出规模和耗时"""
+        if clients:
+            frame = self.encode(message)
+            encoded = {}
+            for connection in clients:
+                sender = self.active_connections.get(connection)
+                if sender is not None:
+                    self.enqueue_frame(connection, sender, frame, encoded)
+        FANOUT_CLIENTS.observe(len(clients))
+        FANOUT_SECONDS.observe(time.perf_counter() - start)
+    
+    async def broadcast_all(self, message: dict):
+        """向所有worker的全部客户端广播（例如批量导入后通知客户端重新同步当前视图）"""
+        frame = self.encode(message)
+        self._fanout(frame, list(self.active_connections), time.perf_counter())
+        if self.backplane.distributed:
+            await self.backplane.publish({"type": "broadcast", "message": frame})
+    
+    async def broadcast_to_clients_for_events(self, message: dict, events, exclude: WebSocket = None):
+        """向能看到任一事件的客户端广播一次，并通过背板发给其他worker"""
+        frame = self.encode(message)
+        self._broadcast_local(frame, events, exclude)
+        if self.backplane.distributed:
+            await self.backplane.publish({
+                "type": "mutation",
+                "message": frame,
+                "events": [{"id": event.id, "title": event.title, "date": event.date,
+                            "recurrence": event.recurrence and event.recurrence.dict()} for event in events],
+            })
+    
+    def _broadcast_local(self, frame, events, exclude: WebSocket = None):
+        """
+        单次事件按日期查索引；重复系列先按系列跨度取候选客户端，
+        再按各客户端的视图范围确认其中确有发生
+        """
+        start = time.perf_counter()
+        dates = []
+        clients = set()
+        for event in events:
+            if event.recurrence is None:
+                dates.append(event.date)
+                continue
+            end = series_end(event.recurrence, event.date)
+            for client in self.subscriptions.clients_for_range(event.date, end):
+                view = self.subscriptions.ranges.get(client)
+                if view is not None and occurs_in_range(event, view[0], view[1]):
+                    clients.add(client)
+        for event_date in set(dates):
+            clients |= self.subscriptions.clients_for_date(event_date)
+        clients.discard(exclude)
+        self._fanout(frame, clients, start)
+    
+    def set_wire_format(self, websocket: WebSocket, wire: Optional[WireFormat]):
+        """切换连接之后发送的帧格式（已入队的帧不受影响）"""
+        sender = self.active_connections.get(websocket)
+        if sender is not None:
+            sender.wire = wire
+    
+    def online_count(self) -> int:
+        """所有worker的在线人数"""
+        return len(self.active_connections) + self.backplane.remote_total()
+    
+    async def start_backplane(self, heartbeat: float = None):
+        """开始接收其他worker的消息，并定期发布本worker的在线人数"""
+        await self.backplane.start(self.handle_backplane_message)
+        if self.backplane.distributed:
+            interval = heartbeat or self.backplane.presence_ttl / 3
+            self._heartbeat_task = asyncio.create_task(self._presence_heartbeat(interval))
+    
+    async def stop_backplane(self):
+        if self._heartbeat_task is not None:
+            self._heartbeat_task.cancel()
+        if self.backplane.distributed:
+            await self.backplane.publish({"type": "presence", "count": 0})
+        await self.backplane.close()
+    
+    async def _presence_heartbeat(self, interval: float):
+        while True:
+            await asyncio.sleep(interval)
+            await self.publish_presence(force=True)
+            if self.backplane.expire_remote_counts():
+                self.presence.mark_changed()
+    
+    async def publish_presence(self, force: bool = False):
+        """发布本worker的在线人数（人数未变化时只在心跳中重复发送）"""
+        count = len(self.active_connections)
+        if not self.backplane.distributed or (count == self._published_count and not force):
+            return
+        self._published_count = count
+        await self.backplane.publish({"type": "presence", "count": count})
+    
+    async def handle_backplane_message(self, message: dict):
+        """处理其他worker发来的消息（按到达顺序逐条处理）"""
+        kind = message.get("type")
+        if kind == "mutation":
+            if self.on_remote_change is not None:
+                await self.on_remote_change()
+            events = [Event(**event) for event in message["events"]]
+            self._broadcast_local(message["message"], events)
+        elif kind == "broadcast":
+            if self.on_remote_change is not None:
+                await self.on_remote_change()
+            self._fanout(message["message"], list(self.active_connections), time.perf_counter())
+        elif kind == "presence":
+            if self.backplane.update_remote_count(message["node"], message["count"]):
+                self.presence.mark_changed()
+        elif kind == "resync":
+            if self.on_remote_change is not None:
+                await self.on_remote_change()
+            # 新连上的节点需要尽快知道本节点的人数
+            await self.publish_presence(force=True)
+    
+    async def disconnect_websocket(self, websocket: WebSocket):
+        self.disconnect(websocket)
+    
+    async def evict(self, websocket: WebSocket, code: int = 1013):
+        """关闭已被移除的慢消费者或超时连接，客户端重连后会重新获取完整数据"""
+        try:
+            await websocket.close(code=code)
+        except Exception:
+            pass
+    
+    def get_fanout_stats(self) -> dict:
+        """广播发送队列统计信息"""
+        depths = [sender.depth for sender in self.active_connections.values()]
+        stats = dict(self.stats)
+        stats["send_queue_size"] = self.send_queue_size
+        stats["slow_consumer_policy"] = self.slow_consumer_policy
+        stats["max_queue_depth"] = max(depths, default=0)
+        stats["queued_frames"] = sum(depths)
+        stats["presence_flushes"] = self.presence.flushes
+        stats["max_connections"] = self.max_connections
+        stats.update(self.heartbeat.stats)
+        stats["wire_formats"] = get_wire_stats()
+        return stats
+    
+    def update_client_view_range(self, websocket: WebSocket, view_range: ViewRange):
+        self.client_view_ranges[websocket] = view_range
+        self.subscriptions.add(websocket, *view_range.calendar_range())
+        logger.info(f"客户端视图范围更新: {view_range.start_date} - {view_range.end_date} ({view_range.tz or '日历时区'})")
+
+manager = ConnectionManager(backplane=create_backplane())
@@ -0,0 +1,237 @@
+import sqlite3
+import queue
+import threading
+import time
+from contextlib import contextmanager
+from logger import logger
+
+
+# SQLite长连接池：一个写连接 + N个读连接
+class ConnectionPool:
+    def __init__(self, db_path: str, readers: int = 4, cache_size_kb: int = 16384,
+                 mmap_size: int = 256 * 1024 * 1024, statement_cache_size: int = 256,
+                 busy_timeout_ms: int = 5000, acquire_timeout: float = 30.0, on_open=None):
+        """
+        初始化连接池
+
+        Args:
+            db_path: 数据库文件路径
+            readers: 读连接数量
+            cache_size_kb: 每个连接的页缓存大小 (KB)
+            mmap_size: 内存映射大小 (字节)
+            statement_cache_size: 每个连接缓存的预编译语句数量
+            busy_timeout_ms: 锁等待超时 (毫秒)
+            acquire_timeout: 获取读连接的最长等待时间 (秒)
+            on_open: 每个新连接打开后调用 on_open(conn)，用于注册自定义SQL函数
+        """
+        self.db_path = db_path
+        self.max_readers = max(1, readers)
+        self.cache_size_kb = cache_size_kb
+        self.mmap_size = mmap_size
+        self.statement_cache_size = statement_cache_size
+        self.busy_timeout_ms = busy_timeout_ms
+        self.acquire_timeout = acquire_timeout
+        self.on_open = on_open
+
+        self._writer: sqlite3.Connection = None
+        # 可重入：组提交的外层事务内，各操作再次进入 writer() 时使用保存点
+        self._writer_lock = threading.RLock()
+        self._writer_owner = None
+        self._savepoint_depth = 0
+        self._after_commit = []
+        self._readers: "queue.LifoQueue[sqlite3.Connection]" = queue.LifoQueue()
+        self._all_readers = []
+        self._open_lock = threading.Lock()
+        self._closed = False
+
+        self._stats = {
+            "connections_opened": 0,
+            "reader_acquires": 0,
+            "reader_waits": 0,
+            "writer_acquires": 0,
+            "writer_wait_seconds": 0.0,
+            "commits": 0,
+            "rollbacks": 0,
+        }
+        self._stats_lock = threading.Lock()
+
+    def _open(self, readonly: bool) -> sqlite3.Connection:
+        # isolation_level=None：事务由连接池显式控制
+        conn = sqlite3.connect(
+            self.db_path,
+            check_same_thread=False,
+            isolation_level=None,
+            cached_statements=self.statement_cache_size,
+        )
+        if self.db_path != ":memory:":
+            conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute(f"PRAGMA cache_size=-{int(self.cache_size_kb)}")
+        conn.execute(f"PRAGMA mmap_size={int(self.mmap_size)}")
+        conn.execute(f"PRAGMA busy_timeout={int(self.busy_timeout_ms)}")
+        conn.execute("PRAGMA temp_store=MEMORY")
+        if readonly:
+            conn.execute("PRAGMA query_only=1")
+        if self.on_open is not None:
+            self.on_open(conn)
+        with self._stats_lock:
+            self._stats["connections_opened"] += 1
+        return conn
+
+    def _writer_connection(self) -> sqlite3.Connection:
+        if self._writer is None:
+            self._writer = self._open(readonly=False)
+        return self._writer
+
+    @contextmanager
+    def writer(self):
+        """
+        获取唯一的写连接，在一个事务中执行，正常退出提交，异常回滚。
+        已在本线程的写事务中时嵌套为保存点：异常只回滚该段写入及其提交回调，由外层事务统一提交
+        """
+        if self._closed:
+            raise RuntimeError("连接池已关闭")
+        start = time.perf_counter()
+        with self._writer_lock:
+            if self._writer_owner is not None:
+                with self._savepoint() as conn:
+                    yield conn
+                return
+            waited = time.perf_counter() - start
+            conn = self._writer_connection()
+            with self._stats_lock:
+                self._stats["writer_acquires"] += 1
+                self._stats["writer_wait_seconds"] += waited
+            conn.execute("BEGIN IMMEDIATE")
+            self._writer_owner = threading.get_ident()
+            try:
+                yield conn
+            except BaseException:
+                self._writer_owner = None
+                self._after_commit.clear()
+                conn.execute("ROLLBACK")
+                with self._stats_lock:
+                    self._stats["rollbacks"] += 1
+                raise
+            else:
+                try:
+                    try:
+                        conn.execute("COMMIT")
+                    except BaseException:
+                        # COMMIT失败（如SQLITE_BUSY、磁盘错误）时事务仍处于打开状态，必须回滚，否则后续 BEGIN 全部失败
+                        if conn.in_transaction:
+                            conn.execute("ROLLBACK")
+                        with self._stats_lock:
+                            self._stats["rollbacks"] += 1
+                        raise
+                    self._writer_owner = None
+                    with self._stats_lock:
+                        self._stats["commits"] += 1
+                    # 提交后仍持有写锁时执行回调，保证回调顺序与提交顺序一致
+                    for callback in self._after_commit:
+                        callback()
+                finally:
+                    self._writer_owner = None
+                    self._after_commit.clear()
+
+    @contextmanager
+    def _savepoint(self):
+        conn = self._writer
+        mark = len(self._after_commit)
+        self._savepoint_depth += 1
+        name = f"sp{self._savepoint_depth}"
+        conn.execute(f"SAVEPOINT {name}")
+        try:
+            yield conn
+        except BaseException:
+            del self._after_commit[mark:]
+            conn.execute(f"ROLLBACK TO {name}")
+            conn.execute(f"RELEASE {name}")
+            raise
+        else:
+            conn.execute(f"RELEASE {name}")
+        finally:
+            self._savepoint_depth -= 1
+
+    def data_version(self):
+        """
+        写连接上的 PRAGMA data_version：其他连接（包括其他进程）提交写入后变化，本连接池自己的写入不改变它。
+        写连接正被其他线程使用时不等待，返回None
+        """
+        if self._closed or not self._writer_lock.acquire(blocking=False):
+            return None
+        try:
+            return self._writer_connection().execute("PRAGMA data_version").fetchone()[0]
+        finally:
+            self._writer_lock.release()
+    
+    def in_transaction(self) -> bool:
+        """当前线程是否处于尚未提交的写事务中"""
+        return self._writer_owner == threading.get_ident()
+
+    def after_commit(self, callback):
+        """在当前写事务提交成功后执行回调（只能在 writer() 内部调用）"""
+        self._after_commit.append(callback)
+
+    @contextmanager
+    def reader(self):
+        """从池中借出一个读连接，用完归还"""
+        if self._closed:
+            raise RuntimeError("连接池已关闭")
+        conn = self._acquire_reader()
+        try:
+            yield conn
+        finally:
+            if self._closed:
+                conn.close()
+            else:
+                self._readers.put(conn)
+
+    def _acquire_reader(self) -> sqlite3.Connection:
+        with self._stats_lock:
+            self._stats["reader_acquires"] += 1
+        try:
+            return self._readers.get_nowait()
+        except queue.Empty:
+            pass
+
+        # 未达到上限时按需新建读连接
+        with self._open_lock:
+            if len(self._all_readers) < self.max_readers:
+                conn = self._open(readonly=True)
+                self._all_readers.append(conn)
+                return conn
+
+        with self._stats_lock:
+            self._stats["reader_waits"] += 1
+        try:
+            return self._readers.get(timeout=self.acquire_timeout)
+        except queue.Empty:
+            raise TimeoutError(f"等待数据库读连接超时 ({self.acquire_timeout}s)")
+
+    def stats(self) -> dict:
+        """连接池统计信息"""
+        with self._stats_lock:
+            stats = dict(self._stats)
+        stats["writer_open"] = self._writer is not None
+        stats["writer_busy"] = self._writer_owner is not None
+        stats["readers_max"] = self.max_readers
+        stats["readers_open"] = len(self._all_readers)
+        stats["readers_idle"] = self._readers.qsize()
+        stats["writer_wait_seconds"] = round(stats["writer_wait_seconds"], 6)
+        return stats
+
+    def close(self):
+        """关闭所有连接"""
+        self._closed = True
+        with self._writer_lock:
+            if self._writer is not None:
+                self._writer.close()
+                self._writer = None
+        while True:
+            try:
+                self._readers.get_nowait().close()
+            except queue.Empty:
+                break
+        self._all_readers = []
+        logger.info("数据库连接池已关闭")
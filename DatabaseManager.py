@@ -1,184 +1,1082 @@
 import sqlite3
+import os
+import json
+import base64
+import time
 from Event import Event
 import uuid 
 from typing import List, Optional
 from datetime import datetime, timezone, timedelta
-import pytz
 from logger import logger
+from ConnectionPool import ConnectionPool
+from RangeCache import RangeCache
+from MemoryEventStore import MemoryEventStore
+from Recurrence import (validate_recurrence, to_rrule, from_rrule, series_end, expand_event,
+                        expand_event_after, occurs_in_range)
+from Metrics import instrumented
+from Search import register_functions, build_match_query, index_events, index_series, index_missing
+from Migrations import migrate
+from CalendarTime import (clock, parse_date, parse_time, day_number, minute_of_day, get_timezone, ClientWindow,
+                          MIN_DAY, MAX_DAY)
 
 
-# 设置上海时区
-SHANGHAI_TZ = pytz.timezone('Asia/Shanghai')
+# SQL语句保持为模块级常量，使每个长连接的预编译语句缓存可以复用
+EVENT_COLUMNS = "id, title, date, time, description, color, created_at, updated_at"
+
+SQL_INSERT_EVENT = f"""
+    INSERT INTO events ({EVENT_COLUMNS})
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+"""
+# 导入：按id存在时覆盖（走UPDATE，每日计数的触发器随之更新，全文索引行之后重新写入）
+SQL_UPSERT_EVENT = f"""
+    INSERT INTO events ({EVENT_COLUMNS})
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+    ON CONFLICT(id) DO UPDATE SET
+        title=excluded.title, date=excluded.date, time=excluded.time, description=excluded.description,
+        color=excluded.color, updated_at=excluded.updated_at
+"""
+# 范围查询使用整数列 day（1970-01-01 起的天数）和 minute（全天事件为NULL，排在当天最前），
+# 两者由 date / time 生成（见 Migrations.py），参数用 CalendarTime.day_number 换算
+SQL_SELECT_RANGE = f"""
+    SELECT {EVENT_COLUMNS}
+    FROM events
+    WHERE day >= ? AND day <= ?
+    ORDER BY day, minute
+"""
+SQL_SELECT_BUCKET = f"""
+    SELECT {EVENT_COLUMNS}
+    FROM events
+    WHERE day >= ? AND day < ?
+    ORDER BY day, minute
+"""
+SQL_SELECT_ALL = f"""
+    SELECT {EVENT_COLUMNS}
+    FROM events
+    ORDER BY day, minute
+"""
+# 键集分页：按 (day, minute, id) 排序，minute为空时按 -1 处理
+SQL_SELECT_PAGE = f"""
+    SELECT {EVENT_COLUMNS}
+    FROM events
+    WHERE day >= ? AND day <= ? AND (day, IFNULL(minute, -1), id) > (?, ?, ?)
+    ORDER BY day, minute, id
+    LIMIT ?
+"""
+SQL_SELECT_BY_ID = f"""
+    SELECT {EVENT_COLUMNS}
+    FROM events
+    WHERE id=?
+"""
+SQL_UPDATE_EVENT = """
+    UPDATE events
+    SET title=?, date=?, time=?, description=?, color=?, updated_at=?
+    WHERE id=?
+"""
+SQL_LOG_CHANGE = "INSERT INTO change_log (event_id, op, date, old_date) VALUES (?, ?, ?, ?)"
+SQL_CURRENT_SEQ = "SELECT IFNULL(MAX(seq), 0) FROM change_log"
+SQL_COMPACTED_THROUGH = "SELECT value FROM sync_state WHERE key='compacted_through'"
+SQL_SELECT_CHANGES = """
+    SELECT seq, event_id, op
+    FROM change_log
+    WHERE seq > ? AND seq <= ?
+      AND ((date >= ? AND date <= ?) OR (old_date >= ? AND old_date <= ?))
+    ORDER BY seq
+"""
+SQL_SELECT_DATE = "SELECT date, created_at FROM events WHERE id=?"
+SQL_SELECT_TITLE_DATE = "SELECT title, date FROM events WHERE id=?"
+SQL_DELETE_EVENT = "DELETE FROM events WHERE id=?"
+SQL_DELETE_RANGE = "DELETE FROM events WHERE day >= ? AND day <= ?"
+
+# 重复事件系列单独存放，只保存一次规则，查询时按窗口展开
+SERIES_COLUMNS = f"{EVENT_COLUMNS}, rrule, exdates, end_date"
+SQL_INSERT_SERIES = f"""
+    INSERT INTO recurring_events ({SERIES_COLUMNS})
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+"""
+SQL_SELECT_SERIES_ALL = f"SELECT {SERIES_COLUMNS} FROM recurring_events ORDER BY date, time"
+SQL_SELECT_SERIES_BY_ID = f"SELECT {SERIES_COLUMNS} FROM recurring_events WHERE id=?"
+SQL_DELETE_SERIES = "DELETE FROM recurring_events WHERE id=?"
+SQL_SELECT_LOG_AFTER = "SELECT seq, event_id, op, date, old_date FROM change_log WHERE seq > ? ORDER BY seq"
+SQL_SERIES_CHANGED = "SELECT 1 FROM change_log WHERE seq > ? AND seq <= ? AND op = 'series' LIMIT 1"
+
+# 每日事件数的物化计数（daily_counts 表见 Migrations.py）
+SQL_SELECT_DAILY_COUNTS = "SELECT date, color, count FROM daily_counts WHERE date >= ? AND date <= ?"
+
+# 全文检索：按 bm25 排序（标题权重高于描述），索引行经 search_keys 连接到事件，日期过滤在连接后的事件表上进行
+SQL_SEARCH_EVENTS = f"""
+    SELECT {", ".join("e." + column for column in EVENT_COLUMNS.split(", "))}, bm25(events_fts, 10.0, 1.0)
+    FROM events_fts JOIN search_keys k ON k.key = events_fts.rowid JOIN events e ON e.id = k.id
+    WHERE events_fts MATCH ? AND e.date >= ? AND e.date <= ?
+    ORDER BY bm25(events_fts, 10.0, 1.0)
+    LIMIT ?
+"""
+SQL_SEARCH_SERIES = f"""
+    SELECT {", ".join("r." + column for column in SERIES_COLUMNS.split(", "))}, bm25(events_fts, 10.0, 1.0)
+    FROM events_fts JOIN search_keys k ON k.key = events_fts.rowid JOIN recurring_events r ON r.id = k.id
+    WHERE events_fts MATCH ? AND r.date <= ? AND (r.end_date IS NULL OR r.end_date >= ?)
+    ORDER BY bm25(events_fts, 10.0, 1.0)
+    LIMIT ?
+"""
+
+
+def row_to_event(row) -> Event:
+    return Event(
+        id=row[0], title=row[1], date=row[2], time=row[3],
+        description=row[4], color=row[5], created_at=row[6], updated_at=row[7]
+    )
+
+
+def row_to_series(row) -> Event:
+    event = row_to_event(row)
+    event.recurrence = from_rrule(row[8], row[9])
+    return event
+
+
+def row_to_dict(row) -> dict:
+    """不经过pydantic模型直接转换，用于大批量导出"""
+    return {
+        "id": row[0], "title": row[1], "date": row[2], "time": row[3],
+        "description": row[4], "color": row[5], "created_at": row[6], "updated_at": row[7],
+        "recurrence": None, "series_start": None
+    }
+
+
+def sort_key(event: Event) -> tuple:
+    return (event.date, event.time or "")
+
+
+def page_key(event: Event) -> tuple:
+    """分页位置 (date, time, id)，与 SQL_SELECT_PAGE 的 (day, minute, id) 顺序一致"""
+    return (event.date, event.time or "", event.id)
+
+
+def encode_page_cursor(key: tuple) -> str:
+    """把分页位置 (date, time, id) 编码为不透明的游标"""
+    raw = json.dumps(list(key), ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def decode_page_cursor(cursor: str) -> tuple:
+    """解析分页游标，格式错误时抛出ValueError"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        date, time, event_id = json.loads(raw)
+        parse_date(date)
+        parse_time(time)
+    except Exception:
+        raise ValueError("无效的分页游标")
+    return (str(date), str(time), str(event_id))
 
 # 数据库管理器
 class DatabaseManager:
-    def __init__(self, db_path: str = "calendar.db"):
+    def __init__(self, db_path: str = "calendar.db", pool_readers: Optional[int] = None,
+                 range_cache_months: Optional[int] = None, change_log_retain: Optional[int] = None,
+                 memory_store: Optional[bool] = None, initialize: bool = True):
+        """
+        初始化数据库管理器
+
+        Args:
+            initialize: 是否立即执行迁移并预热缓存；为 False 时由调用方在启动时调用 init_database()
+        """
         self.db_path = db_path
-        self.init_database()
+        if pool_readers is None:
+            pool_readers = int(os.getenv("DB_POOL_READERS", 4))
+        if range_cache_months is None:
+            range_cache_months = int(os.getenv("RANGE_CACHE_MONTHS", 48))
+        if memory_store is None:
+            memory_store = os.getenv("MEMORY_STORE", "0").lower() in ("1", "true", "yes")
+        self.pool = ConnectionPool(db_path, readers=pool_readers, on_open=register_functions)
+        # 常驻内存的事件存储，开启后读操作不再访问数据库，写操作同步写入SQLite
+        self.memory = MemoryEventStore() if memory_store else None
+        # 范围查询缓存，设置为0时关闭（开启内存存储时不需要）
+        if self.memory is not None or range_cache_months <= 0:
+            self.range_cache = None
+        else:
+            self.range_cache = RangeCache(self._load_bucket, max_months=range_cache_months)
+        # 变更日志保留条数，超出部分定期压缩
+        self.change_log_retain = change_log_retain or int(os.getenv("CHANGE_LOG_RETAIN", 10000))
+        self._writes_since_compact = 0
+        # 重复系列的内存副本（数量很少），写入后失效
+        self._series: Optional[List[Event]] = None
+        self._series_generation = 0
+        # 已应用到本进程缓存的变更序号（多个worker共享数据库文件时使用）
+        self._synced_seq = 0
+        # 上次检查时写连接的 data_version，变化说明有其他进程提交过写入（见 _sync_if_changed）；
+        # 两次检查至少间隔 external_check_interval 秒
+        self._data_version = None
+        self._checked_at = 0.0
+        self.external_check_interval = float(os.getenv("EXTERNAL_CHECK_MS", 10)) / 1000
+        self._initialized = False
+        if initialize:
+            self.init_database()
     
     def init_database(self):
-        """初始化数据库表"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS events (
-                id TEXT PRIMARY KEY,
-                title TEXT NOT NULL,
-                date TEXT NOT NULL,
-                time TEXT,
-                description TEXT,
-                color TEXT DEFAULT 'blue',
-                created_at TEXT NOT NULL,
-                updated_at TEXT NOT NULL
-            )
-        """)
-        
-        # 创建索引以提高查询性能
-        cursor.execute("CREATE INDEX IF NOT EXISTS idx_events_date ON events(date)")
-        cursor.execute("CREATE INDEX IF NOT EXISTS idx_events_date_range ON events(date, created_at)")
-        
-        conn.commit()
-        conn.close()
+        """执行未应用的迁移，并预热本进程的缓存（应用启动时调用一次）"""
+        if self._initialized:
+            return
+        migrate(self.pool)
+        self._initialized = True
+        with self.pool.writer() as conn:
+            missing = index_missing(conn)
+        if missing:
+            logger.info(f"已为 {missing} 个外部写入的事件补建全文索引")
+        
+        # 先记录序号再预热，期间的写入会在下一次同步时重放（幂等）
+        self._data_version = self.pool.data_version()
+        self._synced_seq = self.get_current_seq()
+        if self.memory is not None:
+            self.load_memory_store()
+        
         logger.info("数据库初始化完成")
     
+    def load_memory_store(self):
+        """从数据库预热内存存储"""
+        with self.pool.reader() as conn:
+            self.memory.load(conn.execute(SQL_SELECT_ALL))
+        logger.info(f"内存事件存储已加载 {len(self.memory)} 个事件")
+    
     def get_connection(self):
-        return sqlite3.connect(self.db_path)
+        """独立的一次性连接，供外部脚本直接访问数据库（已注册写入全文索引使用的函数）"""
+        conn = sqlite3.connect(self.db_path)
+        register_functions(conn)
+        return conn
+    
+    def get_pool_stats(self) -> dict:
+        """连接池统计信息"""
+        return self.pool.stats()
+    
+    def get_cache_stats(self) -> dict:
+        """范围查询缓存（或内存存储）统计信息"""
+        if self.memory is not None:
+            return {"memory_store": self.memory.get_stats()}
+        return self.range_cache.get_stats() if self.range_cache else {}
+    
+    def close(self):
+        self.pool.close()
+    
+    def _invalidate(self, *dates: str):
+        if self.range_cache is None:
+            return
+        if self.pool.in_transaction():
+            # 组提交的外层事务尚未提交：提交后再失效，避免并发读在提交前把旧数据重新放入缓存
+            self.pool.after_commit(lambda: self._invalidate(*dates))
+            return
+        for date in set(dates):
+            if date is not None:
+                self.range_cache.invalidate_date(date)
+    
+    def _apply_to_memory(self, upserts: List[Event] = (), deleted_ids: List[str] = ()):
+        """事务提交后把写入同步到内存存储（在写锁内执行，保持与提交顺序一致）"""
+        if self.memory is None:
+            return
+        def apply():
+            for event_id in deleted_ids:
+                self.memory.remove(event_id)
+            for event in upserts:
+                self.memory.put(event)
+        self.pool.after_commit(apply)
+    
+    def _sync_if_changed(self):
+        """
+        读取缓存前检查其他进程（命令行导入、其他worker）是否提交过写入，有则先应用变更。
+        单个worker且没有背板消息时，这是外部写入进入范围缓存、内存存储和系列缓存的唯一途径
+        """
+        if not self._initialized or self.pool.in_transaction():
+            return
+        now = time.monotonic()
+        if now - self._checked_at < self.external_check_interval:
+            return
+        self._checked_at = now
+        version = self.pool.data_version()
+        if version is None or version == self._data_version:
+            return
+        self._data_version = version
+        self.sync_external_changes()
     
+    def get_series(self) -> List[Event]:
+        """所有重复系列（缓存）"""
+        self._sync_if_changed()
+        series = self._series
+        if series is None:
+            generation = self._series_generation
+            with self.pool.reader() as conn:
+                series = [row_to_series(row) for row in conn.execute(SQL_SELECT_SERIES_ALL)]
+            # 加载期间有写入时不缓存
+            if generation == self._series_generation:
+                self._series = series
+        return series
+    
+    def _invalidate_series(self):
+        self._series_generation += 1
+        self._series = None
+    
+    def expand_series(self, start_date: str, end_date: str) -> List[Event]:
+        """窗口内所有重复系列的单次发生"""
+        occurrences = []
+        for series in self.get_series():
+            if series.date > end_date:
+                continue
+            occurrences.extend(expand_event(series, start_date, end_date))
+        return occurrences
+    
+    @staticmethod
+    def _detach_occurrence(event: Event) -> Optional[str]:
+        """对展开后的单次发生的修改作用于整个系列：日期换回系列的起始日期，返回提交的发生日期"""
+        if not event.series_start:
+            return None
+        occurrence = event.date
+        event.date = event.series_start
+        event.series_start = None
+        return occurrence
+    
+    @staticmethod
+    def _check_occurrence(series: Optional[Event], occurrence: Optional[str]):
+        """提交的发生日期必须是系列原有的一次发生：单次发生的日期不能单独修改，拒绝而不是忽略"""
+        if series is not None and occurrence is not None and not occurs_in_range(series, occurrence, occurrence):
+            raise ValueError(f"不能单独修改重复事件某次发生的日期: {occurrence}，请修改整个系列的开始日期")
+    
+    @staticmethod
+    def _select_series(conn, event_id: str) -> Optional[Event]:
+        row = conn.execute(SQL_SELECT_SERIES_BY_ID, (event_id,)).fetchone()
+        return row_to_series(row) if row else None
+    
+    def _insert_series(self, conn, event: Event):
+        """在当前写事务中保存一个重复系列"""
+        recurrence = event.recurrence
+        conn.execute(SQL_INSERT_SERIES, (
+            event.id, event.title, event.date, event.time, event.description, event.color,
+            event.created_at, event.updated_at, to_rrule(recurrence),
+            ",".join(recurrence.exdates), series_end(recurrence, event.date)
+        ))
+        index_series(conn, event.id)
+        self._series_changed(conn, event)
+    
+    def _delete_series(self, conn, event_id: str) -> Optional[Event]:
+        series = self._select_series(conn, event_id)
+        if series is not None:
+            conn.execute(SQL_DELETE_SERIES, (event_id,))
+            self._series_changed(conn, series)
+        return series
+    
+    def _series_changed(self, conn, event: Event):
+        # 系列变更记为 series 操作，增量同步遇到时回退为完整快照
+        self._log_change(conn, event.id, "series", event.date)
+        self.pool.after_commit(self._invalidate_series)
+    
+    def _write_series_update(self, conn, event: Event, old_single: Optional[tuple],
+                             old_series: Optional[Event]) -> List[str]:
+        """
+        涉及重复系列的更新：单次 <-> 系列的转换或系列本身的修改
+
+        Returns:
+            需要失效的单次事件日期
+        """
+        dates = []
+        event.created_at = old_series.created_at if old_series else old_single[1]
+        if old_single is not None:
+            conn.execute(SQL_DELETE_EVENT, (event.id,))
+            self._log_change(conn, event.id, "delete", None, old_single[0])
+            self._apply_to_memory(deleted_ids=[event.id])
+            dates.append(old_single[0])
+        if old_series is not None:
+            self._delete_series(conn, event.id)
+        
+        if event.recurrence is not None:
+            self._insert_series(conn, event)
+        else:
+            conn.execute(SQL_INSERT_EVENT, (
+                event.id, event.title, event.date, event.time,
+                event.description, event.color, event.created_at, event.updated_at
+            ))
+            index_events(conn, [event.id])
+            self._log_change(conn, event.id, "upsert", event.date)
+            self._apply_to_memory(upserts=[event])
+            dates.append(event.date)
+        return dates
+    
+    def _log_change(self, conn, event_id: str, op: str, date: Optional[str], old_date: Optional[str] = None):
+        """在当前写事务中记录一条变更"""
+        self._log_changes(conn, [(event_id, op, date, old_date)])
+    
+    def _log_changes(self, conn, changes: List[tuple]):
+        """在当前写事务中批量记录变更 (event_id, op, date, old_date)"""
+        if not changes:
+            return
+        conn.executemany(SQL_LOG_CHANGE, changes)
+        self._writes_since_compact += len(changes)
+        if self._writes_since_compact >= max(self.change_log_retain // 10, 1):
+            self._compact_change_log(conn)
+    
+    def _compact_change_log(self, conn):
+        current = conn.execute(SQL_CURRENT_SEQ).fetchone()[0]
+        through = current - self.change_log_retain
+        self._writes_since_compact = 0
+        if through <= 0:
+            return
+        conn.execute("DELETE FROM change_log WHERE seq <= ?", (through,))
+        conn.execute("""
+            INSERT INTO sync_state (key, value) VALUES ('compacted_through', ?)
+            ON CONFLICT(key) DO UPDATE SET value=MAX(value, excluded.value)
+        """, (through,))
+    
+    @instrumented("compact_change_log")
+    def compact_change_log(self):
+        """压缩变更日志，只保留最近 change_log_retain 条"""
+        with self.pool.writer() as conn:
+            self._compact_change_log(conn)
+    
+    @instrumented("sync_external_changes")
+    def sync_external_changes(self) -> int:
+        """
+        应用其他进程写入共享数据库后的变更：按变更日志失效范围缓存、刷新内存存储和重复系列缓存。
+        在写事务中执行，避免与本进程的写入交错导致内存存储回退到旧版本
+
+        Returns:
+            应用的变更条数
+        """
+        with self.pool.writer() as conn:
+            rows = conn.execute(SQL_SELECT_LOG_AFTER, (self._synced_seq,)).fetchall()
+            row = conn.execute(SQL_COMPACTED_THROUGH).fetchone()
+            compacted_through = row[0] if row else 0
+            
+            if self._synced_seq < compacted_through:
+                # 日志已被压缩，无法得知全部变更：整体重建
+                if self.range_cache is not None:
+                    self.range_cache.clear()
+                if self.memory is not None:
+                    self.memory.load(conn.execute(SQL_SELECT_ALL))
+                self._invalidate_series()
+            elif rows:
+                dates = [date for _, _, _, date, old_date in rows for date in (date, old_date)]
+                self._invalidate(*dates)
+                if any(op == "series" for _, _, op, _, _ in rows):
+                    self._invalidate_series()
+                if self.memory is not None:
+                    ids = list(dict.fromkeys(event_id for _, event_id, op, _, _ in rows if op != "series"))
+                    current = {event.id: event for event in self._select_by_ids(conn, ids)}
+                    for event_id in ids:
+                        if event_id in current:
+                            self.memory.put(current[event_id])
+                        else:
+                            self.memory.remove(event_id)
+            
+            self._synced_seq = max(self._synced_seq, compacted_through, rows[-1][0] if rows else 0)
+        return len(rows)
+    
+    @instrumented("get_current_seq")
+    def get_current_seq(self) -> int:
+        """当前的变更序号"""
+        with self.pool.reader() as conn:
+            return conn.execute(SQL_CURRENT_SEQ).fetchone()[0]
+    
+    @instrumented("get_changes_since")
+    def get_changes_since(self, since_seq: int, start_date: str, end_date: str, tz: Optional[str] = None) -> dict:
+        """
+        获取某个序号之后指定范围内的变更
+
+        Args:
+            tz: 客户端时区 (IANA名称)，与 get_events_in_range 相同：指定时日期范围按该时区理解，
+                读取覆盖该范围的日历日期后只保留落在范围内的事件，移出范围的按删除返回
+
+        Returns:
+            {"seq": 当前序号, "full": 是否为完整快照, "events": 新增或更新的事件, "deleted_ids": 已删除或移出范围的事件ID}
+        """
+        zone = get_timezone(tz)
+        window = None
+        if zone is not None:
+            window = ClientWindow(start_date, end_date, zone)
+            start_date, end_date = window.calendar_range()
+        
+        with self.pool.reader() as conn:
+            # 在同一个读事务内取序号和变更，保证快照一致；重复系列的展开在归还读连接之后进行
+            conn.execute("BEGIN")
+            try:
+                current = conn.execute(SQL_CURRENT_SEQ).fetchone()[0]
+                row = conn.execute(SQL_COMPACTED_THROUGH).fetchone()
+                compacted_through = row[0] if row else 0
+                
+                full = since_seq < compacted_through or since_seq > current
+                if not full:
+                    # 重复系列发生变化时，受影响的日期无法从日志中精确得出
+                    full = conn.execute(SQL_SERIES_CHANGED, (since_seq, current)).fetchone() is not None
+                if full:
+                    rows = conn.execute(SQL_SELECT_RANGE, (day_number(start_date), day_number(end_date))).fetchall()
+                    series_rows = conn.execute(SQL_SELECT_SERIES_ALL).fetchall()
+                else:
+                    latest = {}
+                    for seq, event_id, op in conn.execute(SQL_SELECT_CHANGES, (
+                        since_seq, current, start_date, end_date, start_date, end_date
+                    )):
+                        latest[event_id] = op
+                    
+                    upsert_ids = [event_id for event_id, op in latest.items() if op != "delete"]
+                    events = self._select_by_ids(conn, upsert_ids)
+            finally:
+                conn.execute("COMMIT")
+        
+        if full:
+            events = [row_to_event(r) for r in rows]
+            for series in map(row_to_series, series_rows):
+                if series.date <= end_date:
+                    events.extend(expand_event(series, start_date, end_date))
+            if window is not None:
+                events = [event for event in events if window.contains(event.date, event.time)]
+            events.sort(key=sort_key)
+            return {"seq": current, "full": True, "events": events, "deleted_ids": []}
+        
+        # 当前已不在范围内的事件按删除处理
+        events = [event for event in events if start_date <= event.date <= end_date]
+        if window is not None:
+            events = [event for event in events if window.contains(event.date, event.time)]
+        present = {event.id for event in events}
+        deleted_ids = [event_id for event_id in latest if event_id not in present]
+        events.sort(key=sort_key)
+        return {"seq": current, "full": False, "events": events, "deleted_ids": deleted_ids}
+    
+    @staticmethod
+    def _select_by_ids(conn, event_ids: List[str]) -> List[Event]:
+        """按ID批量查询事件（分块，避免超过SQLite参数上限）"""
+        events = []
+        for i in range(0, len(event_ids), 500):
+            chunk = event_ids[i:i + 500]
+            placeholders = ",".join("?" * len(chunk))
+            events.extend(row_to_event(r) for r in conn.execute(
+                f"SELECT {EVENT_COLUMNS} FROM events WHERE id IN ({placeholders})", chunk
+            ))
+        return events
+    
+    @instrumented("create_event")
     def create_event(self, event: Event) -> Event:
         """创建新事件"""
-        conn = self.get_connection()
-        cursor = conn.cursor()
-        
         event.id = str(uuid.uuid4())
-        # 使用上海时区的当前时间
-        now = datetime.now(SHANGHAI_TZ).isoformat()
+        now = clock.now_iso()
         event.created_at = now
         event.updated_at = now
         
-        cursor.execute("""
-            INSERT INTO events (id, title, date, time, description, color, created_at, updated_at)
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-        """, (
-            event.id, event.title, event.date, event.time, 
-            event.description, event.color, event.created_at, event.updated_at
-        ))
+        if event.recurrence is not None:
+            validate_recurrence(event.recurrence, event.date)
+            with self.pool.writer() as conn:
+                self._insert_series(conn, event)
+            logger.info(f"创建重复事件: {event.title} ({event.date}, {to_rrule(event.recurrence)})")
+            return event
         
-        conn.commit()
-        conn.close()
+        with self.pool.writer() as conn:
+            conn.execute(SQL_INSERT_EVENT, (
+                event.id, event.title, event.date, event.time, 
+                event.description, event.color, event.created_at, event.updated_at
+            ))
+            index_events(conn, [event.id])
+            self._log_change(conn, event.id, "upsert", event.date)
+            self._apply_to_memory(upserts=[event])
+        self._invalidate(event.date)
         
-        logger.info(f"创建事件: {event.title} ({event.date}) - 上海时间: {now}")
+        logger.info(f"创建事件: {event.title} ({event.date}) - 创建时间: {now}")
         return event
     
-    def get_events_in_range(self, start_date: str, end_date: str) -> List[Event]:
-        """获取指定日期范围内的事件"""
-        conn = self.get_connection()
-        cursor = conn.cursor()
-        
-        cursor.execute("""
-            SELECT id, title, date, time, description, color, created_at, updated_at
-            FROM events
-            WHERE date >= ? AND date <= ?
-            ORDER BY date, time
-        """, (start_date, end_date))
-        
-        events = []
-        for row in cursor.fetchall():
-            events.append(Event(
-                id=row[0], title=row[1], date=row[2], time=row[3],
-                description=row[4], color=row[5], created_at=row[6], updated_at=row[7]
-            ))
+    @instrumented("get_events_in_range")
+    def get_events_in_range(self, start_date: str, end_date: str, tz: Optional[str] = None) -> List[Event]:
+        """
+        获取指定日期范围内的事件（包含重复系列在该范围内展开的单次发生）
+
+        Args:
+            tz: 客户端时区 (IANA名称)，指定时日期范围按该时区理解：有时间的事件按时刻落在这些天内，
+                全天事件按日期；返回的事件仍为日历时区的日期和时间
+        """
+        self._sync_if_changed()
+        zone = get_timezone(tz)
+        window = None
+        if zone is not None:
+            window = ClientWindow(start_date, end_date, zone)
+            start_date, end_date = window.calendar_range()
         
-        conn.close()
+        events = self._get_single_events_in_range(start_date, end_date)
+        occurrences = self.expand_series(start_date, end_date)
+        if occurrences:
+            events = events + occurrences
+            events.sort(key=sort_key)
+        if window is not None:
+            events = [event for event in events if window.contains(event.date, event.time)]
         return events
     
+    def _get_single_events_in_range(self, start_date: str, end_date: str) -> List[Event]:
+        if self.memory is not None:
+            return self.memory.get_range(start_date, end_date)
+        if self.range_cache is not None:
+            events = self.range_cache.get_range(start_date, end_date)
+            if events is not None:
+                return events
+        
+        with self.pool.reader() as conn:
+            rows = conn.execute(SQL_SELECT_RANGE, (day_number(start_date), day_number(end_date))).fetchall()
+        return [row_to_event(row) for row in rows]
+    
+    def _load_bucket(self, lower: str, upper: str) -> List[Event]:
+        """加载一个缓存桶（月份 YYYY-MM）：lower <= date < upper"""
+        with self.pool.reader() as conn:
+            rows = conn.execute(SQL_SELECT_BUCKET, (day_number(lower + "-01"), day_number(upper + "-01"))).fetchall()
+        return [row_to_event(row) for row in rows]
+    
+    @instrumented("get_all_events")
     def get_all_events(self) -> List[Event]:
-        """获取所有事件"""
-        conn = self.get_connection()
-        cursor = conn.cursor()
+        """获取所有事件（重复系列不展开，只返回系列本身）"""
+        self._sync_if_changed()
+        if self.memory is not None:
+            events = self.memory.get_all()
+        else:
+            with self.pool.reader() as conn:
+                rows = conn.execute(SQL_SELECT_ALL).fetchall()
+            events = [row_to_event(row) for row in rows]
+        series = self.get_series()
+        if series:
+            events = sorted(events + series, key=sort_key)
+        return events
+    
+    def get_events_page_rows(self, limit: int, after: Optional[tuple] = None,
+                             start_date: Optional[str] = None, end_date: Optional[str] = None) -> tuple:
+        """
+        按 (date, time, id) 键集分页读取一页单次事件的原始数据行（不含重复系列）
+
+        Args:
+            limit: 每页条数
+            after: 上一页最后一条的 (date, time, id)，为空表示从头开始
+            start_date: 开始日期（可选）
+            end_date: 结束日期（可选）
+
+        Returns:
+            (rows, next_key)，没有更多数据时 next_key 为None
+        """
+        # 游标仍为 (date, time, id) 文本，查询时换算为整数键
+        if after:
+            minute = minute_of_day(after[1])
+            after_key = (day_number(after[0]), -1 if minute is None else minute, after[2])
+        else:
+            after_key = (MIN_DAY, -1, "")
+        lower = max(day_number(start_date) if start_date else MIN_DAY, after_key[0])
+        upper = day_number(end_date) if end_date else MAX_DAY
+        with self.pool.reader() as conn:
+            rows = conn.execute(SQL_SELECT_PAGE, (lower, upper) + after_key + (limit + 1,)).fetchall()
         
-        cursor.execute("""
-            SELECT id, title, date, time, description, color, created_at, updated_at
-            FROM events
-            ORDER BY date, time
-        """)
+        next_key = None
+        if len(rows) > limit:
+            rows = rows[:limit]
+            last = rows[-1]
+            next_key = (last[2], last[3] or "", last[0])
+        return rows, next_key
+    
+    @instrumented("get_events_page")
+    def get_events_page(self, limit: int, after: Optional[tuple] = None,
+                        start_date: Optional[str] = None, end_date: Optional[str] = None) -> tuple:
+        """
+        按 (date, time, id) 键集分页获取事件，返回 (events, next_key)
+
+        重复系列按同样的键合并到各页中：指定了日期范围（任一端）时为范围内展开的单次发生，
+        否则为系列本身（与 get_all_events 一致）
+        """
+        self._sync_if_changed()
+        rows, next_key = self.get_events_page_rows(limit, after, start_date, end_date)
+        events = [row_to_event(row) for row in rows]
+        series = self._get_series_page(limit + 1, after, start_date, end_date)
+        if not series:
+            return events, next_key
         
-        events = []
-        for row in cursor.fetchall():
-            events.append(Event(
-                id=row[0], title=row[1], date=row[2], time=row[3],
-                description=row[4], color=row[5], created_at=row[6], updated_at=row[7]
-            ))
+        events = sorted(events + series, key=page_key)
+        if next_key is None and len(events) <= limit:
+            return events, None
+        events = events[:limit]
+        return events, page_key(events[-1])
+    
+    def _get_series_page(self, limit: int, after: Optional[tuple],
+                         start_date: Optional[str], end_date: Optional[str]) -> List[Event]:
+        """分页位置之后的前 limit 个重复系列条目（按分页键排序）"""
+        after = tuple(after) if after else ("", "", "")
+        items = []
+        for series in self.get_series():
+            if start_date is None and end_date is None:
+                if page_key(series) > after:
+                    items.append(series)
+            else:
+                items.extend(expand_event_after(series, start_date or "0001-01-01", end_date or "9999-12-31",
+                                                after, limit))
+        items.sort(key=page_key)
+        return items[:limit]
+    
+    def iter_event_dicts(self, chunk_size: int = 500, start_date: Optional[str] = None,
+                         end_date: Optional[str] = None, expand: bool = True):
+        """
+        分块遍历事件，每次产出一个字典列表
+
+        每块是一次独立的键集分页查询，遍历期间不会长时间占用读连接。
+        单次事件之后输出重复系列：指定了日期范围且 expand 为 True 时为范围内展开的单次发生，
+        否则为系列本身（指定了日期范围时只输出在范围内有发生的系列，用于 .ics 导出）
+        """
+        after = None
+        while True:
+            rows, after = self.get_events_page_rows(chunk_size, after, start_date, end_date)
+            if rows:
+                yield [row_to_dict(row) for row in rows]
+            if after is None:
+                break
         
-        conn.close()
-        return events
+        if start_date is None or end_date is None:
+            series = self.get_series()
+        elif expand:
+            series = self.expand_series(start_date, end_date)
+        else:
+            series = [event for event in self.get_series() if occurs_in_range(event, start_date, end_date)]
+        for i in range(0, len(series), chunk_size):
+            yield [event.dict() for event in series[i:i + chunk_size]]
     
+    @instrumented("update_event")
     def update_event(self, event: Event) -> Optional[Event]:
         """更新事件"""
-        conn = self.get_connection()
-        cursor = conn.cursor()
-        
-        # 使用上海时区的当前时间
-        event.updated_at = datetime.now(SHANGHAI_TZ).isoformat()
-        
-        cursor.execute("""
-            UPDATE events
-            SET title=?, date=?, time=?, description=?, color=?, updated_at=?
-            WHERE id=?
-        """, (
-            event.title, event.date, event.time, event.description, 
-            event.color, event.updated_at, event.id
-        ))
+        event.updated_at = clock.now_iso()
+        occurrence = self._detach_occurrence(event)
+        if event.recurrence is not None:
+            validate_recurrence(event.recurrence, event.date)
         
-        if cursor.rowcount == 0:
-            conn.close()
-            return None
+        with self.pool.writer() as conn:
+            old = conn.execute(SQL_SELECT_DATE, (event.id,)).fetchone()
+            old_series = self._select_series(conn, event.id)
+            self._check_occurrence(old_series, occurrence)
+            if event.recurrence is not None or old_series is not None:
+                if old is None and old_series is None:
+                    return None
+                dates = self._write_series_update(conn, event, old, old_series)
+            else:
+                cursor = conn.execute(SQL_UPDATE_EVENT, (
+                    event.title, event.date, event.time, event.description, 
+                    event.color, event.updated_at, event.id
+                ))
+                if cursor.rowcount == 0:
+                    return None
+                index_events(conn, [event.id])
+                self._log_change(conn, event.id, "upsert", event.date, old[0] if old else None)
+                event.created_at = old[1]
+                self._apply_to_memory(upserts=[event])
+                dates = [old[0], event.date]
         
-        conn.commit()
-        conn.close()
+        self._invalidate(*dates)
         
         logger.info(f"更新事件: {event.title} ({event.date}) - 上海时间: {event.updated_at}")
         return event
     
+    @instrumented("delete_event")
     def delete_event(self, event_id: str) -> bool:
-        """删除事件"""
-        conn = self.get_connection()
-        cursor = conn.cursor()
-        
-        # 先获取事件信息用于日志
-        cursor.execute("SELECT title, date FROM events WHERE id=?", (event_id,))
-        event_info = cursor.fetchone()
-        
-        cursor.execute("DELETE FROM events WHERE id=?", (event_id,))
-        deleted = cursor.rowcount > 0
-        
-        conn.commit()
-        conn.close()
+        """删除事件（对重复系列删除整个系列）"""
+        with self.pool.writer() as conn:
+            # 先获取事件信息用于日志
+            event_info = conn.execute(SQL_SELECT_TITLE_DATE, (event_id,)).fetchone()
+            
+            cursor = conn.execute(SQL_DELETE_EVENT, (event_id,))
+            deleted = cursor.rowcount > 0
+            if deleted:
+                self._log_change(conn, event_id, "delete", None, event_info[1] if event_info else None)
+                self._apply_to_memory(deleted_ids=[event_id])
+            else:
+                series = self._delete_series(conn, event_id)
+                if series is not None:
+                    event_info = (series.title, series.date)
+                    deleted = True
         
         if deleted and event_info:
+            self._invalidate(event_info[1])
             logger.info(f"删除事件: {event_info[0]} ({event_info[1]})")
         
         return deleted
     
+    @instrumented("apply_batch")
+    def apply_batch(self, creates: List[Event] = (), updates: List[Event] = (),
+                    deletes: List[str] = ()) -> dict:
+        """
+        在一个事务中批量创建、更新和删除事件
+
+        Args:
+            creates: 待创建的事件
+            updates: 待更新的事件（按id匹配，不存在的忽略）
+            deletes: 待删除的事件ID
+
+        Returns:
+            {"created": 已创建的事件, "updated": 已更新的事件, "deleted": 已删除的事件}
+        """
+        now = clock.now_iso()
+        for event in creates:
+            event.id = str(uuid.uuid4())
+            event.created_at = now
+            event.updated_at = now
+        occurrences = {}
+        for event in updates:
+            event.updated_at = now
+            occurrences[event.id] = self._detach_occurrence(event)
+        # 重复系列很少，逐个处理；单次事件走 executemany
+        for event in list(creates) + list(updates):
+            if event.recurrence is not None:
+                validate_recurrence(event.recurrence, event.date)
+        single_creates = [event for event in creates if event.recurrence is None]
+        
+        with self.pool.writer() as conn:
+            changes = []
+            series_dates = []
+            for event in creates:
+                if event.recurrence is not None:
+                    self._insert_series(conn, event)
+            if single_creates:
+                conn.executemany(SQL_INSERT_EVENT, [(
+                    event.id, event.title, event.date, event.time,
+                    event.description, event.color, event.created_at, event.updated_at
+                ) for event in single_creates])
+                index_events(conn, [event.id for event in single_creates])
+                changes.extend((event.id, "upsert", event.date, None) for event in single_creates)
+            
+            updated = []
+            series_updated = []
+            if updates:
+                series_ids = {event.id for event in self.get_series()}
+                old_singles = {event.id: event for event in self._select_by_ids(conn, [e.id for e in updates])}
+                remaining = []
+                for event in updates:
+                    if event.recurrence is None and event.id not in series_ids:
+                        remaining.append(event)
+                        continue
+                    old_series = self._select_series(conn, event.id)
+                    self._check_occurrence(old_series, occurrences[event.id])
+                    old_single = old_singles.get(event.id)
+                    if old_series is None and old_single is None:
+                        continue
+                    if event.recurrence is None and old_series is None:
+                        remaining.append(event)
+                        continue
+                    old_row = (old_single.date, old_single.created_at) if old_single else None
+                    series_dates.extend(self._write_series_update(conn, event, old_row, old_series))
+                    series_updated.append(event)
+                updates = remaining
+            if updates:
+                old_dates = {event_id: event.date for event_id, event in old_singles.items()}
+                updated = [event for event in updates if event.id in old_singles]
+                for event in updated:
+                    event.created_at = old_singles[event.id].created_at
+                conn.executemany(SQL_UPDATE_EVENT, [(
+                    event.title, event.date, event.time, event.description,
+                    event.color, event.updated_at, event.id
+                ) for event in updated])
+                index_events(conn, [event.id for event in updated])
+                changes.extend((event.id, "upsert", event.date, old_dates[event.id]) for event in updated)
+            
+            deleted = []
+            if deletes:
+                delete_ids = list(dict.fromkeys(deletes))
+                deleted = self._select_by_ids(conn, delete_ids)
+                conn.executemany(SQL_DELETE_EVENT, [(event.id,) for event in deleted])
+                changes.extend((event.id, "delete", None, event.date) for event in deleted)
+                found = {event.id for event in deleted}
+                for event_id in delete_ids:
+                    if event_id not in found:
+                        series = self._delete_series(conn, event_id)
+                        if series is not None:
+                            deleted.append(series)
+            
+            self._log_changes(conn, changes)
+            self._apply_to_memory(upserts=single_creates + updated,
+                                  deleted_ids=[event.id for event in deleted if event.recurrence is None])
+        
+        self._invalidate(*(change[2] for change in changes), *(change[3] for change in changes), *series_dates)
+        updated += series_updated
+        logger.info(f"批量操作: 创建 {len(creates)} 个，更新 {len(updated)} 个，删除 {len(deleted)} 个事件")
+        return {"created": list(creates), "updated": updated, "deleted": deleted}
+    
+    @instrumented("apply_group")
+    def apply_group(self, operations: List[tuple]) -> List[tuple]:
+        """
+        组提交：在一个事务中依次执行多个独立的写操作，只提交一次
+
+        每个操作内部的 writer() 成为保存点，某个操作失败只回滚它自己的写入
+
+        Args:
+            operations: [(方法, 参数元组), ...]，如 (self.create_event, (event,))
+
+        Returns:
+            与 operations 一一对应的 (是否成功, 返回值或异常)
+        """
+        results = []
+        with self.pool.writer():
+            for func, args in operations:
+                try:
+                    results.append((True, func(*args)))
+                except Exception as e:
+                    results.append((False, e))
+        return results
+    
+    @instrumented("import_events")
+    def import_events(self, events: List[Event]) -> dict:
+        """
+        在一个事务中导入一批事件（用于 .ics 导入，调用方按块调用以限制内存和事务大小）
+
+        事件按id覆盖已有事件，没有id时生成新id；重复系列整体替换（单次与系列之间可以互相转换）
+
+        Returns:
+            {"created": 新建数, "updated": 覆盖数}
+        """
+        now = clock.now_iso()
+        for event in events:
+            event.id = event.id or str(uuid.uuid4())
+            event.created_at = event.created_at or now
+            event.updated_at = event.updated_at or now
+            if event.recurrence is not None:
+                validate_recurrence(event.recurrence, event.date)
+        # 同一块中重复的id以最后一个为准
+        events = list({event.id: event for event in events}.values())
+        singles = [event for event in events if event.recurrence is None]
+        series = [event for event in events if event.recurrence is not None]
+        
+        with self.pool.writer() as conn:
+            existing = {event.id: event for event in self._select_by_ids(conn, [event.id for event in events])}
+            replaced = set()
+            # 系列覆盖同id的单次事件
+            changes = [(event.id, "delete", None, existing[event.id].date) for event in series if event.id in existing]
+            if changes:
+                conn.executemany(SQL_DELETE_EVENT, [(change[0],) for change in changes])
+            for event in events:
+                if self._delete_series(conn, event.id) is not None:
+                    replaced.add(event.id)
+            
+            conn.executemany(SQL_UPSERT_EVENT, [(
+                event.id, event.title, event.date, event.time,
+                event.description, event.color, event.created_at, event.updated_at
+            ) for event in singles])
+            index_events(conn, [event.id for event in singles])
+            for event in events:
+                if event.id in existing:
+                    event.created_at = existing[event.id].created_at
+            changes.extend((event.id, "upsert", event.date, existing[event.id].date if event.id in existing else None)
+                           for event in singles)
+            self._log_changes(conn, changes)
+            self._apply_to_memory(upserts=singles, deleted_ids=[event.id for event in series if event.id in existing])
+            for event in series:
+                self._insert_series(conn, event)
+        
+        self._invalidate(*(change[2] for change in changes), *(change[3] for change in changes))
+        updated = len(replaced | existing.keys())
+        return {"created": len(events) - updated, "updated": updated}
+    
+    def create_events(self, events: List[Event]) -> List[Event]:
+        """批量创建事件"""
+        return self.apply_batch(creates=events)["created"]
+    
+    def update_events(self, events: List[Event]) -> List[Event]:
+        """批量更新事件，返回实际存在并已更新的事件"""
+        return self.apply_batch(updates=events)["updated"]
+    
+    def delete_events(self, event_ids: List[str]) -> List[Event]:
+        """批量删除事件，返回被删除的事件"""
+        return self.apply_batch(deletes=event_ids)["deleted"]
+    
+    @instrumented("delete_events_in_range")
+    def delete_events_in_range(self, start_date: str, end_date: str) -> dict:
+        """
+        删除指定日期范围内的所有事件
+
+        重复系列的所有发生都在范围内时删除整个系列，否则把范围内的发生加入排除日期
+
+        Returns:
+            {"created": [], "updated": 加入了排除日期的系列, "deleted": 被删除的单次事件和系列}
+        """
+        now = clock.now_iso()
+        updated = []
+        with self.pool.writer() as conn:
+            bounds = (day_number(start_date), day_number(end_date))
+            rows = conn.execute(SQL_SELECT_RANGE, bounds).fetchall()
+            deleted = [row_to_event(row) for row in rows]
+            conn.execute(SQL_DELETE_RANGE, bounds)
+            self._log_changes(conn, [(event.id, "delete", None, event.date) for event in deleted])
+            self._apply_to_memory(deleted_ids=[event.id for event in deleted])
+            
+            for series in [row_to_series(row) for row in conn.execute(SQL_SELECT_SERIES_ALL)]:
+                occurrences = [event.date for event in expand_event(series, start_date, end_date)]
+                if not occurrences:
+                    continue
+                last = series_end(series.recurrence, series.date)
+                if series.date >= start_date and last is not None and last <= end_date:
+                    self._delete_series(conn, series.id)
+                    deleted.append(series)
+                    continue
+                event = series.copy(deep=True)
+                event.recurrence.exdates = sorted(set(event.recurrence.exdates) | set(occurrences))
+                event.updated_at = now
+                self._write_series_update(conn, event, None, series)
+                updated.append(event)
+        
+        self._invalidate(*(event.date for event in deleted if event.recurrence is None))
+        logger.info(f"删除范围 {start_date} - {end_date} 内的 {len(deleted)} 个事件，排除 {len(updated)} 个系列的发生")
+        return {"created": [], "updated": updated, "deleted": deleted}
+    
+    @instrumented("get_daily_counts")
+    def get_daily_counts(self, start_date: str, end_date: str) -> dict:
+        """
+        范围内每天的事件数和各颜色的事件数（用于月/年概览、热力图）
+
+        单次事件读取物化的 daily_counts 表，重复系列在范围内展开后计入
+
+        Returns:
+            {"days": {日期: 事件数}, "colors": {颜色: 事件数}, "total": 总数}
+        """
+        days = {}
+        colors = {}
+        with self.pool.reader() as conn:
+            rows = conn.execute(SQL_SELECT_DAILY_COUNTS, (start_date, end_date)).fetchall()
+        for date, color, count in rows:
+            days[date] = days.get(date, 0) + count
+            colors[color] = colors.get(color, 0) + count
+        for occurrence in self.expand_series(start_date, end_date):
+            color = occurrence.color or "blue"
+            days[occurrence.date] = days.get(occurrence.date, 0) + 1
+            colors[color] = colors.get(color, 0) + 1
+        return {
+            "days": dict(sorted(days.items())),
+            "colors": colors,
+            "total": sum(colors.values()),
+        }
+    
+    @instrumented("search_events")
+    def search_events(self, query: str, limit: int = 20, start_date: Optional[str] = None,
+                      end_date: Optional[str] = None, prefix: bool = True) -> List[Event]:
+        """
+        按标题和描述全文检索事件，结果按相关度排序
+
+        Args:
+            query: 用户输入的关键词，多个词之间为 AND
+            limit: 最多返回的结果数
+            start_date: 开始日期（可选），重复系列按其跨度与范围是否重叠过滤
+            end_date: 结束日期（可选）
+            prefix: 最后的非汉字部分按前缀匹配（输入时联想）
+        """
+        match = build_match_query(query, prefix)
+        if match is None:
+            return []
+        lower, upper = start_date or "0000-01-01", end_date or "9999-12-31"
+        has_series = bool(self.get_series())
+        with self.pool.reader() as conn:
+            singles = conn.execute(SQL_SEARCH_EVENTS, (match, lower, upper, limit)).fetchall()
+            if not has_series:
+                return [row_to_event(row) for row in singles]
+            series = conn.execute(SQL_SEARCH_SERIES, (match, upper, lower, limit)).fetchall()
+        # 两组结果来自同一个索引，bm25 分数可以直接比较
+        ranked = [(row[-1], row_to_event(row)) for row in singles]
+        ranked += [(row[-1], row_to_series(row)) for row in series]
+        ranked.sort(key=lambda item: item[0])
+        return [event for _, event in ranked[:limit]]
+    
+    @instrumented("get_event_by_id")
     def get_event_by_id(self, event_id: str) -> Optional[Event]:
-        """根据ID获取事件"""
-        conn = self.get_connection()
-        cursor = conn.cursor()
-        
-        cursor.execute("""
-            SELECT id, title, date, time, description, color, created_at, updated_at
-            FROM events
-            WHERE id=?
-        """, (event_id,))
-        
-        row = cursor.fetchone()
-        conn.close()
-        
-        if row:
-            return Event(
-                id=row[0], title=row[1], date=row[2], time=row[3],
-                description=row[4], color=row[5], created_at=row[6], updated_at=row[7]
-            )
-        return None
-
-db = DatabaseManager()
+        """根据ID获取事件（单次事件或重复系列）"""
+        self._sync_if_changed()
+        if self.memory is not None:
+            event = self.memory.get(event_id)
+            if event is not None:
+                return event
+        with self.pool.reader() as conn:
+            row = None if self.memory is not None else conn.execute(SQL_SELECT_BY_ID, (event_id,)).fetchone()
+            if row is None:
+                return self._select_series(conn, event_id)
+        return row_to_event(row)
+
+# 导入时不访问数据库，迁移在应用启动时执行
+db = DatabaseManager(initialize=False)
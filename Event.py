@@ -1,13 +1,27 @@
 # 数据模型
-from typing import Optional
-from pydantic import BaseModel
+from typing import List, Optional
+from pydantic import BaseModel, validator
+from CalendarTime import parse_date, parse_time
+
+class Recurrence(BaseModel):
+    freq: str                      # DAILY / WEEKLY / MONTHLY / YEARLY
+    interval: int = 1
+    until: Optional[str] = None    # 最后日期 (YYYY-MM-DD，含)
+    count: Optional[int] = None    # 总次数
+    exdates: List[str] = []        # 排除的日期
 
 class Event(BaseModel):
     id: Optional[str] = None
     title: str
-    date: str
-    time: Optional[str] = None
+    date: str                      # 日历时区的日期 (YYYY-MM-DD)
+    time: Optional[str] = None     # 日历时区的时间 (HH:MM)，为空表示全天事件
     description: Optional[str] = None
     color: str = "blue"
     created_at: Optional[str] = None
     updated_at: Optional[str] = None
+    recurrence: Optional[Recurrence] = None
+    series_start: Optional[str] = None  # 仅展开后的单次发生：所属系列的起始日期
+    
+    # 日期和时间只接受规范格式，存储的文本按字典序比较即按时间先后
+    _check_date = validator("date", allow_reuse=True)(parse_date)
+    _check_time = validator("time", allow_reuse=True)(parse_time)
@@ -0,0 +1,93 @@
+import json
+import os
+import threading
+from collections import OrderedDict
+from typing import Iterable, Optional
+from Event import Event
+
+try:
+    import orjson
+except ImportError:  # 未安装orjson时退回标准库
+    orjson = None
+
+
+def dumps(obj) -> str:
+    """序列化为JSON文本（保留非ASCII字符）"""
+    if orjson is not None:
+        return orjson.dumps(obj).decode("utf-8")
+    return json.dumps(obj, ensure_ascii=False, separators=(",", ":"))
+
+
+# 事件序列化器：每个事件版本只编码一次，列表消息由缓存的片段直接拼接
+class EventSerializer:
+    def __init__(self, max_entries: Optional[int] = None):
+        """
+        初始化序列化器
+
+        Args:
+            max_entries: 缓存的事件片段数量上限
+        """
+        self.max_entries = max_entries or int(os.getenv("SERIALIZER_CACHE_SIZE", 50000))
+        self.cache: "OrderedDict[tuple, str]" = OrderedDict()
+        self.lock = threading.Lock()
+        self.stats = {"hits": 0, "misses": 0}
+    
+    def _cached(self, key, build) -> str:
+        if key is None:
+            return build()
+        with self.lock:
+            fragment = self.cache.get(key)
+            if fragment is not None:
+                self.cache.move_to_end(key)
+                self.stats["hits"] += 1
+                return fragment
+        fragment = build()
+        with self.lock:
+            self.stats["misses"] += 1
+            self.cache[key] = fragment
+            if len(self.cache) > self.max_entries:
+                self.cache.popitem(last=False)
+        return fragment
+    
+    def encode_event(self, event: Event) -> str:
+        """单个事件的JSON片段，按 (id, updated_at, date, series_start) 缓存（重复事件的各次发生共用id）"""
+        key = (event.id, event.updated_at, event.date, event.series_start) if event.id and event.updated_at else None
+        return self._cached(key, lambda: dumps(event.dict()))
+    
+    def encode_event_dict(self, event: dict) -> str:
+        """事件字典的JSON片段，与 encode_event 共用缓存"""
+        key = ((event["id"], event["updated_at"], event["date"], event.get("series_start"))
+               if event.get("id") and event.get("updated_at") else None)
+        return self._cached(key, lambda: dumps(event))
+    
+    def encode_event_list(self, events: Iterable[Event]) -> str:
+        """事件列表的JSON数组，由缓存片段拼接"""
+        return "[" + ",".join(self.encode_event(event) for event in events) + "]"
+    
+    def encode_value(self, value) -> str:
+        if isinstance(value, Event):
+            return self.encode_event(value)
+        if isinstance(value, list) and value and isinstance(value[0], Event):
+            return self.encode_event_list(value)
+        return dumps(value)
+    
+    def encode_object(self, **fields) -> str:
+        """
+        编码一个JSON对象
+
+        Event 和 Event 列表字段使用缓存的片段，其他字段按普通JSON编码
+        """
+        return "{" + ",".join(f'{dumps(name)}:{self.encode_value(value)}' for name, value in fields.items()) + "}"
+    
+    def encode_message(self, message_type: str, **fields) -> str:
+        """编码一条WebSocket消息 {"type": ..., 字段...}"""
+        return self.encode_object(type=message_type, **fields)
+    
+    def get_stats(self) -> dict:
+        with self.lock:
+            stats = dict(self.stats)
+            stats["entries"] = len(self.cache)
+        stats["encoder"] = "orjson" if orjson is not None else "json"
+        return stats
+
+serializer = EventSerializer()
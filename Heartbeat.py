@@ -0,0 +1,84 @@
+import asyncio
+import os
+import time
+from typing import Dict, Optional
+from fastapi import WebSocket
+from logger import logger
+from EventSerializer import dumps
+
+
+PING_FRAME = dumps({"type": "ping"})
+PONG_FRAME = dumps({"type": "pong"})
+
+
+# 连接心跳：回复客户端的ping；空闲的连接由服务端主动ping，超时未收到任何消息的连接被回收
+class HeartbeatMonitor:
+    def __init__(self, manager, interval: float = None, idle_timeout: float = None):
+        """
+        初始化心跳检测
+
+        Args:
+            manager: 连接管理器
+            interval: 检查周期 (秒)，空闲超过该时间的连接会收到服务端的ping
+            idle_timeout: 超过该时间未收到任何消息的连接视为已失效（含半开连接）并关闭 (秒)
+        """
+        self.manager = manager
+        self.interval = interval if interval is not None else float(os.getenv("WS_PING_INTERVAL", 30))
+        self.idle_timeout = idle_timeout if idle_timeout is not None else float(os.getenv("WS_IDLE_TIMEOUT", 75))
+        self.last_seen: Dict[WebSocket, float] = {}
+        # ping/pong帧在各种帧格式下的转换结果长期复用
+        self._ping_encoded = {}
+        self._pong_encoded = {}
+        self._task: Optional[asyncio.Task] = None
+        self.stats = {"pongs_sent": 0, "pings_sent": 0, "reaped": 0}
+
+    def touch(self, websocket: WebSocket):
+        """记录收到消息的时间"""
+        self.last_seen[websocket] = time.monotonic()
+
+    def forget(self, websocket: WebSocket):
+        self.last_seen.pop(websocket, None)
+
+    def pong(self, websocket: WebSocket):
+        sender = self.manager.active_connections.get(websocket)
+        if sender is not None:
+            self.manager.enqueue_frame(websocket, sender, PONG_FRAME, self._pong_encoded)
+            self.stats["pongs_sent"] += 1
+
+    def start(self):
+        if self._task is None and self.interval > 0:
+            self._task = asyncio.create_task(self._run())
+
+    def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                self.check()
+            except Exception as e:
+                logger.error(f"心跳检查失败: {e!r}")
+
+    def check(self, now: float = None) -> int:
+        """ping空闲的连接并回收超时的连接，返回回收的连接数"""
+        now = time.monotonic() if now is None else now
+        reaped = 0
+        for websocket, seen in list(self.last_seen.items()):
+            idle = now - seen
+            if idle >= self.idle_timeout:
+                if self.manager.reap(websocket):
+                    reaped += 1
+                self.last_seen.pop(websocket, None)
+                continue
+            if idle >= self.interval:
+                sender = self.manager.active_connections.get(websocket)
+                if sender is not None:
+                    self.manager.enqueue_frame(websocket, sender, PING_FRAME, self._ping_encoded)
+                    self.stats["pings_sent"] += 1
+        if reaped:
+            self.stats["reaped"] += reaped
+            logger.warning(f"回收 {reaped} 个超时未响应的连接")
+        return reaped
@@ -0,0 +1,393 @@
+"""
+iCalendar (.ics) 导入导出
+
+    python ICalendar.py export [--db calendar.db] [-o calendar.ics] [--start-date ...] [--end-date ...]
+    python ICalendar.py import calendar.ics [--db calendar.db] [--chunk-size 1000]
+
+导出逐行输出，导入边读边解析并按块写入，内存占用与文件大小无关。
+命令行直接访问SQLite文件；服务运行中也可以使用：服务在下一次读取前发现其他进程的提交并刷新缓存，
+已连接的客户端在下一次请求或增量同步时看到导入的事件（不会主动推送）
+"""
+import argparse
+import codecs
+import sqlite3
+import sys
+import uuid
+from datetime import datetime
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+import pytz
+from Event import Event, Recurrence
+from Recurrence import to_rrule, from_rrule, validate_recurrence
+from CalendarTime import CALENDAR_TZ, clock, day_number
+
+
+PRODID = "-//my-calendar//Calendar//ZH"
+HEADER = "\r\n".join((
+    "BEGIN:VCALENDAR", "VERSION:2.0", f"PRODID:{PRODID}", "CALSCALE:GREGORIAN", f"X-WR-TIMEZONE:{CALENDAR_TZ.zone}",
+)) + "\r\n"
+FOOTER = "END:VCALENDAR\r\n"
+
+
+# ---------------------------------------------------------------- 导出
+
+def escape_text(value: str) -> str:
+    return (value.replace("\\", "\\\\").replace(";", "\\;").replace(",", "\\,")
+            .replace("\r\n", "\\n").replace("\n", "\\n"))
+
+
+def fold(line: str) -> str:
+    """按RFC 5545折行：每行不超过75字节，不拆开多字节字符"""
+    if len(line) <= 37 or len(line.encode("utf-8")) <= 75:
+        return line + "\r\n"
+    parts = []
+    current = []
+    size = 0
+    limit = 75
+    for char in line:
+        width = len(char.encode("utf-8"))
+        if size + width > limit:
+            parts.append("".join(current))
+            current = []
+            size = 0
+            limit = 74  # 续行以一个空格开头
+        current.append(char)
+        size += width
+    parts.append("".join(current))
+    return "\r\n ".join(parts) + "\r\n"
+
+
+def _utc_stamp(value: Optional[str]) -> str:
+    try:
+        moment = datetime.fromisoformat(value)
+    except (TypeError, ValueError):
+        moment = datetime.fromisoformat(clock.now_iso())
+    if moment.tzinfo is None:
+        moment = CALENDAR_TZ.localize(moment)
+    return moment.astimezone(pytz.utc).strftime("%Y%m%dT%H%M%SZ")
+
+
+def _start_property(name: str, date: str, time: Optional[str]) -> str:
+    """全天事件输出日期；有时间的事件换算为UTC输出，不依赖 VTIMEZONE 定义"""
+    if not time:
+        return f"{name};VALUE=DATE:{date.replace('-', '')}"
+    moment = CALENDAR_TZ.localize(datetime.fromisoformat(f"{date}T{time}"))
+    return f"{name}:{moment.astimezone(pytz.utc).strftime('%Y%m%dT%H%M%SZ')}"
+
+
+def event_to_vevent(event: dict) -> str:
+    """事件字典（row_to_dict / Event.dict() 的格式）转换为 VEVENT 文本"""
+    lines = [
+        "BEGIN:VEVENT",
+        f"UID:{event['id']}",
+        f"DTSTAMP:{_utc_stamp(event.get('updated_at'))}",
+        _start_property("DTSTART", event["date"], event.get("time")),
+        f"SUMMARY:{escape_text(event['title'])}",
+    ]
+    if event.get("description"):
+        lines.append(f"DESCRIPTION:{escape_text(event['description'])}")
+    if event.get("color"):
+        lines.append(f"COLOR:{event['color']}")
+    if event.get("created_at"):
+        lines.append(f"CREATED:{_utc_stamp(event['created_at'])}")
+    if event.get("updated_at"):
+        lines.append(f"LAST-MODIFIED:{_utc_stamp(event['updated_at'])}")
+    recurrence = event.get("recurrence")
+    if recurrence:
+        if isinstance(recurrence, dict):
+            recurrence = Recurrence(**recurrence)
+        lines.append(f"RRULE:{to_rrule(recurrence)}")
+        for exdate in recurrence.exdates:
+            lines.append(_start_property("EXDATE", exdate, event.get("time")))
+    lines.append("END:VEVENT")
+    return "".join(fold(line) for line in lines)
+
+
+def iter_ics(chunks: Iterable[List[dict]]) -> Iterator[str]:
+    """按块输出 .ics 文本，chunks 为事件字典列表的迭代器（例如 DatabaseManager.iter_event_dicts）"""
+    yield HEADER
+    for chunk in chunks:
+        yield "".join(event_to_vevent(event) for event in chunk)
+    yield FOOTER
+
+
+def iter_database_chunks(conn: sqlite3.Connection, chunk_size: int = 1000, start_date: Optional[str] = None,
+                         end_date: Optional[str] = None) -> Iterator[List[dict]]:
+    """直接从数据库游标分块读取单次事件和重复系列（命令行导出使用）"""
+    from DatabaseManager import SQL_SELECT_ALL, SQL_SELECT_RANGE, SQL_SELECT_SERIES_ALL, row_to_dict, row_to_series
+    if start_date and end_date:
+        cursor = conn.execute(SQL_SELECT_RANGE, (day_number(start_date), day_number(end_date)))
+    else:
+        cursor = conn.execute(SQL_SELECT_ALL)
+    while True:
+        rows = cursor.fetchmany(chunk_size)
+        if not rows:
+            break
+        yield [row_to_dict(row) for row in rows]
+    series = [row_to_series(row) for row in conn.execute(SQL_SELECT_SERIES_ALL)]
+    if start_date and end_date:
+        from Recurrence import occurs_in_range
+        series = [event for event in series if occurs_in_range(event, start_date, end_date)]
+    for i in range(0, len(series), chunk_size):
+        yield [event.dict() for event in series[i:i + chunk_size]]
+
+
+# ---------------------------------------------------------------- 导入
+
+def unescape_text(value: str) -> str:
+    if "\\" not in value:
+        return value
+    out = []
+    chars = iter(value)
+    for char in chars:
+        if char != "\\":
+            out.append(char)
+            continue
+        following = next(chars, "")
+        out.append("\n" if following in ("n", "N") else following)
+    return "".join(out)
+
+
+def parse_property(line: str) -> Tuple[str, Dict[str, str], str]:
+    """拆分内容行 NAME;PARAM=VALUE:值，参数值可以带引号"""
+    split_at = line.find(":")
+    if '"' in line[:split_at]:
+        # 带引号的参数值中可以有冒号
+        quoted = False
+        split_at = -1
+        for index, char in enumerate(line):
+            if char == '"':
+                quoted = not quoted
+            elif char == ":" and not quoted:
+                split_at = index
+                break
+    if split_at < 0:
+        return line.upper(), {}, ""
+    head, value = line[:split_at], line[split_at + 1:]
+    name, *params = head.split(";")
+    parameters = {}
+    for param in params:
+        key, _, param_value = param.partition("=")
+        parameters[key.upper()] = param_value.strip('"')
+    return name.upper(), parameters, value
+
+
+def parse_start(value: str, params: Dict[str, str]) -> Tuple[str, Optional[str]]:
+    """DTSTART/EXDATE 转换为日历时区的 (日期, 时间)；全天事件时间为None，不带时区的时间按日历时区理解"""
+    value = value.strip()
+    if params.get("VALUE") == "DATE" or len(value) == 8:
+        return f"{value[:4]}-{value[4:6]}-{value[6:8]}", None
+    if len(value) < 15 or value[8] != "T":
+        raise ValueError(f"无法解析的时间: {value}")
+    moment = datetime(int(value[:4]), int(value[4:6]), int(value[6:8]),
+                      int(value[9:11]), int(value[11:13]), int(value[13:15]))
+    zone = None
+    if value.endswith("Z"):
+        zone = pytz.utc
+    elif params.get("TZID"):
+        try:
+            zone = pytz.timezone(params["TZID"])
+        except pytz.UnknownTimeZoneError:
+            zone = None
+    if zone is not None:
+        moment = zone.localize(moment).astimezone(CALENDAR_TZ)
+    return moment.strftime("%Y-%m-%d"), moment.strftime("%H:%M")
+
+
+# 重复规则只支持 FREQ/INTERVAL/UNTIL/COUNT；细化规则只有与 DTSTART 相同、不改变展开结果时才接受
+RRULE_PARTS = ("FREQ", "INTERVAL", "UNTIL", "COUNT", "WKST")
+WEEKDAYS = ("MO", "TU", "WE", "TH", "FR", "SA", "SU")
+
+
+def check_rrule(rrule: str, dtstart: str):
+    """RRULE 中有无法按基本频率展开的部分（如 BYDAY=MO,WE、BYSETPOS）时抛出 ValueError，该事件按不合法跳过"""
+    fields = dict(part.split("=", 1) for part in rrule.split(";") if "=" in part)
+    start = datetime.strptime(dtstart, "%Y-%m-%d")
+    freq = fields.get("FREQ")
+    redundant = {
+        "BYDAY": freq == "WEEKLY" and WEEKDAYS[start.weekday()],
+        "BYMONTHDAY": freq in ("MONTHLY", "YEARLY") and str(start.day),
+        "BYMONTH": freq == "YEARLY" and str(start.month),
+    }
+    for name, value in fields.items():
+        if name in RRULE_PARTS:
+            continue
+        if redundant.get(name) != value.lstrip("+").lstrip("0"):
+            raise ValueError(f"不支持的重复规则: {name}={value}")
+
+
+def vevent_to_event(properties: Dict[str, Tuple[Dict[str, str], str]], exdates: List[Tuple]) -> Event:
+    """解析出的 VEVENT 属性转换为事件，缺少 DTSTART 或重复规则不合法时抛出 ValueError"""
+    if "DTSTART" not in properties:
+        raise ValueError("缺少 DTSTART")
+    params, value = properties["DTSTART"]
+    date, time = parse_start(value, params)
+    event = Event(
+        id=properties["UID"][1].strip() if "UID" in properties else str(uuid.uuid4()),
+        title=unescape_text(properties["SUMMARY"][1]) if "SUMMARY" in properties else "(无标题)",
+        date=date,
+        time=time,
+        description=unescape_text(properties["DESCRIPTION"][1]) if "DESCRIPTION" in properties else None,
+        color=properties["COLOR"][1].strip() if "COLOR" in properties else "blue",
+    )
+    if "RRULE" in properties:
+        rrule = properties["RRULE"][1].upper()
+        check_rrule(rrule, event.date)
+        dates = []
+        for exdate_params, exdate_value in exdates:
+            dates.extend(parse_start(item, exdate_params)[0] for item in exdate_value.split(",") if item)
+        event.recurrence = from_rrule(rrule, ",".join(dates))
+        validate_recurrence(event.recurrence, event.date)
+    return event
+
+
+class ICSParser:
+    """
+    增量解析器：feed 任意长度的文本片段，返回其中已完整的 VEVENT 对应的事件。
+    只保留当前未结束的一行和一个 VEVENT 的属性，内存占用与文件大小无关
+    """
+    def __init__(self):
+        self._buffer = ""
+        self._line: Optional[str] = None
+        self._depth = 0
+        self._in_event = False
+        self._event_depth = 0
+        self._properties: Dict[str, Tuple[Dict[str, str], str]] = {}
+        self._exdates: List[Tuple] = []
+        self.errors = 0
+
+    def feed(self, text: str) -> List[Event]:
+        events = []
+        self._buffer += text
+        *lines, self._buffer = self._buffer.split("\n")
+        for raw in lines:
+            raw = raw.rstrip("\r")
+            if raw[:1] in (" ", "\t"):
+                # 折行的续行
+                if self._line is not None:
+                    self._line += raw[1:]
+                continue
+            if self._line is not None:
+                self._handle(self._line, events)
+            self._line = raw
+        return events
+
+    def close(self) -> List[Event]:
+        events = self.feed("\n") if self._buffer else []
+        if self._line is not None:
+            self._handle(self._line, events)
+            self._line = None
+        return events
+
+    def _handle(self, line: str, events: List[Event]):
+        if not line:
+            return
+        name, params, value = parse_property(line)
+        if name == "BEGIN":
+            self._depth += 1
+            if value.upper() == "VEVENT":
+                self._in_event = True
+                self._event_depth = self._depth
+                self._properties = {}
+                self._exdates = []
+            return
+        if name == "END":
+            if self._in_event and value.upper() == "VEVENT":
+                self._in_event = False
+                try:
+                    events.append(vevent_to_event(self._properties, self._exdates))
+                except (ValueError, KeyError):
+                    self.errors += 1
+            self._depth -= 1
+            return
+        # VEVENT 内嵌的 VALARM 等组件的属性忽略
+        if self._in_event and self._depth == self._event_depth:
+            if name == "EXDATE":
+                self._exdates.append((params, value))
+            elif name not in self._properties:
+                self._properties[name] = (params, value)
+
+
+def import_stream(database, chunks: Iterable[str], chunk_size: int = 1000) -> dict:
+    """
+    从文本片段的迭代器导入事件，每 chunk_size 个事件一个事务
+
+    Returns:
+        {"created": 新建数, "updated": 覆盖数, "skipped": 无法解析或不合法而跳过的事件数}
+    """
+    parser = ICSParser()
+    result = {"created": 0, "updated": 0, "skipped": 0}
+    pending: List[Event] = []
+
+    def flush(batch: List[Event]):
+        counts = database.import_events(batch)
+        result["created"] += counts["created"]
+        result["updated"] += counts["updated"]
+
+    for text in chunks:
+        pending.extend(parser.feed(text))
+        while len(pending) >= chunk_size:
+            flush(pending[:chunk_size])
+            del pending[:chunk_size]
+    pending.extend(parser.close())
+    for i in range(0, len(pending), chunk_size):
+        flush(pending[i:i + chunk_size])
+    result["skipped"] += parser.errors
+    return result
+
+
+def read_text_chunks(file, size: int = 64 * 1024) -> Iterator[str]:
+    """按块读取二进制文件并解码为UTF-8（可以跨块拆开多字节字符）"""
+    decoder = codecs.getincrementaldecoder("utf-8")("replace")
+    while True:
+        data = file.read(size)
+        if not data:
+            break
+        yield decoder.decode(data)
+    tail = decoder.decode(b"", final=True)
+    if tail:
+        yield tail
+
+
+# ---------------------------------------------------------------- 命令行
+
+def main():
+    parser = argparse.ArgumentParser(description="iCalendar (.ics) 导入导出")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    export = commands.add_parser("export", help="导出为 .ics")
+    export.add_argument("--db", default="calendar.db", help="SQLite数据库文件")
+    export.add_argument("-o", "--output", default="-", help="输出文件，默认标准输出")
+    export.add_argument("--start-date", help="开始日期 (YYYY-MM-DD)")
+    export.add_argument("--end-date", help="结束日期 (YYYY-MM-DD)")
+
+    importer = commands.add_parser("import", help="从 .ics 导入（按UID覆盖已有事件）")
+    importer.add_argument("file", help=".ics 文件，- 为标准输入")
+    importer.add_argument("--db", default="calendar.db", help="SQLite数据库文件")
+    importer.add_argument("--chunk-size", type=int, default=1000, help="每个事务写入的事件数")
+
+    args = parser.parse_args()
+    if args.command == "export":
+        conn = sqlite3.connect(f"file:{args.db}?mode=ro", uri=True)
+        output = sys.stdout if args.output == "-" else open(args.output, "w", encoding="utf-8", newline="")
+        try:
+            for text in iter_ics(iter_database_chunks(conn, start_date=args.start_date, end_date=args.end_date)):
+                output.write(text)
+        finally:
+            conn.close()
+            if output is not sys.stdout:
+                output.close()
+    else:
+        from DatabaseManager import DatabaseManager
+        database = DatabaseManager(args.db)
+        source = sys.stdin.buffer if args.file == "-" else open(args.file, "rb")
+        try:
+            result = import_stream(database, read_text_chunks(source), args.chunk_size)
+        finally:
+            if source is not sys.stdin.buffer:
+                source.close()
+            database.close()
+        print(f"导入完成: 新建 {result['created']} 个，覆盖 {result['updated']} 个，跳过 {result['skipped']} 个")
+
+
+if __name__ == "__main__":
+    main()
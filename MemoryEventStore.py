@@ -0,0 +1,96 @@
+import threading
+from bisect import bisect_left, insort
+from typing import Dict, Iterable, List, Optional
+from Event import Event
+
+
+MAX_KEY = "\U0010ffff"
+
+
+class EventRecord:
+    """紧凑的事件记录，读取时才生成 Event 模型"""
+    __slots__ = ("id", "title", "date", "time", "description", "color", "created_at", "updated_at")
+    
+    def __init__(self, id, title, date, time, description, color, created_at, updated_at):
+        self.id = id
+        self.title = title
+        self.date = date
+        self.time = time
+        self.description = description
+        self.color = color
+        self.created_at = created_at
+        self.updated_at = updated_at
+    
+    @classmethod
+    def from_event(cls, event: Event) -> "EventRecord":
+        return cls(event.id, event.title, event.date, event.time, event.description,
+                   event.color, event.created_at, event.updated_at)
+    
+    @property
+    def key(self) -> tuple:
+        return (self.date, self.time or "", self.id)
+    
+    def to_event(self) -> Event:
+        """每次生成新的 Event：调用方（如 update_event）会修改拿到的事件，不能与存储和其他读取方共用同一个实例"""
+        return Event(
+            id=self.id, title=self.title, date=self.date, time=self.time,
+            description=self.description, color=self.color,
+            created_at=self.created_at, updated_at=self.updated_at
+        )
+
+
+# 常驻内存的事件存储：按 (date, time, id) 排序的索引 + ID字典，范围查询使用二分查找
+class MemoryEventStore:
+    def __init__(self):
+        self.records: Dict[str, EventRecord] = {}
+        self.keys: List[tuple] = []
+        self.lock = threading.RLock()
+    
+    def __len__(self):
+        return len(self.records)
+    
+    def load(self, rows: Iterable[tuple]):
+        """用数据库行 (id, title, date, time, description, color, created_at, updated_at) 预热"""
+        with self.lock:
+            self.records = {row[0]: EventRecord(*row) for row in rows}
+            self.keys = sorted(record.key for record in self.records.values())
+    
+    def put(self, event: Event):
+        """新增或替换一个事件"""
+        record = EventRecord.from_event(event)
+        with self.lock:
+            self._remove(event.id)
+            self.records[record.id] = record
+            insort(self.keys, record.key)
+    
+    def remove(self, event_id: str):
+        with self.lock:
+            self._remove(event_id)
+    
+    def _remove(self, event_id: str):
+        record = self.records.pop(event_id, None)
+        if record is not None:
+            key = record.key
+            index = bisect_left(self.keys, key)
+            if index < len(self.keys) and self.keys[index] == key:
+                del self.keys[index]
+    
+    def get(self, event_id: str) -> Optional[Event]:
+        record = self.records.get(event_id)
+        return record.to_event() if record is not None else None
+    
+    def get_range(self, start_date: str, end_date: str) -> List[Event]:
+        """获取 start_date <= date <= end_date 的事件，按日期、时间排序"""
+        with self.lock:
+            lo = bisect_left(self.keys, (start_date,))
+            hi = bisect_left(self.keys, (end_date, MAX_KEY))
+            records = [self.records[key[2]] for key in self.keys[lo:hi]]
+        return [record.to_event() for record in records]
+    
+    def get_all(self) -> List[Event]:
+        with self.lock:
+            records = [self.records[key[2]] for key in self.keys]
+        return [record.to_event() for record in records]
+    
+    def get_stats(self) -> dict:
+        return {"events": len(self.records)}
@@ -0,0 +1,208 @@
+import threading
+import time
+from bisect import bisect_left
+from functools import wraps
+from typing import Callable, Dict, Iterable, List, Tuple
+
+
+# 延迟（秒）与数量的默认分桶
+LATENCY_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+COUNT_BUCKETS = (0, 1, 5, 10, 50, 100, 500, 1000, 5000, 10000, 50000)
+INF_LABEL = 'le="+Inf"'
+
+
+def _format_labels(labels: Tuple[Tuple[str, str], ...], extra: str = "") -> str:
+    parts = [f'{name}="{value}"' for name, value in labels]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _format_value(value) -> str:
+    if isinstance(value, float):
+        if value == float("inf"):
+            return "+Inf"
+        return repr(value)
+    return str(value)
+
+
+# 直方图：分桶和计数数组在创建时分配，observe 只做一次二分查找和计数
+class Histogram:
+    __slots__ = ("bounds", "counts", "sum", "count", "labels", "_lock")
+
+    def __init__(self, bounds: Tuple[float, ...], labels: Tuple[Tuple[str, str], ...] = ()):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.sum = 0.0
+        self.count = 0
+        self.labels = labels
+        self._lock = threading.Lock()
+
+    def observe(self, value: float):
+        index = bisect_left(self.bounds, value)
+        with self._lock:
+            self.counts[index] += 1
+            self.sum += value
+            self.count += 1
+
+    def render(self, name: str) -> Iterable[str]:
+        with self._lock:
+            counts, total, count = list(self.counts), self.sum, self.count
+        cumulative = 0
+        for bound, bucket in zip(self.bounds, counts):
+            cumulative += bucket
+            le = 'le="%s"' % _format_value(float(bound))
+            yield f"{name}_bucket{_format_labels(self.labels, le)} {cumulative}"
+        yield f"{name}_bucket{_format_labels(self.labels, INF_LABEL)} {count}"
+        yield f"{name}_sum{_format_labels(self.labels)} {_format_value(total)}"
+        yield f"{name}_count{_format_labels(self.labels)} {count}"
+
+
+class Counter:
+    __slots__ = ("value", "labels", "_lock")
+
+    def __init__(self, labels: Tuple[Tuple[str, str], ...] = ()):
+        self.value = 0
+        self.labels = labels
+        self._lock = threading.Lock()
+
+    def inc(self, amount: int = 1):
+        with self._lock:
+            self.value += amount
+
+    def render(self, name: str) -> Iterable[str]:
+        yield f"{name}{_format_labels(self.labels)} {_format_value(self.value)}"
+
+
+class Family:
+    """同名指标按一个标签区分的一组子指标；已知标签值在注册时预先创建"""
+    def __init__(self, name: str, help_text: str, kind: str, factory: Callable, label: str = None,
+                 values: Iterable[str] = ()):
+        self.name = name
+        self.help = help_text
+        self.kind = kind
+        self.label = label
+        self._factory = factory
+        self._children: Dict[str, object] = {}
+        self._lock = threading.Lock()
+        if label is None:
+            self._children[""] = factory(())
+        for value in values:
+            self.labels(value)
+
+    def labels(self, value: str):
+        child = self._children.get(value)
+        if child is None:
+            with self._lock:
+                child = self._children.get(value)
+                if child is None:
+                    child = self._children[value] = self._factory(((self.label, value),))
+        return child
+
+    @property
+    def default(self):
+        return self._children[""]
+
+    def render(self) -> Iterable[str]:
+        yield f"# HELP {self.name} {self.help}"
+        yield f"# TYPE {self.name} {self.kind}"
+        for child in list(self._children.values()):
+            yield from child.render(self.name)
+
+
+class CallbackMetric:
+    """抓取时才计算的指标（队列深度、连接池统计等已有状态）"""
+    def __init__(self, name: str, help_text: str, kind: str, func: Callable[[], object], label: str = None):
+        self.name = name
+        self.help = help_text
+        self.kind = kind
+        self.label = label
+        self.func = func
+
+    def render(self) -> Iterable[str]:
+        yield f"# HELP {self.name} {self.help}"
+        yield f"# TYPE {self.name} {self.kind}"
+        value = self.func()
+        if self.label is None:
+            yield f"{self.name} {_format_value(value)}"
+            return
+        for key, item in value.items():
+            # 统计字典中的非数值项（开关、名称、嵌套结构）不输出
+            if isinstance(item, (int, float)) and not isinstance(item, bool):
+                yield f"{self.name}{_format_labels(((self.label, key),))} {_format_value(item)}"
+
+
+# 指标注册表，输出 Prometheus 文本格式
+class MetricsRegistry:
+    def __init__(self):
+        self._metrics: Dict[str, object] = {}
+
+    def _register(self, metric):
+        existing = self._metrics.get(metric.name)
+        if existing is not None:
+            return existing
+        self._metrics[metric.name] = metric
+        return metric
+
+    def histogram(self, name: str, help_text: str, label: str = None, values: Iterable[str] = (),
+                  buckets: Tuple[float, ...] = LATENCY_BUCKETS) -> Family:
+        return self._register(Family(name, help_text, "histogram",
+                                     lambda labels: Histogram(buckets, labels), label, values))
+
+    def counter(self, name: str, help_text: str, label: str = None, values: Iterable[str] = ()) -> Family:
+        return self._register(Family(name, help_text, "counter", Counter, label, values))
+
+    def callback(self, name: str, help_text: str, func: Callable[[], object], kind: str = "gauge",
+                 label: str = None) -> CallbackMetric:
+        """注册抓取时计算的指标；指定 label 时 func 返回 {标签值: 数值}"""
+        metric = CallbackMetric(name, help_text, kind, func, label)
+        self._metrics[name] = metric
+        return metric
+
+    def render(self) -> str:
+        lines: List[str] = []
+        for metric in list(self._metrics.values()):
+            lines.extend(metric.render())
+        lines.append("")
+        return "\n".join(lines)
+
+
+metrics = MetricsRegistry()
+
+
+def count_rows(result) -> int:
+    """数据库方法返回值对应的行数"""
+    if result is None or result is False:
+        return 0
+    if result is True:
+        return 1
+    if isinstance(result, list):
+        return len(result)
+    if isinstance(result, tuple):
+        return len(result[0]) if result and isinstance(result[0], list) else 1
+    if isinstance(result, dict):
+        return sum(len(value) for value in result.values() if isinstance(value, list))
+    if isinstance(result, int):
+        return 0
+    return 1
+
+
+DB_SECONDS = metrics.histogram("calendar_db_seconds", "DatabaseManager 方法耗时", "method")
+DB_ROWS = metrics.histogram("calendar_db_rows", "DatabaseManager 方法返回的行数", "method",
+                            buckets=COUNT_BUCKETS)
+
+
+def instrumented(method_name: str):
+    """装饰 DatabaseManager 方法，记录耗时和返回行数（子指标在装饰时绑定）"""
+    seconds = DB_SECONDS.labels(method_name)
+    rows = DB_ROWS.labels(method_name)
+    def decorator(func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            result = func(*args, **kwargs)
+            seconds.observe(time.perf_counter() - start)
+            rows.observe(count_rows(result))
+            return result
+        return wrapper
+    return decorator
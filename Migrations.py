@@ -0,0 +1,267 @@
+import json
+import re
+from datetime import date, datetime, timezone
+from typing import Callable, List, Optional, Tuple
+from logger import logger
+from Search import SQL_CREATE_SEARCH_KEYS, SQL_CREATE_FTS, SQL_FTS_TRIGGERS, SQL_FTS_REBUILD
+from CalendarTime import parse_date, parse_time
+
+
+# 数据库结构迁移：每个迁移有递增的版本号，在各自的写事务中执行并记录到 schema_version。
+# 已发布的迁移不再修改，结构变化通过追加新迁移完成
+
+SQL_CREATE_SCHEMA_VERSION = """
+    CREATE TABLE IF NOT EXISTS schema_version (
+        version INTEGER PRIMARY KEY,
+        name TEXT NOT NULL,
+        applied_at TEXT NOT NULL
+    )
+"""
+SQL_CURRENT_VERSION = "SELECT IFNULL(MAX(version), 0) FROM schema_version"
+SQL_RECORD_VERSION = "INSERT INTO schema_version (version, name, applied_at) VALUES (?, ?, ?)"
+
+# 每日事件数的物化计数（按颜色），由触发器随 events 的写入增量维护，概览视图的开销与天数成正比
+SQL_CREATE_DAILY_COUNTS = """
+    CREATE TABLE IF NOT EXISTS daily_counts (
+        date TEXT NOT NULL,
+        color TEXT NOT NULL,
+        count INTEGER NOT NULL,
+        PRIMARY KEY (date, color)
+    ) WITHOUT ROWID
+"""
+SQL_DAILY_COUNT_TRIGGERS = (
+    """
+    CREATE TRIGGER IF NOT EXISTS daily_counts_insert AFTER INSERT ON events BEGIN
+        INSERT INTO daily_counts (date, color, count) VALUES (new.date, IFNULL(new.color, 'blue'), 1)
+        ON CONFLICT (date, color) DO UPDATE SET count = count + 1;
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS daily_counts_delete AFTER DELETE ON events BEGIN
+        UPDATE daily_counts SET count = count - 1 WHERE date = old.date AND color = IFNULL(old.color, 'blue');
+        DELETE FROM daily_counts WHERE date = old.date AND color = IFNULL(old.color, 'blue') AND count <= 0;
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS daily_counts_update AFTER UPDATE OF date, color ON events BEGIN
+        UPDATE daily_counts SET count = count - 1 WHERE date = old.date AND color = IFNULL(old.color, 'blue');
+        DELETE FROM daily_counts WHERE date = old.date AND color = IFNULL(old.color, 'blue') AND count <= 0;
+        INSERT INTO daily_counts (date, color, count) VALUES (new.date, IFNULL(new.color, 'blue'), 1)
+        ON CONFLICT (date, color) DO UPDATE SET count = count + 1;
+    END
+    """,
+)
+SQL_DAILY_COUNTS_REBUILD = (
+    "DELETE FROM daily_counts",
+    "INSERT INTO daily_counts (date, color, count) "
+    "SELECT date, IFNULL(color, 'blue'), COUNT(*) FROM events GROUP BY date, IFNULL(color, 'blue')",
+)
+
+# 无法规范化日期或时间的旧数据行（原样保存为JSON），手动修正后可重新写入
+SQL_CREATE_INVALID_EVENTS = """
+    CREATE TABLE IF NOT EXISTS invalid_events (
+        source TEXT NOT NULL,
+        id TEXT NOT NULL,
+        row TEXT NOT NULL,
+        reason TEXT NOT NULL,
+        moved_at TEXT NOT NULL
+    )
+"""
+# 旧数据中可以识别的写法：2024-3-9、2024/03/09、2024.3.9、2024-03-09T10:00:00；9:5、9.05、09:05:00
+LEGACY_DATE_RE = re.compile(r"(\d{4})[-/.](\d{1,2})[-/.](\d{1,2})(?:[T ].*)?")
+LEGACY_TIME_RE = re.compile(r"(\d{1,2})[:.](\d{1,2})(?::\d{1,2}(?:\.\d+)?)?")
+
+
+def table_exists(conn, name: str) -> bool:
+    return conn.execute("SELECT 1 FROM sqlite_master WHERE name=?", (name,)).fetchone() is not None
+
+
+def normalize_legacy_date(value) -> str:
+    """旧数据中的日期规范为 YYYY-MM-DD，无法识别时抛出ValueError"""
+    match = LEGACY_DATE_RE.fullmatch(value.strip()) if isinstance(value, str) else None
+    if match is None:
+        raise ValueError(f"无法识别的日期: {value}")
+    try:
+        return date(int(match.group(1)), int(match.group(2)), int(match.group(3))).isoformat()
+    except ValueError:
+        raise ValueError(f"日期不存在: {value}")
+
+
+def normalize_legacy_time(value) -> Optional[str]:
+    """旧数据中的时间规范为 HH:MM，空值为全天事件，无法识别时抛出ValueError"""
+    if value is None or (isinstance(value, str) and not value.strip()):
+        return None
+    match = LEGACY_TIME_RE.fullmatch(value.strip()) if isinstance(value, str) else None
+    if match is None or int(match.group(1)) > 23 or int(match.group(2)) > 59:
+        raise ValueError(f"无法识别的时间: {value}")
+    return f"{int(match.group(1)):02d}:{int(match.group(2)):02d}"
+
+
+def _baseline(conn):
+    """
+    完整的表结构；已有数据库（引入迁移之前只有 events 表）只补建缺少的表和触发器，
+    全文索引和每日计数为已有事件补建
+    """
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS events (
+            id TEXT PRIMARY KEY,
+            title TEXT NOT NULL,
+            date TEXT NOT NULL,
+            time TEXT,
+            description TEXT,
+            color TEXT DEFAULT 'blue',
+            created_at TEXT NOT NULL,
+            updated_at TEXT NOT NULL
+        )
+    """)
+
+    # 变更日志：单调递增的序号 + 删除墓碑，用于增量同步
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS change_log (
+            seq INTEGER PRIMARY KEY AUTOINCREMENT,
+            event_id TEXT NOT NULL,
+            op TEXT NOT NULL,
+            date TEXT,
+            old_date TEXT
+        )
+    """)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS recurring_events (
+            id TEXT PRIMARY KEY,
+            title TEXT NOT NULL,
+            date TEXT NOT NULL,
+            time TEXT,
+            description TEXT,
+            color TEXT DEFAULT 'blue',
+            created_at TEXT NOT NULL,
+            updated_at TEXT NOT NULL,
+            rrule TEXT NOT NULL,
+            exdates TEXT,
+            end_date TEXT
+        )
+    """)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS sync_state (
+            key TEXT PRIMARY KEY,
+            value INTEGER NOT NULL
+        )
+    """)
+
+    # 全文索引：索引行按 search_keys 的整数键存储，触发器只用内置SQL删除索引行，索引行由应用写入（见 Search.py）
+    fts_exists = table_exists(conn, "events_fts")
+    conn.execute(SQL_CREATE_SEARCH_KEYS)
+    conn.execute(SQL_CREATE_FTS)
+    for sql in SQL_FTS_TRIGGERS:
+        conn.execute(sql)
+    if not fts_exists:
+        for sql in SQL_FTS_REBUILD:
+            conn.execute(sql)
+
+    counts_exist = table_exists(conn, "daily_counts")
+    conn.execute(SQL_CREATE_DAILY_COUNTS)
+    for sql in SQL_DAILY_COUNT_TRIGGERS:
+        conn.execute(sql)
+    if not counts_exist:
+        for sql in SQL_DAILY_COUNTS_REBUILD:
+            conn.execute(sql)
+
+
+def _normalize_legacy_events(conn):
+    """
+    事件模型只接受 YYYY-MM-DD 和 HH:MM。旧数据中可以识别的写法就地规范化；
+    无法识别的行移到 invalid_events 并记录警告，否则读取全部事件时校验失败。颜色为空的按默认值 blue
+    """
+    conn.execute(SQL_CREATE_INVALID_EVENTS)
+    conn.execute("UPDATE events SET color = 'blue' WHERE color IS NULL")
+    moved_at = datetime.now(timezone.utc).isoformat()
+    fixed = 0
+    moved = []
+    cursor = conn.execute("SELECT rowid, * FROM events")
+    columns = [column[0] for column in cursor.description][1:]
+    for rowid, *values in cursor.fetchall():
+        row = dict(zip(columns, values))
+        try:
+            parse_date(row["date"])
+            if parse_time(row["time"]) == row["time"]:
+                continue
+        except ValueError:
+            pass
+        try:
+            event_date = normalize_legacy_date(row["date"])
+            event_time = normalize_legacy_time(row["time"])
+        except ValueError as e:
+            conn.execute("INSERT INTO invalid_events (source, id, row, reason, moved_at) VALUES (?, ?, ?, ?, ?)",
+                         ("events", row["id"], json.dumps(row, ensure_ascii=False), str(e), moved_at))
+            conn.execute("DELETE FROM events WHERE rowid = ?", (rowid,))
+            moved.append(row["id"])
+            continue
+        conn.execute("UPDATE events SET date = ?, time = ? WHERE rowid = ?", (event_date, event_time, rowid))
+        fixed += 1
+    if fixed:
+        logger.info(f"已规范化 {fixed} 个旧事件的日期或时间")
+    if moved:
+        logger.warning(f"{len(moved)} 个事件的日期或时间无法识别，已移到 invalid_events 表: {', '.join(moved[:20])}")
+
+
+def _integer_day_minute(conn):
+    """
+    events 增加由 date / time 生成的整数列：day 为 1970-01-01 起的天数，minute 为当天0点起的分钟数
+    （全天事件为NULL）。虚拟列不占表空间、由SQLite随写入维护（包括其他进程直接写入的行）。
+    范围查询按 (day, minute) 排序并读取全部列：以整数开头的覆盖索引使查询只扫描索引、无需排序，
+    旧的 (date) 和 (date, created_at) 索引没有查询使用，删除
+    """
+    _normalize_legacy_events(conn)
+    conn.execute("""
+        ALTER TABLE events ADD COLUMN day INTEGER
+        GENERATED ALWAYS AS (CAST(julianday(date) - 2440587.5 AS INTEGER)) VIRTUAL
+    """)
+    conn.execute("""
+        ALTER TABLE events ADD COLUMN minute INTEGER
+        GENERATED ALWAYS AS (CASE WHEN instr(time, ':') > 0 THEN
+            CAST(substr(time, 1, instr(time, ':') - 1) AS INTEGER) * 60
+            + CAST(substr(time, instr(time, ':') + 1, 2) AS INTEGER) END) VIRTUAL
+    """)
+    conn.execute("""
+        CREATE INDEX IF NOT EXISTS idx_events_day
+        ON events(day, minute, id, title, date, time, description, color, created_at, updated_at)
+    """)
+    conn.execute("DROP INDEX IF EXISTS idx_events_date")
+    conn.execute("DROP INDEX IF EXISTS idx_events_date_range")
+
+
+Migration = Tuple[int, str, Callable]
+
+MIGRATIONS: List[Migration] = [
+    (1, "baseline", _baseline),
+    (2, "integer_day_minute", _integer_day_minute),
+]
+
+
+def current_version(conn) -> int:
+    if not table_exists(conn, "schema_version"):
+        return 0
+    return conn.execute(SQL_CURRENT_VERSION).fetchone()[0]
+
+
+def migrate(pool, migrations: List[Migration] = MIGRATIONS) -> List[int]:
+    """
+    按版本顺序执行未应用的迁移
+
+    每个迁移在独立的写事务中执行（BEGIN IMMEDIATE），事务内重新检查版本，
+    多个worker同时启动时只有一个会执行同一个迁移；失败时该迁移整体回滚
+
+    Returns:
+        本次执行的迁移版本号
+    """
+    with pool.writer() as conn:
+        conn.execute(SQL_CREATE_SCHEMA_VERSION)
+    applied = []
+    for version, name, func in sorted(migrations, key=lambda migration: migration[0]):
+        with pool.writer() as conn:
+            if current_version(conn) >= version:
+                continue
+            func(conn)
+            conn.execute(SQL_RECORD_VERSION, (version, name, datetime.now(timezone.utc).isoformat()))
+        applied.append(version)
+        logger.info(f"数据库迁移 {version} ({name}) 已完成")
+    return applied
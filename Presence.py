@@ -0,0 +1,54 @@
+import asyncio
+import os
+from typing import Dict
+from fastapi import WebSocket
+from EventSerializer import dumps
+
+
+# 在线人数广播合并器：连接数变化后每个周期最多推送一次 online_users
+class PresenceBroadcaster:
+    def __init__(self, manager, interval: float = None):
+        """
+        初始化在线人数广播
+
+        Args:
+            manager: 连接管理器
+            interval: 合并周期 (秒)
+        """
+        self.manager = manager
+        self.interval = interval if interval is not None else float(os.getenv("PRESENCE_INTERVAL", 1.0))
+        self.last_sent: Dict[WebSocket, int] = {}
+        self._handle: asyncio.TimerHandle = None
+        self.flushes = 0
+    
+    def count(self) -> int:
+        return self.manager.online_count()
+    
+    def mark_changed(self):
+        """记录一次在线人数变化，在下一个周期统一推送"""
+        if self._handle is None:
+            loop = asyncio.get_running_loop()
+            self._handle = loop.call_later(self.interval, self.flush)
+    
+    def forget(self, websocket: WebSocket):
+        self.last_sent.pop(websocket, None)
+    
+    def flush(self):
+        """向上次收到的人数与当前不一致的客户端推送在线人数"""
+        if self._handle is not None:
+            self._handle.cancel()
+            self._handle = None
+        count = self.count()
+        frame = None
+        encoded = {}
+        for connection, sender in list(self.manager.active_connections.items()):
+            if self.last_sent.get(connection) == count:
+                continue
+            if frame is None:
+                frame = dumps({"type": "online_users", "count": count})
+            self.last_sent[connection] = count
+            self.manager.enqueue_frame(connection, sender, frame, encoded)
+        self.flushes += 1
+        if self.manager.backplane.distributed:
+            # 本worker的人数同步给其他worker（人数未变时不发送）
+            asyncio.get_running_loop().create_task(self.manager.publish_presence())
@@ -0,0 +1,147 @@
+import re
+import threading
+from collections import OrderedDict
+from typing import Callable, Dict, List, Optional
+from Event import Event
+
+
+MONTH_RE = re.compile(r"^\d{4}-(0[1-9]|1[0-2])$")
+
+
+def month_key(date_str: str) -> Optional[str]:
+    """日期所在的月份桶 (YYYY-MM)，格式不规范时返回None"""
+    key = date_str[:7] if isinstance(date_str, str) else None
+    if key and MONTH_RE.match(key):
+        return key
+    return None
+
+
+def next_month(key: str) -> str:
+    year, month = int(key[:4]), int(key[5:7])
+    if month == 12:
+        return f"{year + 1:04d}-01"
+    return f"{year:04d}-{month + 1:02d}"
+
+
+class _Flight:
+    """一次正在进行中的月份加载，相同月份的并发未命中共享同一结果"""
+    def __init__(self):
+        self.done = threading.Event()
+        self.result: List[Event] = None
+        self.error: BaseException = None
+
+
+# 按月份分桶的范围查询缓存：LRU淘汰 + 写入时精确失效 + 并发未命中合并加载
+class RangeCache:
+    def __init__(self, loader: Callable[[str, str], List[Event]], max_months: int = 48, max_span_months: int = 24):
+        """
+        初始化范围缓存
+
+        Args:
+            loader: 加载函数 loader(lower, upper)，返回 lower <= date < upper 的事件（按日期、时间排序）
+            max_months: 最多缓存的月份桶数量
+            max_span_months: 单次查询跨越的月份超过该值时直接查询数据库
+        """
+        self.loader = loader
+        self.max_months = max_months
+        self.max_span_months = max_span_months
+        self.buckets: "OrderedDict[str, List[Event]]" = OrderedDict()
+        self.generations: Dict[str, int] = {}
+        self.inflight: Dict[str, _Flight] = {}
+        self.lock = threading.Lock()
+        self.stats = {"hits": 0, "misses": 0, "loads": 0, "shared_loads": 0, "invalidations": 0, "evictions": 0}
+    
+    def months_for_range(self, start_date: str, end_date: str) -> Optional[List[str]]:
+        """覆盖范围的连续月份桶；无法分桶时返回None"""
+        first, last = month_key(start_date), month_key(end_date)
+        if first is None or last is None or first > last:
+            return None
+        months = [first]
+        while months[-1] != last:
+            if len(months) >= self.max_span_months:
+                return None
+            months.append(next_month(months[-1]))
+        return months
+    
+    def get_range(self, start_date: str, end_date: str) -> Optional[List[Event]]:
+        """返回范围内的事件，范围无法分桶时返回None由调用方直接查询"""
+        months = self.months_for_range(start_date, end_date)
+        if months is None:
+            return None
+        
+        events = []
+        for key in months:
+            for event in self._get_month(key):
+                if start_date <= event.date <= end_date:
+                    events.append(event)
+        return events
+    
+    def _get_month(self, key: str) -> List[Event]:
+        with self.lock:
+            bucket = self.buckets.get(key)
+            if bucket is not None:
+                self.buckets.move_to_end(key)
+                self.stats["hits"] += 1
+                return bucket
+            
+            self.stats["misses"] += 1
+            flight = self.inflight.get(key)
+            leader = flight is None
+            if leader:
+                flight = self.inflight[key] = _Flight()
+                generation = self.generations.get(key, 0)
+            else:
+                self.stats["shared_loads"] += 1
+        
+        if not leader:
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.result
+        
+        try:
+            flight.result = self.loader(key, next_month(key))
+        except BaseException as e:
+            flight.error = e
+            raise
+        finally:
+            with self.lock:
+                if self.inflight.get(key) is flight:
+                    del self.inflight[key]
+                # 加载期间发生写入时不缓存可能过期的结果
+                if flight.error is None and self.generations.get(key, 0) == generation:
+                    self.buckets[key] = flight.result
+                    self.stats["loads"] += 1
+                    while len(self.buckets) > self.max_months:
+                        self.buckets.popitem(last=False)
+                        self.stats["evictions"] += 1
+            flight.done.set()
+        return flight.result
+    
+    def invalidate_date(self, date_str: str):
+        """使包含该日期的月份桶失效"""
+        key = month_key(date_str)
+        if key is None:
+            self.clear()
+            return
+        with self.lock:
+            self.generations[key] = self.generations.get(key, 0) + 1
+            self.buckets.pop(key, None)
+            self.inflight.pop(key, None)
+            self.stats["invalidations"] += 1
+    
+    def clear(self):
+        with self.lock:
+            for key in set(self.buckets) | set(self.inflight):
+                self.generations[key] = self.generations.get(key, 0) + 1
+            self.buckets.clear()
+            self.inflight.clear()
+            self.stats["invalidations"] += 1
+    
+    def get_stats(self) -> dict:
+        with self.lock:
+            stats = dict(self.stats)
+            stats["months_cached"] = len(self.buckets)
+            stats["events_cached"] = sum(len(bucket) for bucket in self.buckets.values())
+        stats["max_months"] = self.max_months
+        return stats
@@ -0,0 +1,179 @@
+import bisect
+import calendar
+from datetime import date, timedelta
+from functools import lru_cache
+from typing import List, Optional, Tuple
+from Event import Event, Recurrence
+
+
+FREQUENCIES = ("DAILY", "WEEKLY", "MONTHLY", "YEARLY")
+
+# 没有COUNT/UNTIL的规则在单个窗口内最多展开的次数，防止超大范围查询
+MAX_OCCURRENCES = 5000
+# 重复间隔的上限：更大的间隔展开时很快超出 date 的范围
+MAX_INTERVAL = 1000
+
+
+def _parse_date(value: str, field: str) -> date:
+    try:
+        return date.fromisoformat(value)
+    except (TypeError, ValueError):
+        raise ValueError(f"{field} 必须是 YYYY-MM-DD 格式: {value}")
+
+
+def validate_recurrence(recurrence: Recurrence, dtstart: str):
+    """校验重复规则，不合法时抛出ValueError"""
+    if recurrence.freq.upper() not in FREQUENCIES:
+        raise ValueError(f"不支持的重复频率: {recurrence.freq}")
+    if not 1 <= recurrence.interval <= MAX_INTERVAL:
+        raise ValueError(f"重复间隔必须在 1 到 {MAX_INTERVAL} 之间")
+    if recurrence.count is not None and not 1 <= recurrence.count <= MAX_OCCURRENCES:
+        raise ValueError(f"重复次数必须在 1 到 {MAX_OCCURRENCES} 之间")
+    start = _parse_date(dtstart, "date")
+    if recurrence.until is not None and _parse_date(recurrence.until, "until") < start:
+        raise ValueError("重复结束日期不能早于开始日期")
+    for exdate in recurrence.exdates:
+        _parse_date(exdate, "exdates")
+
+
+def to_rrule(recurrence: Recurrence) -> str:
+    """转换为RRULE文本，例如 FREQ=WEEKLY;INTERVAL=2;UNTIL=20241231"""
+    parts = [f"FREQ={recurrence.freq.upper()}", f"INTERVAL={recurrence.interval}"]
+    if recurrence.until:
+        parts.append(f"UNTIL={recurrence.until.replace('-', '')}")
+    if recurrence.count:
+        parts.append(f"COUNT={recurrence.count}")
+    return ";".join(parts)
+
+
+def from_rrule(rrule: str, exdates: Optional[str] = None) -> Recurrence:
+    """从RRULE文本和逗号分隔的排除日期还原重复规则"""
+    fields = dict(part.split("=", 1) for part in rrule.split(";") if "=" in part)
+    until = fields.get("UNTIL")
+    if until:
+        until = until[:8]
+        until = f"{until[:4]}-{until[4:6]}-{until[6:8]}"
+    return Recurrence(
+        freq=fields.get("FREQ", "DAILY"),
+        interval=int(fields.get("INTERVAL", 1)),
+        until=until,
+        count=int(fields["COUNT"]) if fields.get("COUNT") else None,
+        exdates=[d for d in (exdates or "").split(",") if d]
+    )
+
+
+def _nth(start: date, freq: str, step: int) -> Optional[date]:
+    """第 step 个周期对应的日期，该月/年不存在这一天时返回None，超出 date.max 时抛出OverflowError"""
+    if freq in ("DAILY", "WEEKLY"):
+        days = step * 7 if freq == "WEEKLY" else step
+        if days > (date.max - start).days:
+            raise OverflowError("重复日期超出范围")
+        return start + timedelta(days=days)
+    if freq == "MONTHLY":
+        months = start.month - 1 + step
+        year, month = start.year + months // 12, months % 12 + 1
+    else:
+        year, month = start.year + step, start.month
+    if year > date.max.year:
+        raise OverflowError("重复日期超出范围")
+    if start.day > calendar.monthrange(year, month)[1]:
+        return None
+    return date(year, month, start.day)
+
+
+def _steps_before(start: date, freq: str, target: date) -> int:
+    """target 之前大约经过的周期数（用于跳过窗口之前的部分）"""
+    if freq == "DAILY":
+        return max((target - start).days, 0)
+    if freq == "WEEKLY":
+        return max((target - start).days // 7, 0)
+    if freq == "MONTHLY":
+        return max((target.year - start.year) * 12 + target.month - start.month - 1, 0)
+    return max(target.year - start.year - 1, 0)
+
+
+@lru_cache(maxsize=4096)
+def expand_dates(rrule: str, exdates: str, dtstart: str, window_start: str, window_end: str) -> Tuple[str, ...]:
+    """
+    展开重复规则在窗口 [window_start, window_end] 内的所有日期（结果被缓存）
+
+    COUNT 按 RFC 5545 计数：不存在的日期（如2月30日）不计入，EXDATE 排除的日期计入
+    """
+    recurrence = from_rrule(rrule, exdates)
+    start = date.fromisoformat(dtstart)
+    try:
+        lower = max(date.fromisoformat(window_start), start)
+        upper = date.fromisoformat(window_end)
+    except ValueError:
+        return ()
+    if recurrence.until:
+        upper = min(upper, date.fromisoformat(recurrence.until))
+    if lower > upper:
+        return ()
+    
+    freq = recurrence.freq.upper()
+    interval = recurrence.interval
+    excluded = set(recurrence.exdates)
+    
+    # 有COUNT的月/年规则需要从头计数（跳过的日期不计数），其他情况可以直接跳到窗口附近
+    k = 0
+    if recurrence.count is None or freq in ("DAILY", "WEEKLY"):
+        k = _steps_before(start, freq, lower) // interval
+    produced = k if freq in ("DAILY", "WEEKLY") else 0
+    
+    dates = []
+    while len(dates) < MAX_OCCURRENCES:
+        if recurrence.count is not None and produced >= recurrence.count:
+            break
+        try:
+            current = _nth(start, freq, k * interval)
+        except OverflowError:
+            break
+        k += 1
+        if current is None:
+            continue
+        if current > upper:
+            break
+        produced += 1
+        if current >= lower and current.isoformat() not in excluded:
+            dates.append(current.isoformat())
+    return tuple(dates)
+
+
+def series_end(recurrence: Recurrence, dtstart: str) -> Optional[str]:
+    """系列最后一次发生的日期，无限重复时返回None"""
+    if recurrence.count is None:
+        return recurrence.until
+    upper = recurrence.until or "9999-12-31"
+    rrule = to_rrule(Recurrence(freq=recurrence.freq, interval=recurrence.interval,
+                                until=recurrence.until, count=recurrence.count))
+    dates = expand_dates(rrule, "", dtstart, dtstart, upper)
+    return dates[-1] if dates else dtstart
+
+
+def expand_event(series: Event, window_start: str, window_end: str) -> List[Event]:
+    """把一个重复系列展开为窗口内的单次事件（id与系列相同，series_start记录系列的起始日期）"""
+    recurrence = series.recurrence
+    dates = expand_dates(to_rrule(recurrence), ",".join(recurrence.exdates),
+                         series.date, window_start, window_end)
+    return [series.copy(update={"date": occurrence, "series_start": series.date}) for occurrence in dates]
+
+
+def expand_event_after(series: Event, window_start: str, window_end: str, after: tuple, limit: int) -> List[Event]:
+    """窗口内分页位置 after (date, time, id) 之后的前 limit 个单次发生，用于键集分页"""
+    recurrence = series.recurrence
+    dates = expand_dates(to_rrule(recurrence), ",".join(recurrence.exdates),
+                         series.date, window_start, window_end)
+    time, occurrences = series.time or "", []
+    for occurrence in dates[bisect.bisect_left(dates, after[0]):]:
+        if len(occurrences) >= limit:
+            break
+        if (occurrence, time, series.id) > after:
+            occurrences.append(series.copy(update={"date": occurrence, "series_start": series.date}))
+    return occurrences
+
+
+def occurs_in_range(series: Event, window_start: str, window_end: str) -> bool:
+    recurrence = series.recurrence
+    return bool(expand_dates(to_rrule(recurrence), ",".join(recurrence.exdates),
+                             series.date, window_start, window_end))
@@ -0,0 +1,126 @@
+import re
+import sqlite3
+from typing import Optional
+
+
+# 中日韩文字没有空格分词：索引和查询时把每个字单独作为一个词，
+# 查询中连续的汉字组成短语，匹配原文中相邻的字（等同子串匹配）
+CJK_RE = re.compile(r"([⺀-鿿가-힯豈-﫿])")
+TERM_RE = re.compile(r"\w+")
+
+# 索引表的 rowid 是 search_keys 中事件id对应的整数键（单次事件和重复系列共用，id在两表间唯一）。
+# 键为 INTEGER PRIMARY KEY，VACUUM 不会重新编号；events / recurring_events 的隐式rowid可能被重新编号，不能作为索引键
+SQL_CREATE_SEARCH_KEYS = """
+    CREATE TABLE IF NOT EXISTS search_keys (
+        key INTEGER PRIMARY KEY,
+        id TEXT NOT NULL UNIQUE
+    )
+"""
+SQL_CREATE_FTS = """
+    CREATE VIRTUAL TABLE IF NOT EXISTS events_fts USING fts5(
+        title, description,
+        tokenize = 'unicode61 remove_diacritics 2',
+        prefix = '1 2 3'
+    )
+"""
+# 触发器只用内置SQL删除索引行和键，任何连接（sqlite3命令行、备份和修复工具）都可以写入 events；
+# 索引行由应用在同一写事务中写入（index_events / index_series，需要 fts_text），
+# 其他连接插入或修改标题的行缺少索引，启动时由 SQL_FTS_MISSING 补建
+SQL_FTS_TRIGGERS = (
+    """
+    CREATE TRIGGER IF NOT EXISTS events_fts_delete AFTER DELETE ON events BEGIN
+        DELETE FROM events_fts WHERE rowid = (SELECT key FROM search_keys WHERE id = old.id);
+        DELETE FROM search_keys WHERE id = old.id;
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS events_fts_update AFTER UPDATE OF id, title, description ON events BEGIN
+        DELETE FROM events_fts WHERE rowid = (SELECT key FROM search_keys WHERE id = old.id);
+        DELETE FROM search_keys WHERE id = old.id;
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS recurring_events_fts_delete AFTER DELETE ON recurring_events BEGIN
+        DELETE FROM events_fts WHERE rowid = (SELECT key FROM search_keys WHERE id = old.id);
+        DELETE FROM search_keys WHERE id = old.id;
+    END
+    """,
+)
+SQL_SEARCH_KEY = "INSERT INTO search_keys (id) VALUES (?) ON CONFLICT (id) DO NOTHING"
+SQL_FTS_INDEX_EVENT = """
+    INSERT OR REPLACE INTO events_fts (rowid, title, description)
+    SELECT k.key, fts_text(e.title), fts_text(e.description)
+    FROM events e JOIN search_keys k ON k.id = e.id WHERE e.id = ?
+"""
+SQL_FTS_INDEX_SERIES = """
+    INSERT OR REPLACE INTO events_fts (rowid, title, description)
+    SELECT k.key, fts_text(r.title), fts_text(r.description)
+    FROM recurring_events r JOIN search_keys k ON k.id = r.id WHERE r.id = ?
+"""
+SQL_FTS_MISSING = (
+    # 其他连接删除或改过id的事件留下的键和索引行
+    "DELETE FROM search_keys WHERE id NOT IN (SELECT id FROM events) AND id NOT IN (SELECT id FROM recurring_events)",
+    "DELETE FROM events_fts WHERE rowid NOT IN (SELECT key FROM search_keys)",
+    "INSERT INTO search_keys (id) SELECT id FROM events WHERE id NOT IN (SELECT id FROM search_keys)",
+    "INSERT INTO search_keys (id) SELECT id FROM recurring_events WHERE id NOT IN (SELECT id FROM search_keys)",
+    "INSERT INTO events_fts (rowid, title, description) "
+    "SELECT k.key, fts_text(e.title), fts_text(e.description) FROM search_keys k JOIN events e ON e.id = k.id "
+    "WHERE k.key NOT IN (SELECT rowid FROM events_fts)",
+    "INSERT INTO events_fts (rowid, title, description) "
+    "SELECT k.key, fts_text(r.title), fts_text(r.description) FROM search_keys k JOIN recurring_events r ON r.id = k.id "
+    "WHERE k.key NOT IN (SELECT rowid FROM events_fts)",
+)
+SQL_FTS_REBUILD = (
+    "DELETE FROM events_fts",
+    "DELETE FROM search_keys",
+) + SQL_FTS_MISSING[2:]
+
+
+def fts_text(text: Optional[str]) -> Optional[str]:
+    """写入索引前的文本：汉字两侧加空格，使每个字成为一个词"""
+    if not text:
+        return text
+    return CJK_RE.sub(r" \1 ", text)
+
+
+def register_functions(conn: sqlite3.Connection):
+    """注册写入全文索引使用的SQL函数"""
+    conn.create_function("fts_text", 1, fts_text, deterministic=True)
+
+
+def index_events(conn: sqlite3.Connection, event_ids):
+    """在当前写事务中为刚插入或修改过标题/描述的单次事件写入索引行"""
+    params = [(event_id,) for event_id in event_ids]
+    conn.executemany(SQL_SEARCH_KEY, params)
+    conn.executemany(SQL_FTS_INDEX_EVENT, params)
+
+
+def index_series(conn: sqlite3.Connection, event_id: str):
+    """在当前写事务中为刚插入的重复系列写入索引行"""
+    conn.execute(SQL_SEARCH_KEY, (event_id,))
+    conn.execute(SQL_FTS_INDEX_SERIES, (event_id,))
+
+
+def index_missing(conn: sqlite3.Connection) -> int:
+    """清理其他连接直接删除的事件留下的键，并补建缺少索引行的事件，返回补建数"""
+    for sql in SQL_FTS_MISSING[:-2]:
+        conn.execute(sql)
+    return sum(conn.execute(sql).rowcount for sql in SQL_FTS_MISSING[-2:])
+
+
+def build_match_query(query: str, prefix: bool = True) -> Optional[str]:
+    """
+    把用户输入转换为FTS5查询：各个词之间为 AND，每个词转为短语（汉字逐字相邻匹配）；
+    prefix 为 True 时词尾的非汉字部分按前缀匹配，用于输入时联想
+
+    Returns:
+        FTS5 MATCH 表达式，输入中没有可搜索的词时返回None
+    """
+    parts = []
+    for term in TERM_RE.findall(query or ""):
+        tokens = fts_text(term).split()
+        phrase = '"' + " ".join(tokens) + '"'
+        if prefix and not CJK_RE.fullmatch(tokens[-1]):
+            phrase += " *"
+        parts.append(phrase)
+    return " AND ".join(parts) if parts else None
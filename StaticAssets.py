@@ -0,0 +1,135 @@
+import gzip
+import hashlib
+import mimetypes
+import os
+from typing import Dict, Optional
+from fastapi import Request, Response
+from logger import logger
+
+try:
+    import brotli
+except ImportError:  # 未安装brotli时只提供gzip
+    brotli = None
+
+
+# 带内容哈希的文件名可以永久缓存；HTML入口每次向服务端验证（内容未变时返回304）
+IMMUTABLE = "public, max-age=31536000, immutable"
+REVALIDATE = "no-cache"
+# 小于该字节数的文件不压缩
+MIN_COMPRESS_SIZE = 256
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+class Asset:
+    __slots__ = ("name", "content_type", "etag", "variants", "cache_control")
+
+    def __init__(self, name: str, data: bytes, content_type: str, cache_control: str):
+        self.name = name
+        self.content_type = content_type
+        self.cache_control = cache_control
+        self.etag = hashlib.sha256(data).hexdigest()[:16]
+        # 各编码的内容在启动时预先压缩好，请求时直接返回
+        self.variants: Dict[str, bytes] = {"identity": data}
+        if len(data) >= MIN_COMPRESS_SIZE:
+            self.variants["gzip"] = gzip.compress(data, compresslevel=9, mtime=0)
+            if brotli is not None:
+                self.variants["br"] = brotli.compress(data, quality=11)
+
+
+def accepted_encodings(header: str) -> set:
+    """解析 Accept-Encoding，返回客户端接受的编码（忽略 q=0）"""
+    accepted = set()
+    for part in header.split(","):
+        name, _, params = part.strip().partition(";")
+        params = params.replace(" ", "")
+        if params.startswith("q="):
+            try:
+                if float(params[2:]) == 0:
+                    continue
+            except ValueError:
+                continue
+        if name:
+            accepted.add(name.strip().lower())
+    return accepted
+
+
+# 静态资源：启动时读取、计算内容哈希并预压缩，之后全部从内存返回
+class StaticAssets:
+    def __init__(self, index_path: str = os.path.join(BASE_DIR, "index.html"),
+                 static_dir: str = os.path.join(BASE_DIR, "static")):
+        """
+        初始化静态资源
+
+        Args:
+            index_path: HTML入口文件，其中对 "static/文件名" 的引用会改写为带哈希的文件名
+            static_dir: 静态文件目录，通过 {ROOT_PATH}/static/ 访问
+        """
+        self.index_path = index_path
+        self.static_dir = static_dir
+        self.assets: Dict[str, Asset] = {}
+        self.urls: Dict[str, str] = {}
+        self.stats = {"responses": 0, "not_modified": 0, "gzip": 0, "br": 0, "identity": 0}
+
+    def load(self):
+        """读取全部文件；文件修改后需要重新加载（重启服务）"""
+        assets = {}
+        urls = {}
+        if os.path.isdir(self.static_dir):
+            for name in sorted(os.listdir(self.static_dir)):
+                path = os.path.join(self.static_dir, name)
+                if not os.path.isfile(path):
+                    continue
+                with open(path, "rb") as f:
+                    data = f.read()
+                content_type = mimetypes.guess_type(name)[0] or "application/octet-stream"
+                # 原文件名仍可访问（需要验证），带哈希的文件名永久缓存
+                assets[name] = Asset(name, data, content_type, REVALIDATE)
+                stem, ext = os.path.splitext(name)
+                hashed = f"{stem}.{assets[name].etag[:10]}{ext}"
+                assets[hashed] = Asset(hashed, data, content_type, IMMUTABLE)
+                urls[name] = hashed
+
+        with open(self.index_path, "rb") as f:
+            html = f.read().decode("utf-8")
+        for name, hashed in urls.items():
+            html = html.replace(f'"static/{name}"', f'"static/{hashed}"')
+        assets[os.path.basename(self.index_path)] = Asset(
+            self.index_path, html.encode("utf-8"), "text/html", REVALIDATE
+        )
+        self.assets = assets
+        self.urls = urls
+        logger.info(f"静态资源已加载: {len(assets)} 个 (brotli: {'是' if brotli is not None else '否'})")
+
+    def get(self, name: str) -> Optional[Asset]:
+        return self.assets.get(name)
+
+    def response(self, request: Request, asset: Asset) -> Response:
+        """按 If-None-Match 返回304，否则按 Accept-Encoding 返回预压缩的内容"""
+        self.stats["responses"] += 1
+        accepted = accepted_encodings(request.headers.get("accept-encoding", ""))
+        encoding = next((name for name in ("br", "gzip") if name in accepted and name in asset.variants),
+                        "identity")
+        # 各编码是不同的表示，ETag 带编码后缀；验证时只比较内容哈希部分
+        etag = f'"{asset.etag}"' if encoding == "identity" else f'"{asset.etag}-{encoding}"'
+        headers = {"ETag": etag, "Cache-Control": asset.cache_control, "Vary": "Accept-Encoding"}
+
+        if_none_match = request.headers.get("if-none-match")
+        if if_none_match:
+            tags = {tag.strip().replace("W/", "", 1).strip('"').split("-")[0] for tag in if_none_match.split(",")}
+            if asset.etag in tags or "*" in tags:
+                self.stats["not_modified"] += 1
+                return Response(status_code=304, headers=headers)
+
+        self.stats[encoding] += 1
+        if encoding != "identity":
+            headers["Content-Encoding"] = encoding
+        return Response(content=asset.variants[encoding], media_type=asset.content_type, headers=headers)
+
+    def get_stats(self) -> dict:
+        stats = dict(self.stats)
+        stats["assets"] = len(self.assets)
+        stats["bytes"] = sum(len(asset.variants["identity"]) for asset in self.assets.values())
+        return stats
+
+
+assets = StaticAssets()
@@ -0,0 +1,93 @@
+from typing import Dict, Hashable, Optional, Set, Tuple
+from CalendarTime import day_number
+
+
+# 按日期分桶的订阅索引：事件日期 -> 正在查看该日期的客户端。
+# 桶和宽范围都以整数天数 (CalendarTime.day_number) 为键，查找时只做一次日期解析和整数比较
+class SubscriptionIndex:
+    def __init__(self, max_bucket_days: int = 400):
+        """
+        初始化订阅索引
+
+        Args:
+            max_bucket_days: 视图范围超过该天数时不再逐日分桶，改为放入宽范围列表线性匹配
+        """
+        self.max_bucket_days = max_bucket_days
+        self.buckets: Dict[int, Set[Hashable]] = {}
+        self.ranges: Dict[Hashable, Tuple[str, str]] = {}
+        self.wide: Dict[Hashable, Tuple[int, int]] = {}
+        self.bucketed_days: Dict[Hashable, range] = {}
+    
+    def __len__(self):
+        return len(self.ranges)
+    
+    @staticmethod
+    def _days(start_date: str, end_date: str) -> Optional[Tuple[int, int]]:
+        """范围的起止天数，无法解析时返回None"""
+        try:
+            return day_number(start_date), day_number(end_date)
+        except (TypeError, ValueError):
+            return None
+    
+    def add(self, client: Hashable, start_date: str, end_date: str):
+        """登记（或替换）客户端的视图范围"""
+        if self.ranges.get(client) == (start_date, end_date):
+            return
+        self.remove(client)
+        self.ranges[client] = (start_date, end_date)
+        
+        days = self._days(start_date, end_date)
+        if days is None:
+            # 无法解析的范围（ViewRange 已校验日期，正常不会出现）只能通过按字符串比较的退化路径匹配
+            return
+        keys = range(days[0], days[1] + 1)
+        if len(keys) > self.max_bucket_days:
+            self.wide[client] = days
+            return
+        for key in keys:
+            bucket = self.buckets.get(key)
+            if bucket is None:
+                bucket = self.buckets[key] = set()
+            bucket.add(client)
+        self.bucketed_days[client] = keys
+    
+    def remove(self, client: Hashable):
+        """移除客户端的全部订阅"""
+        if self.ranges.pop(client, None) is None:
+            return
+        self.wide.pop(client, None)
+        for key in self.bucketed_days.pop(client, ()):
+            bucket = self.buckets.get(key)
+            if bucket is not None:
+                bucket.discard(client)
+                if not bucket:
+                    del self.buckets[key]
+    
+    def clients_for_date(self, event_date: str) -> Set[Hashable]:
+        """返回视图范围包含该日期的所有客户端"""
+        try:
+            key = day_number(event_date)
+        except (TypeError, ValueError):
+            # 非标准日期格式，退化为按字符串比较逐个匹配
+            return {client for client, (start, end) in self.ranges.items() if start <= event_date <= end}
+        
+        clients = set(self.buckets.get(key, ()))
+        for client, (start, end) in self.wide.items():
+            if start <= key <= end:
+                clients.add(client)
+        return clients
+    
+    def clients_for_range(self, start_date: str, end_date: str) -> Set[Hashable]:
+        """返回视图范围与给定日期范围有交集的所有客户端（end_date 为 None 表示无上限）"""
+        days = None if end_date is None else self._days(start_date, end_date)
+        if days is None or days[1] - days[0] >= self.max_bucket_days:
+            return {client for client, (start, end) in self.ranges.items()
+                    if end >= start_date and (end_date is None or start <= end_date)}
+        
+        clients = set()
+        for key in range(days[0], days[1] + 1):
+            clients.update(self.buckets.get(key, ()))
+        for client, (start, end) in self.wide.items():
+            if end >= days[0] and start <= days[1]:
+                clients.add(client)
+        return clients
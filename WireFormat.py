@@ -0,0 +1,96 @@
+import os
+import zlib
+from typing import Dict, Iterable, Optional, Tuple, Union
+
+try:
+    import msgpack
+except ImportError:  # 未安装msgpack时只提供JSON格式
+    msgpack = None
+
+try:
+    import orjson
+    _loads = orjson.loads
+except ImportError:
+    import json
+    _loads = json.loads
+
+
+# 二进制帧首字节的标志位：是否zlib压缩、负载是否为MessagePack（否则为UTF-8 JSON）
+FLAG_ZLIB = 0x01
+FLAG_MSGPACK = 0x02
+
+COMPRESS_THRESHOLD = int(os.getenv("WS_COMPRESS_THRESHOLD", 1024))
+COMPRESS_LEVEL = int(os.getenv("WS_COMPRESS_LEVEL", 6))
+
+
+# 客户端协商的帧格式。服务端内部统一使用JSON文本，发送前按格式转换；
+# 同一次广播中相同格式的客户端共用一次转换结果
+class WireFormat:
+    def __init__(self, name: str, compression: Optional[str], threshold: int = COMPRESS_THRESHOLD,
+                 level: int = COMPRESS_LEVEL):
+        """
+        Args:
+            name: 负载格式 json / msgpack
+            compression: zlib 或 None
+            threshold: 超过该字节数的负载才压缩
+            level: zlib压缩级别
+        """
+        self.name = name
+        self.compression = compression
+        self.threshold = threshold
+        self.level = level
+        self.stats = {"frames": 0, "compressed": 0, "bytes_in": 0, "bytes_out": 0}
+
+    def encode(self, frame: str) -> Union[str, bytes]:
+        """把JSON文本帧转换为该格式：未压缩的JSON仍以文本帧发送，其余为带标志字节的二进制帧"""
+        payload = frame.encode("utf-8")
+        size = len(payload)
+        flags = 0
+        if self.name == "msgpack":
+            payload = msgpack.packb(_loads(payload), use_bin_type=True)
+            flags |= FLAG_MSGPACK
+        if self.compression == "zlib" and len(payload) > self.threshold:
+            payload = zlib.compress(payload, self.level)
+            flags |= FLAG_ZLIB
+            self.stats["compressed"] += 1
+
+        self.stats["frames"] += 1
+        self.stats["bytes_in"] += size
+        if not flags:
+            self.stats["bytes_out"] += size
+            return frame
+        self.stats["bytes_out"] += len(payload) + 1
+        return bytes((flags,)) + payload
+
+    def describe(self) -> dict:
+        return {"format": self.name, "compression": self.compression, "threshold": self.threshold}
+
+
+def available_formats() -> Tuple[str, ...]:
+    return ("msgpack", "json") if msgpack is not None else ("json",)
+
+
+_formats: Dict[Tuple[str, Optional[str]], WireFormat] = {}
+
+
+def negotiate(formats: Iterable[str] = None, compression: Iterable[str] = None) -> Optional[WireFormat]:
+    """
+    按客户端的偏好顺序选择服务端支持的格式和压缩
+
+    Returns:
+        共享的 WireFormat 实例；结果等同默认的JSON文本时返回None
+    """
+    supported = available_formats()
+    name = next((f for f in (formats or ()) if f in supported), "json")
+    method = "zlib" if "zlib" in (compression or ()) else None
+    if name == "json" and method is None:
+        return None
+    key = (name, method)
+    wire = _formats.get(key)
+    if wire is None:
+        wire = _formats[key] = WireFormat(name, method)
+    return wire
+
+
+def get_stats() -> dict:
+    return {f"{name}+{method or 'none'}": dict(wire.stats) for (name, method), wire in _formats.items()}
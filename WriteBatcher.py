@@ -0,0 +1,100 @@
+import asyncio
+import os
+import time
+from typing import List, Optional, Tuple
+from logger import logger
+from Metrics import metrics, COUNT_BUCKETS
+
+
+BATCH_SIZE = metrics.histogram("calendar_write_batch_size", "每次组提交包含的写操作数",
+                               buckets=COUNT_BUCKETS).default
+BATCH_SECONDS = metrics.histogram("calendar_write_batch_seconds", "每次组提交事务的执行耗时").default
+BATCH_WAIT_SECONDS = metrics.histogram("calendar_write_batch_wait_seconds", "写操作从提交到所在批次开始执行的等待时间").default
+
+
+# 写操作组提交：短时间窗口内到达的单个写操作合并到一个事务中执行，减少提交（fsync）次数。
+# 同一时刻最多一个批次在执行，执行期间到达的写操作进入下一批次
+class WriteBatcher:
+    def __init__(self, async_db, window: float = None, max_batch: int = None):
+        """
+        初始化写批处理
+
+        Args:
+            async_db: 异步数据库访问层，批次在其线程池中执行
+            window: 第一个写操作到达后等待更多写操作的时间 (秒)
+            max_batch: 单个批次的最大操作数，达到后立即执行；1 表示不合并
+        """
+        self.async_db = async_db
+        self.window = window if window is not None else float(os.getenv("WRITE_BATCH_WINDOW_MS", 2)) / 1000
+        self.max_batch = max_batch if max_batch is not None else int(os.getenv("WRITE_BATCH_MAX", 64))
+        self.pending: List[Tuple[object, tuple, asyncio.Future, float]] = []
+        self._handle: Optional[asyncio.TimerHandle] = None
+        self._running = False
+        self.stats = {"batches": 0, "operations": 0, "failed_operations": 0, "max_batch_seen": 0}
+
+    async def submit(self, func, *args):
+        """
+        提交一个写操作（DatabaseManager 的写方法），返回该操作的结果；
+        操作抛出的异常只传给它自己的调用方
+        """
+        if self.max_batch <= 1:
+            return await self.async_db.run(func, *args)
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self.pending.append((func, args, future, time.perf_counter()))
+        if not self._running:
+            if len(self.pending) >= self.max_batch or self.window <= 0:
+                self._flush()
+            elif self._handle is None:
+                self._handle = loop.call_later(self.window, self._flush)
+        return await future
+
+    def _flush(self):
+        if self._handle is not None:
+            self._handle.cancel()
+            self._handle = None
+        if self._running or not self.pending:
+            return
+        batch = self.pending[:self.max_batch]
+        del self.pending[:self.max_batch]
+        self._running = True
+        asyncio.get_running_loop().create_task(self._commit(batch))
+
+    async def _commit(self, batch: list):
+        start = time.perf_counter()
+        for _, _, _, submitted in batch:
+            BATCH_WAIT_SECONDS.observe(start - submitted)
+        try:
+            results = await self.async_db.run(self.async_db.db.apply_group,
+                                              [(func, args) for func, args, _, _ in batch])
+        except Exception as e:
+            # 提交本身失败：整个批次都没有写入
+            logger.error(f"组提交失败 ({len(batch)} 个写操作): {e!r}")
+            results = [(False, e)] * len(batch)
+        finally:
+            self._running = False
+
+        BATCH_SIZE.observe(len(batch))
+        BATCH_SECONDS.observe(time.perf_counter() - start)
+        self.stats["batches"] += 1
+        self.stats["operations"] += len(batch)
+        self.stats["max_batch_seen"] = max(self.stats["max_batch_seen"], len(batch))
+        for (_, _, future, _), (ok, value) in zip(batch, results):
+            if future.done():
+                continue
+            if ok:
+                future.set_result(value)
+            else:
+                self.stats["failed_operations"] += 1
+                future.set_exception(value)
+
+        # 执行期间积累的写操作立即组成下一批次
+        if self.pending:
+            self._flush()
+
+    def get_stats(self) -> dict:
+        stats = dict(self.stats)
+        stats["window_ms"] = self.window * 1000
+        stats["max_batch"] = self.max_batch
+        stats["pending"] = len(self.pending)
+        return stats
@@ -0,0 +1,577 @@
+"""
+日历服务的基准测试与压测工具
+
+    python benchmark.py micro [--events 20000] [--iterations 2000] [--clients 5000]
+    python benchmark.py load  [--clients 2000] [--ws-writers 4] [--rest-writers 4] [--duration 20]
+    python benchmark.py explain [--events 20000]
+
+micro: 在临时数据库上测量 DatabaseManager 各方法的耗时，以及 ConnectionManager 的广播扇出
+load:  在子进程中启动服务，模拟大量 WebSocket 客户端订阅视图范围，同时通过 WS 和 REST 写入，
+       统计吞吐、端到端广播延迟 (p50/p95/p99)、数据库统计和每个连接占用的内存
+explain: 在迁移后的临时数据库上检查热点查询的执行计划（使用覆盖索引、无需临时排序），不符合时退出码为1
+"""
+import argparse
+import asyncio
+import calendar
+import json
+import os
+import random
+import resource
+import shutil
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+REPO_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT_PATH = os.getenv("ROOT_PATH", "/calendar")
+BENCH_MARK = "bench:"
+
+
+def percentiles(samples) -> dict:
+    """返回 p50/p95/p99/max（毫秒）"""
+    if not samples:
+        return {"count": 0}
+    ordered = sorted(samples)
+    def pick(p):
+        return round(ordered[min(len(ordered) - 1, int(len(ordered) * p))] * 1000, 3)
+    return {
+        "count": len(ordered),
+        "mean": round(statistics.fmean(ordered) * 1000, 3),
+        "p50": pick(0.50), "p95": pick(0.95), "p99": pick(0.99),
+        "max": round(ordered[-1] * 1000, 3),
+    }
+
+
+def rss_kb(pid: int = None) -> int:
+    """进程常驻内存 (KB)，读取 /proc，不可用时返回0"""
+    try:
+        with open(f"/proc/{pid or 'self'}/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return 0
+
+
+def raise_fd_limit(needed: int):
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    if soft < needed:
+        resource.setrlimit(resource.RLIMIT_NOFILE, (min(needed, hard), hard))
+
+
+def report(title: str, results: dict):
+    print(f"\n== {title}")
+    print(json.dumps(results, ensure_ascii=False, indent=2))
+
+
+# ---------------------------------------------------------------- micro
+
+def time_calls(func, iterations: int) -> dict:
+    samples = []
+    for i in range(iterations):
+        start = time.perf_counter()
+        func(i)
+        samples.append(time.perf_counter() - start)
+    result = percentiles(samples)
+    result["ops_per_sec"] = round(iterations / sum(samples)) if sum(samples) else None
+    return result
+
+
+def bench_database(events: int, iterations: int) -> dict:
+    from Event import Event
+    from DatabaseManager import DatabaseManager
+
+    database = DatabaseManager("bench.db")
+    rng = random.Random(1)
+    def random_date():
+        return f"2024-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}"
+
+    start = time.perf_counter()
+    for i in range(0, events, 1000):
+        database.create_events([Event(title=f"seed {j}", date=random_date(), time="09:00")
+                                for j in range(i, min(i + 1000, events))])
+    results = {"seed_events": events, "seed_seconds": round(time.perf_counter() - start, 3)}
+
+    created = []
+    results["create_event"] = time_calls(
+        lambda i: created.append(database.create_event(Event(title=f"e{i}", date=random_date()))), iterations
+    )
+    results["update_event"] = time_calls(
+        lambda i: database.update_event(Event(id=created[i].id, title=f"u{i}", date=random_date())), iterations
+    )
+    results["get_event_by_id"] = time_calls(lambda i: database.get_event_by_id(created[i].id), iterations)
+    results["get_events_in_range (month)"] = time_calls(
+        lambda i: database.get_events_in_range(f"2024-{i % 12 + 1:02d}-01",
+                                               f"2024-{i % 12 + 1:02d}-{calendar.monthrange(2024, i % 12 + 1)[1]}"),
+        iterations
+    )
+    results["get_events_page (100)"] = time_calls(lambda i: database.get_events_page(100), max(iterations // 10, 1))
+    seq = database.get_current_seq()
+    results["get_changes_since (month)"] = time_calls(
+        lambda i: database.get_changes_since(seq - 100, "2024-03-01", "2024-03-31"), max(iterations // 10, 1)
+    )
+    results["apply_batch (100 creates)"] = time_calls(
+        lambda i: database.apply_batch(creates=[Event(title="b", date=random_date()) for _ in range(100)]),
+        max(iterations // 100, 1)
+    )
+    results["delete_event"] = time_calls(lambda i: database.delete_event(created[i].id), iterations)
+    results["pool"] = database.get_pool_stats()
+    results["cache"] = database.get_cache_stats()
+    database.close()
+    return results
+
+
+class NullWebSocket:
+    """只计数不发送的WebSocket替身，用于测量扇出本身的开销"""
+    def __init__(self):
+        self.frames = 0
+
+    async def accept(self):
+        pass
+
+    async def send_text(self, data):
+        self.frames += 1
+
+    async def send_bytes(self, data):
+        self.frames += 1
+
+    async def close(self, code: int = 1000):
+        pass
+
+
+async def bench_fanout(clients: int, iterations: int) -> dict:
+    from Event import Event
+    from ConnectionManager import ConnectionManager, ViewRange
+    from EventSerializer import serializer
+
+    manager = ConnectionManager(send_queue_size=max(iterations, 256))
+    sockets = []
+    for i in range(clients):
+        websocket = NullWebSocket()
+        await manager.connect(websocket)
+        month = i % 12 + 1
+        manager.update_client_view_range(websocket, ViewRange(
+            start_date=f"2024-{month:02d}-01", end_date=f"2024-{month:02d}-28"
+        ))
+        sockets.append(websocket)
+
+    enqueue = []
+    start = time.perf_counter()
+    for i in range(iterations):
+        event = Event(id=str(i), title="fanout", date=f"2024-{i % 12 + 1:02d}-15", updated_at=str(i))
+        frame = serializer.encode_message("event_updated", event=event)
+        t0 = time.perf_counter()
+        await manager.broadcast_to_clients_for_events(frame, [event])
+        enqueue.append(time.perf_counter() - t0)
+        await asyncio.sleep(0)
+    while any(sender.depth for sender in manager.active_connections.values()):
+        await asyncio.sleep(0.001)
+    # 最后一帧出队后还需让写任务完成发送
+    await asyncio.sleep(0.01)
+    elapsed = time.perf_counter() - start
+
+    frames = sum(websocket.frames for websocket in sockets)
+    for websocket in sockets:
+        manager.disconnect(websocket)
+    return {
+        "clients": clients,
+        "broadcasts": iterations,
+        "frames_delivered": frames,
+        "frames_per_sec": round(frames / elapsed),
+        "enqueue_latency": percentiles(enqueue),
+        "stats": manager.get_fanout_stats(),
+    }
+
+
+def run_micro(args):
+    workdir = tempfile.mkdtemp(prefix="calendar-bench-")
+    os.chdir(workdir)
+    sys.path.insert(0, REPO_DIR)
+    os.environ.setdefault("RANGE_CACHE_MONTHS", "48")
+    try:
+        report("DatabaseManager", bench_database(args.events, args.iterations))
+        report("ConnectionManager fan-out", asyncio.run(bench_fanout(args.clients, args.broadcasts)))
+    finally:
+        os.chdir(REPO_DIR)
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+# ---------------------------------------------------------------- explain
+
+def check_query_plans(events: int) -> bool:
+    """输出热点查询的执行计划，并检查是否按预期使用索引"""
+    from Event import Event
+    from DatabaseManager import DatabaseManager, SQL_SELECT_RANGE, SQL_SELECT_BUCKET, SQL_SELECT_CHANGES, SQL_SELECT_PAGE
+    from CalendarTime import day_number
+
+    database = DatabaseManager("bench.db")
+    rng = random.Random(1)
+    for i in range(0, events, 1000):
+        database.create_events([
+            Event(title=f"seed {j}", date=f"2024-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}", time="09:00")
+            for j in range(i, min(i + 1000, events))
+        ])
+    # (查询, 参数, 执行计划中必须出现的内容, 不允许出现的内容)
+    checks = [
+        ("get_events_in_range", SQL_SELECT_RANGE, (day_number("2024-03-01"), day_number("2024-03-31")),
+         "USING COVERING INDEX idx_events_day", "TEMP B-TREE"),
+        ("range bucket", SQL_SELECT_BUCKET, (day_number("2024-03-01"), day_number("2024-04-01")),
+         "USING COVERING INDEX idx_events_day", "TEMP B-TREE"),
+        ("get_events_page", SQL_SELECT_PAGE, (day_number("2024-03-01"), day_number("2024-03-31"), 0, -1, "", 100),
+         "USING COVERING INDEX idx_events_day", "TEMP B-TREE"),
+        ("delete_events_in_range", "SELECT id FROM events WHERE day >= ? AND day <= ?",
+         (day_number("2024-03-01"), day_number("2024-03-31")), "idx_events_day", "SCAN events"),
+        ("get_changes_since", SQL_SELECT_CHANGES, (0, 10, "2024-03-01", "2024-03-31", "2024-03-01", "2024-03-31"),
+         "USING INTEGER PRIMARY KEY", "SCAN change_log"),
+    ]
+    ok = True
+    with database.pool.reader() as conn:
+        for name, sql, params, expected, forbidden in checks:
+            plan = [row[3] for row in conn.execute("EXPLAIN QUERY PLAN " + sql, params)]
+            passed = any(expected in line for line in plan) and not any(forbidden in line for line in plan)
+            ok = ok and passed
+            print(f"[{'OK' if passed else 'FAIL'}] {name}")
+            for line in plan:
+                print(f"    {line}")
+    database.close()
+    return ok
+
+
+def run_explain(args):
+    workdir = tempfile.mkdtemp(prefix="calendar-bench-")
+    os.chdir(workdir)
+    sys.path.insert(0, REPO_DIR)
+    try:
+        ok = check_query_plans(args.events)
+    finally:
+        os.chdir(REPO_DIR)
+        shutil.rmtree(workdir, ignore_errors=True)
+    sys.exit(0 if ok else 1)
+
+
+# ---------------------------------------------------------------- load
+
+class BenchWebSocket:
+    """基于 wsproto 的最小 asyncio WebSocket 客户端，开销远小于完整客户端库，便于模拟大量连接"""
+    def __init__(self):
+        # wsproto 只有 load 需要（开发依赖，不在 requirements.txt 中），micro / explain 不导入它
+        from wsproto import ConnectionType, WSConnection, events
+        self.events = events
+        self.connection = WSConnection(ConnectionType.CLIENT)
+        self.pending = deque()
+        self.reader = None
+        self.writer = None
+        self._text = []
+
+    async def connect(self, host: str, port: int, path: str):
+        self.reader, self.writer = await asyncio.open_connection(host, port)
+        self.writer.write(self.connection.send(self.events.Request(host=f"{host}:{port}", target=path)))
+        await self.writer.drain()
+        while True:
+            event = await self._next_event()
+            if isinstance(event, self.events.AcceptConnection):
+                return
+            if isinstance(event, self.events.RejectConnection):
+                raise ConnectionError(f"WebSocket握手被拒绝: {event.status_code}")
+
+    async def _next_event(self):
+        while not self.pending:
+            data = await self.reader.read(65536)
+            if not data:
+                raise ConnectionError("连接已关闭")
+            self.connection.receive_data(data)
+            self.pending.extend(self.connection.events())
+        return self.pending.popleft()
+
+    async def send(self, message: dict):
+        self.writer.write(self.connection.send(self.events.Message(data=json.dumps(message))))
+        await self.writer.drain()
+
+    async def recv(self) -> dict:
+        while True:
+            event = await self._next_event()
+            if isinstance(event, self.events.TextMessage):
+                self._text.append(event.data)
+                if event.message_finished:
+                    data, self._text = "".join(self._text), []
+                    return json.loads(data)
+            elif isinstance(event, self.events.BytesMessage):
+                continue
+            elif isinstance(event, self.events.Ping):
+                self.writer.write(self.connection.send(event.response()))
+            elif isinstance(event, self.events.CloseConnection):
+                raise ConnectionError(f"服务端关闭连接: {event.code}")
+
+    async def close(self):
+        try:
+            self.writer.write(self.connection.send(self.events.CloseConnection(code=1000)))
+            await self.writer.drain()
+        except Exception:
+            pass
+        self.writer.close()
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def start_server(workdir: str, port: int, env_overrides: dict) -> subprocess.Popen:
+    env = dict(os.environ, PYTHONPATH=REPO_DIR, ROOT_PATH=ROOT_PATH, **env_overrides)
+    log = open(os.path.join(workdir, "server.log"), "w")
+    process = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--host", "127.0.0.1", "--port", str(port),
+         "--log-level", "warning"],
+        cwd=workdir, env=env, stdout=log, stderr=subprocess.STDOUT
+    )
+    base = f"http://127.0.0.1:{port}{ROOT_PATH}"
+    deadline = time.time() + 30
+    while time.time() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"服务启动失败，见 {workdir}/server.log")
+        try:
+            requests.get(f"{base}/api/health", timeout=1)
+            return process
+        except requests.RequestException:
+            time.sleep(0.2)
+    process.terminate()
+    raise RuntimeError("等待服务启动超时")
+
+
+class LoadStats:
+    def __init__(self):
+        self.broadcast_latency = []
+        self.frames_received = 0
+        self.ack_latency = {"ws": [], "rest": []}
+        self.ops = {"ws": 0, "rest": 0}
+        self.errors = 0
+        self.lock = threading.Lock()
+
+
+def bench_latency(event: dict) -> float:
+    """事件描述中嵌入了写入方的发送时间"""
+    description = event.get("description") or ""
+    if description.startswith(BENCH_MARK):
+        return time.time() - float(description[len(BENCH_MARK):])
+    return None
+
+
+async def subscriber(host, port, path, view, stats: LoadStats, ready: asyncio.Event, stop: asyncio.Event):
+    websocket = BenchWebSocket()
+    await websocket.connect(host, port, path)
+    await websocket.send({"type": "view_range", "start_date": view[0], "end_date": view[1]})
+    while (await websocket.recv()).get("type") != "events_list":
+        pass
+    ready.set()
+    try:
+        while not stop.is_set():
+            message = await websocket.recv()
+            stats.frames_received += 1
+            event = message.get("event")
+            if event:
+                latency = bench_latency(event)
+                if latency is not None:
+                    stats.broadcast_latency.append(latency)
+    except (ConnectionError, asyncio.CancelledError):
+        pass
+    finally:
+        await websocket.close()
+
+
+async def ws_writer(host, port, path, dates, stats: LoadStats, stop: asyncio.Event):
+    """通过WebSocket循环执行 创建 -> 更新 -> 删除"""
+    websocket = BenchWebSocket()
+    await websocket.connect(host, port, path)
+
+    async def request(message: dict, reply_type: str) -> dict:
+        start = time.perf_counter()
+        await websocket.send(message)
+        while True:
+            reply = await websocket.recv()
+            if reply.get("type") == reply_type:
+                stats.ack_latency["ws"].append(time.perf_counter() - start)
+                stats.ops["ws"] += 1
+                return reply
+            if reply.get("type") == "error":
+                stats.errors += 1
+                return None
+
+    try:
+        while not stop.is_set():
+            date = random.choice(dates)
+            created = await request({"type": "create_event", "event": {
+                "title": "ws", "date": date, "description": f"{BENCH_MARK}{time.time()}"
+            }}, "event_created")
+            if not created:
+                continue
+            event = created["event"]
+            event["description"] = f"{BENCH_MARK}{time.time()}"
+            await request({"type": "update_event", "event": event}, "event_updated")
+            await request({"type": "delete_event", "event_id": event["id"]}, "event_deleted")
+    finally:
+        await websocket.close()
+
+
+def rest_writer(base: str, dates, stats: LoadStats, stop: threading.Event):
+    """通过REST循环执行 创建 -> 更新 -> 删除"""
+    with requests.Session() as session:
+        def call(method, url, **kwargs):
+            start = time.perf_counter()
+            response = session.request(method, url, timeout=30, **kwargs)
+            with stats.lock:
+                stats.ack_latency["rest"].append(time.perf_counter() - start)
+                stats.ops["rest"] += 1
+                if response.status_code >= 400:
+                    stats.errors += 1
+            return response
+
+        while not stop.is_set():
+            date = random.choice(dates)
+            response = call("POST", f"{base}/api/events", json={
+                "title": "rest", "date": date, "description": f"{BENCH_MARK}{time.time()}"
+            })
+            if response.status_code >= 400:
+                continue
+            event = response.json()["event"]
+            event["description"] = f"{BENCH_MARK}{time.time()}"
+            call("PUT", f"{base}/api/events/{event['id']}", json=event)
+            call("DELETE", f"{base}/api/events/{event['id']}")
+
+
+async def run_load_async(args, port: int, server_pid: int) -> dict:
+    host, path = "127.0.0.1", f"{ROOT_PATH}/ws"
+    base = f"http://{host}:{port}{ROOT_PATH}"
+    views = [(f"2024-{m:02d}-01", f"2024-{m:02d}-28") for m in range(1, args.months + 1)]
+    dates = [f"2024-{m:02d}-{d:02d}" for m in range(1, args.months + 1) for d in (5, 15, 25)]
+    stats = LoadStats()
+    stop = asyncio.Event()
+
+    rss_before = rss_kb(server_pid)
+    start = time.perf_counter()
+    tasks = []
+    connect_slots = asyncio.Semaphore(args.connect_concurrency)
+    async def connect_one(i):
+        ready = asyncio.Event()
+        async with connect_slots:
+            tasks.append(asyncio.create_task(
+                subscriber(host, port, path, views[i % len(views)], stats, ready, stop)
+            ))
+            await asyncio.wait_for(ready.wait(), timeout=60)
+    await asyncio.gather(*(connect_one(i) for i in range(args.clients)))
+    connect_seconds = time.perf_counter() - start
+    await asyncio.sleep(1)
+    rss_after = rss_kb(server_pid)
+    health_before = requests.get(f"{base}/api/health", timeout=10).json()
+
+    thread_stop = threading.Event()
+    executor = ThreadPoolExecutor(max_workers=max(args.rest_writers, 1))
+    loop = asyncio.get_running_loop()
+    rest_futures = [loop.run_in_executor(executor, rest_writer, base, dates, stats, thread_stop)
+                    for _ in range(args.rest_writers)]
+    writer_tasks = [asyncio.create_task(ws_writer(host, port, path, dates, stats, stop))
+                    for _ in range(args.ws_writers)]
+
+    write_start = time.perf_counter()
+    await asyncio.sleep(args.duration)
+    thread_stop.set()
+    stop.set()
+    await asyncio.gather(*rest_futures)
+    await asyncio.wait(writer_tasks, timeout=10)
+    write_seconds = time.perf_counter() - write_start
+    # 留出时间让已发出的广播送达
+    await asyncio.sleep(1)
+    health_after = requests.get(f"{base}/api/health", timeout=10).json()
+    for task in tasks + writer_tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, *writer_tasks, return_exceptions=True)
+    executor.shutdown()
+
+    pool_before, pool_after = health_before.get("db_pool", {}), health_after.get("db_pool", {})
+    total_ops = stats.ops["ws"] + stats.ops["rest"]
+    return {
+        "clients": args.clients,
+        "connect_seconds": round(connect_seconds, 3),
+        "server_rss_kb": {"before": rss_before, "after_connect": rss_after},
+        "rss_per_connection_kb": round((rss_after - rss_before) / args.clients, 2) if args.clients else None,
+        "write_ops": dict(stats.ops, total=total_ops),
+        "write_ops_per_sec": round(total_ops / write_seconds, 1),
+        "errors": stats.errors,
+        "ack_latency_ws": percentiles(stats.ack_latency["ws"]),
+        "ack_latency_rest": percentiles(stats.ack_latency["rest"]),
+        "broadcast_latency": percentiles(stats.broadcast_latency),
+        "frames_received": stats.frames_received,
+        "frames_per_sec": round(stats.frames_received / write_seconds, 1),
+        "db": {
+            "commits": pool_after.get("commits", 0) - pool_before.get("commits", 0),
+            "writer_wait_seconds": round(
+                pool_after.get("writer_wait_seconds", 0) - pool_before.get("writer_wait_seconds", 0), 6
+            ),
+            "reader_waits": pool_after.get("reader_waits", 0) - pool_before.get("reader_waits", 0),
+        },
+        "fanout": health_after.get("fanout"),
+    }
+
+
+def run_load(args):
+    try:
+        import wsproto  # noqa: F401
+    except ImportError:
+        sys.exit("load 需要 wsproto：pip install -r requirements-dev.txt")
+    raise_fd_limit(args.clients * 2 + 256)
+    workdir = tempfile.mkdtemp(prefix="calendar-load-")
+    port = args.port or free_port()
+    server = start_server(workdir, port, {"MEMORY_STORE": "1"} if args.memory_store else {})
+    try:
+        report("load", asyncio.run(run_load_async(args, port, server.pid)))
+    finally:
+        server.terminate()
+        server.wait(timeout=10)
+        if args.keep:
+            print(f"工作目录: {workdir}")
+        else:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="日历服务基准测试")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    micro = commands.add_parser("micro", help="DatabaseManager 与 ConnectionManager 微基准")
+    micro.add_argument("--events", type=int, default=20000, help="预先写入的事件数")
+    micro.add_argument("--iterations", type=int, default=2000, help="每个数据库方法的调用次数")
+    micro.add_argument("--clients", type=int, default=5000, help="扇出测试的订阅客户端数")
+    micro.add_argument("--broadcasts", type=int, default=200, help="扇出测试的广播次数")
+    micro.set_defaults(func=run_micro)
+
+    load = commands.add_parser("load", help="启动服务并模拟大量WebSocket客户端和写入方")
+    load.add_argument("--clients", type=int, default=2000, help="订阅视图范围的WebSocket客户端数")
+    load.add_argument("--months", type=int, default=3, help="客户端视图分布在多少个月上")
+    load.add_argument("--ws-writers", type=int, default=4, help="通过WebSocket写入的并发数")
+    load.add_argument("--rest-writers", type=int, default=4, help="通过REST写入的并发数")
+    load.add_argument("--duration", type=float, default=20, help="写入持续时间 (秒)")
+    load.add_argument("--connect-concurrency", type=int, default=200, help="同时建立连接的数量")
+    load.add_argument("--memory-store", action="store_true", help="服务端启用内存事件存储")
+    load.add_argument("--port", type=int, default=0, help="服务端口，默认随机空闲端口")
+    load.add_argument("--keep", action="store_true", help="保留临时工作目录（含数据库和服务日志）")
+    load.set_defaults(func=run_load)
+
+    explain = commands.add_parser("explain", help="检查热点查询的执行计划")
+    explain.add_argument("--events", type=int, default=20000, help="预先写入的事件数")
+    explain.set_defaults(func=run_explain)
+
+    args = parser.parse_args()
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
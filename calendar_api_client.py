@@ -1,29 +1,66 @@
 import requests
 import json
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from typing import List, Dict, Optional
 from datetime import datetime
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 
 class CalendarAPIClient:
     """日历API客户端，封装所有日历操作"""
     
-    def __init__(self, base_url: str = "http://localhost:8027" , sub_path: str = "/calendar"):
+    def __init__(self, base_url: str = "http://localhost:8027" , sub_path: str = "/calendar",
+                 timeout: float = 10.0, retries: int = 3, backoff_factor: float = 0.3,
+                 pool_maxsize: int = 10):
         """
         初始化API客户端
         
         Args:
             base_url: 日历服务的基础URL
+            sub_path: 服务的子路径
+            timeout: 单次请求超时 (秒)
+            retries: 连接失败或 502/503/504 时的重试次数（仅幂等请求重试，POST不重试）
+            backoff_factor: 重试退避系数，第n次重试等待 backoff_factor * 2^(n-1) 秒
+            pool_maxsize: 保持长连接的最大连接数
         """
         self.base_url = base_url.rstrip('/')
         self.sub_path = sub_path.rstrip('/')
         self.api_base = f"{self.base_url}{self.sub_path}/api"
+        self.timeout = timeout
+        
+        # 复用TCP/TLS连接的会话
+        retry = Retry(
+            total=retries,
+            backoff_factor=backoff_factor,
+            status_forcelist=(502, 503, 504),
+            raise_on_status=False
+        )
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_maxsize, max_retries=retry)
+        self.session = requests.Session()
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+    
+    def close(self):
+        """关闭连接池"""
+        self.session.close()
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
     
-    def get_events(self, start_date: Optional[str] = None, end_date: Optional[str] = None) -> List[Dict]:
+    def get_events(self, start_date: Optional[str] = None, end_date: Optional[str] = None,
+                   tz: Optional[str] = None) -> List[Dict]:
         """
         获取事件列表
         
         Args:
             start_date: 开始日期 (YYYY-MM-DD格式)
             end_date: 结束日期 (YYYY-MM-DD格式)
+            tz: 客户端时区 (IANA名称，例如 America/New_York)，日期范围按该时区理解
             
         Returns:
             事件列表
@@ -35,9 +72,11 @@ class CalendarAPIClient:
             params['start_date'] = start_date
         if end_date:
             params['end_date'] = end_date
+        if tz:
+            params['tz'] = tz
             
         try:
-            response = requests.get(url, params=params)
+            response = self.session.get(url, params=params, timeout=self.timeout)
             response.raise_for_status()
             return response.json()['events']
         except requests.exceptions.RequestException as e:
@@ -72,7 +111,7 @@ class CalendarAPIClient:
             event_data["description"] = description
             
         try:
-            response = requests.post(url, json=event_data)
+            response = self.session.post(url, json=event_data, timeout=self.timeout)
             response.raise_for_status()
             return response.json()['event']
         except requests.exceptions.RequestException as e:
@@ -109,7 +148,7 @@ class CalendarAPIClient:
             event_data["description"] = description
             
         try:
-            response = requests.put(url, json=event_data)
+            response = self.session.put(url, json=event_data, timeout=self.timeout)
             response.raise_for_status()
             return response.json()['event']
         except requests.exceptions.RequestException as e:
@@ -128,12 +167,40 @@ class CalendarAPIClient:
         url = f"{self.api_base}/events/{event_id}"
         
         try:
-            response = requests.delete(url)
+            response = self.session.delete(url, timeout=self.timeout)
             response.raise_for_status()
             return True
         except requests.exceptions.RequestException as e:
             raise Exception(f"删除事件失败: {e}")
     
+    def search_events(self, query: str, limit: int = 20, start_date: Optional[str] = None,
+                      end_date: Optional[str] = None) -> List[Dict]:
+        """
+        按标题和描述全文检索事件
+        
+        Args:
+            query: 关键词，多个词之间为 AND，最后一个词按前缀匹配
+            limit: 最多返回的结果数
+            start_date: 开始日期 (YYYY-MM-DD格式，可选)
+            end_date: 结束日期 (YYYY-MM-DD格式，可选)
+            
+        Returns:
+            按相关度排序的事件列表
+        """
+        url = f"{self.api_base}/search"
+        params = {'q': query, 'limit': limit}
+        if start_date:
+            params['start_date'] = start_date
+        if end_date:
+            params['end_date'] = end_date
+        
+        try:
+            response = self.session.get(url, params=params, timeout=self.timeout)
+            response.raise_for_status()
+            return response.json().get('events', [])
+        except requests.exceptions.RequestException as e:
+            raise Exception(f"搜索事件失败: {e}")
+    
     def get_health_status(self) -> Dict:
         """
         获取服务健康状态
@@ -144,86 +211,228 @@ class CalendarAPIClient:
         url = f"{self.api_base}/health"
         
         try:
-            response = requests.get(url)
+            response = self.session.get(url, timeout=self.timeout)
             response.raise_for_status()
             return response.json()
         except requests.exceptions.RequestException as e:
             raise Exception(f"获取健康状态失败: {e}")
     
-    def delete_events_in_range(self, start_date: str, end_date: str) -> Dict:
+    def batch(self, creates: Optional[List[Dict]] = None, updates: Optional[List[Dict]] = None,
+              deletes: Optional[List[str]] = None) -> Dict:
         """
-        删除指定时间区域内的所有事件
+        批量创建、更新和删除事件（服务端在一个事务中执行）
         
         Args:
-            start_date: 开始日期 (YYYY-MM-DD格式)
-            end_date: 结束日期 (YYYY-MM-DD格式)
+            creates: 待创建的事件列表，字段同 create_event
+            updates: 待更新的事件列表，每项必须包含 id
+            deletes: 待删除的事件ID列表
             
         Returns:
-            删除操作的结果信息，包含删除的事件数量和详情
+            {"created": [...], "updated": [...], "deleted_ids": [...]}
         """
+        url = f"{self.api_base}/events/batch"
+        
+        payload = {
+            "creates": creates or [],
+            "updates": updates or [],
+            "deletes": deletes or []
+        }
+        
         try:
-            # 1. 获取指定时间区域的所有事件
-            events = self.get_events(start_date, end_date)
-            
-            if not events:
-                return {
-                    "success": True,
-                    "message": f"在 {start_date} 到 {end_date} 期间没有找到任何事件",
-                    "deleted_count": 0,
-                    "deleted_events": []
-                }
-            
-            # 2. 提取事件ID并删除每个事件
-            deleted_events = []
-            failed_deletions = []
-            
-            for event in events:
-                event_id = event.get('id')
-                if event_id:
-                    try:
-                        # 删除单个事件
-                        success = self.delete_event(event_id)
-                        if success:
-                            deleted_events.append({
-                                "id": event_id,
-                                "title": event.get('title', ''),
-                                "date": event.get('date', ''),
-                                "time": event.get('time', '')
-                            })
-                        else:
-                            failed_deletions.append(event_id)
-                    except Exception as e:
-                        failed_deletions.append({
-                            "id": event_id,
-                            "error": str(e)
-                        })
-                else:
-                    failed_deletions.append({
-                        "event": event,
-                        "error": "事件缺少ID"
-                    })
+            response = self.session.post(url, json=payload, timeout=self.timeout)
+            response.raise_for_status()
+            return response.json()
+        except requests.exceptions.RequestException as e:
+            raise Exception(f"批量操作失败: {e}")
+    
+    def create_events(self, events: List[Dict]) -> List[Dict]:
+        """
+        批量创建事件
+        
+        Args:
+            events: 事件列表，每项包含 title、date，可选 time、description、color
             
-            # 3. 返回删除结果
-            result = {
-                "success": len(failed_deletions) == 0,
-                "message": f"成功删除 {len(deleted_events)} 个事件",
-                "deleted_count": len(deleted_events),
-                "deleted_events": deleted_events
-            }
+        Returns:
+            创建的事件列表
+        """
+        return self.batch(creates=events)['created']
+    
+    def update_events(self, events: List[Dict]) -> List[Dict]:
+        """
+        批量更新事件
+        
+        Args:
+            events: 事件列表，每项必须包含 id
             
-            if failed_deletions:
-                result["failed_deletions"] = failed_deletions
-                result["message"] += f"，{len(failed_deletions)} 个事件删除失败"
+        Returns:
+            实际更新的事件列表
+        """
+        return self.batch(updates=events)['updated']
+    
+    def delete_events(self, event_ids: List[str]) -> List[str]:
+        """
+        批量删除事件
+        
+        Args:
+            event_ids: 事件ID列表
             
-            return result
+        Returns:
+            实际删除的事件ID列表
+        """
+        return self.batch(deletes=event_ids)['deleted_ids']
+    
+    def delete_events_in_range(self, start_date: str, end_date: str) -> Dict:
+        """
+        删除指定时间区域内的所有事件（服务端一次完成）
+        
+        Args:
+            start_date: 开始日期 (YYYY-MM-DD格式)
+            end_date: 结束日期 (YYYY-MM-DD格式)
             
-        except Exception as e:
+        Returns:
+            删除操作的结果信息，包含删除的事件数量和详情
+        """
+        url = f"{self.api_base}/events"
+        params = {
+            'start_date': start_date,
+            'end_date': end_date
+        }
+        
+        try:
+            response = self.session.delete(url, params=params, timeout=self.timeout)
+            response.raise_for_status()
+            data = response.json()
+        except requests.exceptions.RequestException as e:
             return {
                 "success": False,
                 "message": f"删除指定区域事件失败: {str(e)}",
                 "deleted_count": 0,
                 "deleted_events": []
             }
+        
+        if data['deleted_count'] == 0:
+            return {
+                "success": True,
+                "message": f"在 {start_date} 到 {end_date} 期间没有找到任何事件",
+                "deleted_count": 0,
+                "deleted_events": []
+            }
+        
+        return {
+            "success": True,
+            "message": f"成功删除 {data['deleted_count']} 个事件",
+            "deleted_count": data['deleted_count'],
+            "deleted_events": [{
+                "id": event.get('id'),
+                "title": event.get('title', ''),
+                "date": event.get('date', ''),
+                "time": event.get('time', '')
+            } for event in data['deleted_events']]
+        }
+
+
+class AsyncCalendarAPIClient:
+    """日历API异步客户端，方法与 CalendarAPIClient 一致，可并发执行大量操作"""
+    
+    def __init__(self, base_url: str = "http://localhost:8027" , sub_path: str = "/calendar",
+                 concurrency: int = 10, timeout: float = 10.0, retries: int = 3,
+                 backoff_factor: float = 0.3):
+        """
+        初始化异步API客户端
+        
+        Args:
+            base_url: 日历服务的基础URL
+            sub_path: 服务的子路径
+            concurrency: 同时进行的最大请求数
+            timeout: 单次请求超时 (秒)
+            retries: 幂等请求的重试次数
+            backoff_factor: 重试退避系数
+        """
+        self.concurrency = max(1, concurrency)
+        self._client_args = (base_url, sub_path)
+        self._client_kwargs = {"timeout": timeout, "retries": retries, "backoff_factor": backoff_factor,
+                               "pool_maxsize": 1}
+        # requests.Session 不保证线程安全：每个工作线程使用自己的客户端（会话和长连接），连接总数与并发数一致
+        self._local = threading.local()
+        self._clients: List[CalendarAPIClient] = []
+        self._clients_lock = threading.Lock()
+        self.executor = ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix="calendar-api")
+    
+    def _thread_client(self) -> CalendarAPIClient:
+        client = getattr(self._local, "client", None)
+        if client is None:
+            client = self._local.client = CalendarAPIClient(*self._client_args, **self._client_kwargs)
+            with self._clients_lock:
+                self._clients.append(client)
+        return client
+    
+    async def _run(self, method, *args, **kwargs):
+        """在工作线程中用该线程的客户端执行 CalendarAPIClient 的方法"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            self.executor, lambda: method(self._thread_client(), *args, **kwargs)
+        )
+    
+    async def get_events(self, start_date: Optional[str] = None, end_date: Optional[str] = None,
+                         tz: Optional[str] = None) -> List[Dict]:
+        return await self._run(CalendarAPIClient.get_events, start_date, end_date, tz)
+    
+    async def create_event(self, title: str, date: str, time: Optional[str] = None,
+                           description: Optional[str] = None, color: str = "blue") -> Dict:
+        return await self._run(CalendarAPIClient.create_event, title, date, time, description, color)
+    
+    async def update_event(self, event_id: str, title: str, date: str,
+                           time: Optional[str] = None, description: Optional[str] = None,
+                           color: str = "blue") -> Dict:
+        return await self._run(CalendarAPIClient.update_event, event_id, title, date, time, description, color)
+    
+    async def delete_event(self, event_id: str) -> bool:
+        return await self._run(CalendarAPIClient.delete_event, event_id)
+    
+    async def search_events(self, query: str, limit: int = 20, start_date: Optional[str] = None,
+                            end_date: Optional[str] = None) -> List[Dict]:
+        return await self._run(CalendarAPIClient.search_events, query, limit, start_date, end_date)
+    
+    async def get_health_status(self) -> Dict:
+        return await self._run(CalendarAPIClient.get_health_status)
+    
+    async def batch(self, creates: Optional[List[Dict]] = None, updates: Optional[List[Dict]] = None,
+                    deletes: Optional[List[str]] = None) -> Dict:
+        return await self._run(CalendarAPIClient.batch, creates, updates, deletes)
+    
+    async def create_events(self, events: List[Dict]) -> List[Dict]:
+        return await self._run(CalendarAPIClient.create_events, events)
+    
+    async def update_events(self, events: List[Dict]) -> List[Dict]:
+        return await self._run(CalendarAPIClient.update_events, events)
+    
+    async def delete_events(self, event_ids: List[str]) -> List[str]:
+        return await self._run(CalendarAPIClient.delete_events, event_ids)
+    
+    async def delete_events_in_range(self, start_date: str, end_date: str) -> Dict:
+        return await self._run(CalendarAPIClient.delete_events_in_range, start_date, end_date)
+    
+    async def gather(self, *coros, return_exceptions: bool = False) -> List:
+        """
+        并发执行多个操作，实际同时进行的请求数受 concurrency 限制
+        
+        示例:
+            await client.gather(*(client.create_event(**e) for e in events))
+        """
+        return await asyncio.gather(*coros, return_exceptions=return_exceptions)
+    
+    async def close(self):
+        self.executor.shutdown(wait=True)
+        with self._clients_lock:
+            clients, self._clients = self._clients, []
+        for client in clients:
+            client.close()
+    
+    async def __aenter__(self):
+        return self
+    
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        await self.close()
 
 
 # 示例用法
@@ -1,10 +1,11 @@
-from fastapi import FastAPI, WebSocket, WebSocketDisconnect, HTTPException
+from fastapi import FastAPI, WebSocket, WebSocketDisconnect, HTTPException, Request
 from fastapi.staticfiles import StaticFiles
-from fastapi.responses import FileResponse
+from fastapi.responses import FileResponse, StreamingResponse, Response, PlainTextResponse
 from fastapi.middleware.cors import CORSMiddleware
 import sqlite3
 import json
 import asyncio
+import codecs
 from datetime import datetime, date
 from typing import List, Dict, Optional
 import uuid
@@ -13,9 +14,18 @@ import logging
 # 添加时区支持
 import pytz
 import os
+import time
 from Event import Event
 from logger import logger
-from DatabaseManager import db , SHANGHAI_TZ
+from DatabaseManager import db , encode_page_cursor, decode_page_cursor
+from CalendarTime import CALENDAR_TZ, clock, parse_date
+from AsyncDatabaseManager import async_db
+from ConnectionManager import manager, ViewRange
+from EventSerializer import serializer
+from Metrics import metrics
+from WireFormat import negotiate
+from StaticAssets import assets
+from ICalendar import ICSParser, iter_ics
 
 
 
@@ -33,141 +43,178 @@ app.add_middleware(
 
 subpath = os.getenv("ROOT_PATH", "/calendar")
 port = int(os.getenv("PORT", 8027))
+# 分页与流式导出参数
+max_page_limit = int(os.getenv("MAX_PAGE_LIMIT", 1000))
+stream_chunk_size = int(os.getenv("STREAM_CHUNK_SIZE", 500))
+# 全文检索单次返回的最大结果数
+max_search_limit = int(os.getenv("MAX_SEARCH_LIMIT", 100))
+# .ics 导入时每个事务写入的事件数
+import_chunk_size = int(os.getenv("IMPORT_CHUNK_SIZE", 1000))
 
 
+class BatchRequest(BaseModel):
+    creates: List[Event] = []
+    updates: List[Event] = []
+    deletes: List[str] = []
 
-class ViewRange(BaseModel):
-    start_date: str
-    end_date: str
 
-# WebSocket连接管理器
-class ConnectionManager:
-    def __init__(self):
-        self.active_connections: List[WebSocket] = []
-        self.client_view_ranges: Dict[WebSocket, ViewRange] = {}
-    
-    async def connect(self, websocket: WebSocket):
-        await websocket.accept()
-        self.active_connections.append(websocket)
-        logger.info(f"新客户端连接，当前在线用户: {len(self.active_connections)}")
-        await self.broadcast_online_users()
-    
-    def disconnect(self, websocket: WebSocket):
-        if websocket in self.active_connections:
-            self.active_connections.remove(websocket)
-        if websocket in self.client_view_ranges:
-            del self.client_view_ranges[websocket]
-        logger.info(f"客户端断开连接，当前在线用户: {len(self.active_connections)}")
-    
-    async def send_personal_message(self, message: dict, websocket: WebSocket):
-        try:
-            await websocket.send_text(json.dumps(message, ensure_ascii=False))
-        except Exception as e:
-            logger.error(f"发送消息失败: {e}")
-            await self.disconnect_websocket(websocket)
-    
-    async def broadcast(self, message: dict, exclude: WebSocket = None):
-        disconnected = []
-        for connection in self.active_connections:
-            if connection != exclude:
-                try:
-                    await connection.send_text(json.dumps(message, ensure_ascii=False))
-                except Exception as e:
-                    logger.error(f"广播消息失败: {e}")
-                    disconnected.append(connection)
-        
-        # 清理断开的连接
-        for conn in disconnected:
-            await self.disconnect_websocket(conn)
-    
-    async def broadcast_to_interested_clients(self, message: dict, event_date: str, exclude: WebSocket = None):
-        """只向查看范围包含该事件日期的客户端广播"""
-        disconnected = []
-        for connection in self.active_connections:
-            if connection != exclude and connection in self.client_view_ranges:
-                view_range = self.client_view_ranges[connection]
-                if view_range.start_date <= event_date <= view_range.end_date:
-                    try:
-                        await connection.send_text(json.dumps(message, ensure_ascii=False))
-                    except Exception as e:
-                        logger.error(f"广播消息失败: {e}")
-                        disconnected.append(connection)
-        
-        # 清理断开的连接
-        for conn in disconnected:
-            await self.disconnect_websocket(conn)
-    
-    async def broadcast_online_users(self):
-        message = {
-            "type": "online_users",
-            "count": len(self.active_connections)
-        }
-        await self.broadcast(message)
-    
-    async def disconnect_websocket(self, websocket: WebSocket):
-        self.disconnect(websocket)
-        await self.broadcast_online_users()
-    
-    def update_client_view_range(self, websocket: WebSocket, view_range: ViewRange):
-        self.client_view_ranges[websocket] = view_range
-        logger.info(f"客户端视图范围更新: {view_range.start_date} - {view_range.end_date}")
+def batch_fields(result: dict) -> dict:
+    return {
+        "created": result["created"],
+        "updated": result["updated"],
+        "deleted_ids": [event.id for event in result["deleted"]]
+    }
 
-manager = ConnectionManager()
+
+def json_response(content: str) -> Response:
+    """返回已经序列化好的JSON文本"""
+    return Response(content=content, media_type="application/json")
+
+
+async def broadcast_batch(result: dict, exclude: WebSocket = None) -> str:
+    """把一次批量操作的结果聚合成一条 events_batch 消息广播，并返回编码后的消息"""
+    message = serializer.encode_message("events_batch", **batch_fields(result))
+    events = [event for key in ("created", "updated", "deleted") for event in result[key]]
+    if events:
+        await manager.broadcast_to_clients_for_events(message, events, exclude=exclude)
+    return message
+
+async def previous_series(event: Event) -> list:
+    """修改重复系列前取出原系列，原来能看到该系列的客户端也需要收到更新"""
+    if event.recurrence is None and not event.series_start:
+        return []
+    old = await async_db.get_event_by_id(event.id)
+    return [old] if old is not None and old.recurrence is not None else []
 
 
 # WebSocket处理
+# 每种WebSocket消息的处理耗时，子指标预先创建，未知类型归入 unknown
+WS_MESSAGE_TYPES = ("ping", "pong", "hello", "view_range", "sync_range", "get_events", "create_event", "update_event",
+                    "delete_event", "batch", "delete_range", "search", "get_counts", "unknown")
+WS_MESSAGE_SECONDS = metrics.histogram("calendar_ws_message_seconds", "WebSocket消息处理耗时",
+                                       "type", WS_MESSAGE_TYPES)
+ws_message_timers = {message_type: WS_MESSAGE_SECONDS.labels(message_type) for message_type in WS_MESSAGE_TYPES}
+
 @app.websocket(subpath+"/ws")
 async def websocket_endpoint(websocket: WebSocket):
-    await manager.connect(websocket)
+    if not await manager.connect(websocket):
+        return
     
     try:
         while True:
             data = await websocket.receive_text()
+            # 收到任何消息都说明连接仍然存活
+            manager.heartbeat.touch(websocket)
             message = json.loads(data)
             
             message_type = message.get("type")
+            started = time.perf_counter()
             
-            if message_type == "view_range":
-                # 客户端更新视图范围
-                view_range = ViewRange(
-                    start_date=message["start_date"],
-                    end_date=message["end_date"]
-                )
-                manager.update_client_view_range(websocket, view_range)
-                
-                # 发送该范围内的事件
-                events = db.get_events_in_range(view_range.start_date, view_range.end_date)
-                await manager.send_personal_message({
-                    "type": "events_list",
-                    "events": [event.dict() for event in events]
-                }, websocket)
+            if message_type == "ping":
+                # 客户端心跳：回复预先编码的pong
+                manager.heartbeat.pong(websocket)
+            
+            elif message_type == "pong":
+                # 服务端ping的回复，已在上面记录活跃时间
+                pass
+            
+            elif message_type == "hello":
+                # 协商之后的帧格式：MessagePack / 大负载zlib压缩，默认仍为JSON文本
+                wire = negotiate(message.get("formats"), message.get("compression"))
+                description = wire.describe() if wire is not None else {"format": "json", "compression": None}
+                await manager.send_personal_message(serializer.encode_message("welcome", **description), websocket)
+                manager.set_wire_format(websocket, wire)
+            
+            elif message_type == "view_range":
+                # 客户端更新视图范围；可选的 tz 为客户端时区，日期范围按该时区理解
+                try:
+                    view_range = ViewRange(
+                        start_date=message["start_date"],
+                        end_date=message["end_date"],
+                        tz=message.get("tz")
+                    )
+                    manager.update_client_view_range(websocket, view_range)
+                    
+                    # 发送该范围内的事件（序号先于数据读取，客户端增量同步时最多重复收到部分变更）
+                    seq = await async_db.get_current_seq()
+                    events = await async_db.get_events_in_range(
+                        view_range.start_date, view_range.end_date, view_range.tz
+                    )
+                    await manager.send_personal_message(
+                        serializer.encode_message("events_list", seq=seq, events=events), websocket
+                    )
+                except ValueError as e:
+                    await manager.send_personal_message({
+                        "type": "error",
+                        "message": f"视图范围无效: {str(e)}"
+                    }, websocket)
+            
+            elif message_type == "sync_range":
+                # 增量同步：只返回客户端已知序号之后的变更（指定时区时与 view_range 一样只返回落在视图内的事件）
+                try:
+                    view_range = ViewRange(
+                        start_date=message["start_date"],
+                        end_date=message["end_date"],
+                        tz=message.get("tz")
+                    )
+                    manager.update_client_view_range(websocket, view_range)
+                    
+                    delta = await async_db.get_changes_since(
+                        int(message.get("since_seq") or 0), view_range.start_date, view_range.end_date, view_range.tz
+                    )
+                    await manager.send_personal_message(serializer.encode_message(
+                        "events_delta",
+                        seq=delta["seq"],
+                        full=delta["full"],
+                        events=delta["events"],
+                        deleted_ids=delta["deleted_ids"]
+                    ), websocket)
+                except ValueError as e:
+                    await manager.send_personal_message({
+                        "type": "error",
+                        "message": f"视图范围无效: {str(e)}"
+                    }, websocket)
+            
+            elif message_type == "get_events" and ("limit" in message or "cursor" in message):
+                # 分页获取事件
+                try:
+                    limit = min(max(int(message.get("limit") or max_page_limit), 1), max_page_limit)
+                    after = decode_page_cursor(message["cursor"]) if message.get("cursor") else None
+                    events, next_key = await async_db.get_events_page(
+                        limit, after, message.get("start_date"), message.get("end_date")
+                    )
+                    await manager.send_personal_message(serializer.encode_message(
+                        "events_page",
+                        events=events,
+                        next_cursor=encode_page_cursor(next_key) if next_key else None
+                    ), websocket)
+                except ValueError as e:
+                    await manager.send_personal_message({
+                        "type": "error",
+                        "message": f"获取事件失败: {str(e)}"
+                    }, websocket)
             
             elif message_type == "get_events":
                 # 获取所有事件
-                events = db.get_all_events()
-                await manager.send_personal_message({
-                    "type": "events_list",
-                    "events": [event.dict() for event in events]
-                }, websocket)
+                seq = await async_db.get_current_seq()
+                events = await async_db.get_all_events()
+                await manager.send_personal_message(
+                    serializer.encode_message("events_list", seq=seq, events=events), websocket
+                )
             
             elif message_type == "create_event":
                 # 创建新事件
                 try:
                     event_data = message["event"]
                     event = Event(**event_data)
-                    created_event = db.create_event(event)
+                    created_event = await async_db.create_event(event)
                     
-                    # 广播给所有相关客户端
-                    await manager.broadcast_to_interested_clients({
-                        "type": "event_created",
-                        "event": created_event.dict()
-                    }, created_event.date, exclude=websocket)
+                    # 广播给所有相关客户端（同一份编码结果也用于确认）
+                    frame = serializer.encode_message("event_created", event=created_event)
+                    await manager.broadcast_to_clients_for_events(frame, [created_event], exclude=websocket)
                     
                     # 确认给发送者
-                    await manager.send_personal_message({
-                        "type": "event_created",
-                        "event": created_event.dict()
-                    }, websocket)
+                    await manager.send_personal_message(frame, websocket)
                     
                 except Exception as e:
                     await manager.send_personal_message({
@@ -180,20 +227,18 @@ async def websocket_endpoint(websocket: WebSocket):
                 try:
                     event_data = message["event"]
                     event = Event(**event_data)
-                    updated_event = db.update_event(event)
+                    previous = await previous_series(event)
+                    updated_event = await async_db.update_event(event)
                     
                     if updated_event:
-                        # 广播给所有相关客户端
-                        await manager.broadcast_to_interested_clients({
-                            "type": "event_updated",
-                            "event": updated_event.dict()
-                        }, updated_event.date, exclude=websocket)
+                        # 广播给所有相关客户端（同一份编码结果也用于确认）
+                        frame = serializer.encode_message("event_updated", event=updated_event)
+                        await manager.broadcast_to_clients_for_events(
+                            frame, [updated_event] + previous, exclude=websocket
+                        )
                         
                         # 确认给发送者
-                        await manager.send_personal_message({
-                            "type": "event_updated",
-                            "event": updated_event.dict()
-                        }, websocket)
+                        await manager.send_personal_message(frame, websocket)
                     else:
                         await manager.send_personal_message({
                             "type": "error",
@@ -212,22 +257,17 @@ async def websocket_endpoint(websocket: WebSocket):
                     event_id = message["event_id"]
                     
                     # 先获取事件信息用于广播
-                    event = db.get_event_by_id(event_id)
+                    event = await async_db.get_event_by_id(event_id)
                     if event:
-                        deleted = db.delete_event(event_id)
+                        deleted = await async_db.delete_event(event_id)
                         
                         if deleted:
-                            # 广播给所有相关客户端
-                            await manager.broadcast_to_interested_clients({
-                                "type": "event_deleted",
-                                "event_id": event_id
-                            }, event.date, exclude=websocket)
+                            # 广播给所有相关客户端（同一份编码结果也用于确认）
+                            frame = serializer.encode_message("event_deleted", event_id=event_id)
+                            await manager.broadcast_to_clients_for_events(frame, [event], exclude=websocket)
                             
                             # 确认给发送者
-                            await manager.send_personal_message({
-                                "type": "event_deleted",
-                                "event_id": event_id
-                            }, websocket)
+                            await manager.send_personal_message(frame, websocket)
                         else:
                             await manager.send_personal_message({
                                 "type": "error",
@@ -245,12 +285,76 @@ async def websocket_endpoint(websocket: WebSocket):
                         "message": f"删除事件失败: {str(e)}"
                     }, websocket)
             
+            elif message_type == "batch":
+                # 批量创建/更新/删除，一个事务 + 一次聚合广播
+                try:
+                    batch = BatchRequest(
+                        creates=message.get("creates", []),
+                        updates=message.get("updates", []),
+                        deletes=message.get("deletes", [])
+                    )
+                    result = await async_db.apply_batch(batch.creates, batch.updates, batch.deletes)
+                    reply = await broadcast_batch(result, exclude=websocket)
+                    await manager.send_personal_message(reply, websocket)
+                except Exception as e:
+                    await manager.send_personal_message({
+                        "type": "error",
+                        "message": f"批量操作失败: {str(e)}"
+                    }, websocket)
+            
+            elif message_type == "delete_range":
+                # 删除指定日期范围内的所有事件
+                try:
+                    result = await async_db.delete_events_in_range(message["start_date"], message["end_date"])
+                    reply = await broadcast_batch(result, exclude=websocket)
+                    await manager.send_personal_message(reply, websocket)
+                except Exception as e:
+                    await manager.send_personal_message({
+                        "type": "error",
+                        "message": f"删除范围事件失败: {str(e)}"
+                    }, websocket)
+            
+            elif message_type == "get_counts":
+                # 概览视图：每天的事件数和各颜色汇总，不传输事件本身
+                try:
+                    start_date = parse_date(message.get("start_date"))
+                    end_date = parse_date(message.get("end_date"))
+                    counts = await async_db.get_daily_counts(start_date, end_date)
+                    await manager.send_personal_message(serializer.encode_message(
+                        "event_counts", start_date=start_date, end_date=end_date, **counts
+                    ), websocket)
+                except Exception as e:
+                    await manager.send_personal_message({
+                        "type": "error",
+                        "message": f"获取事件统计失败: {str(e)}"
+                    }, websocket)
+            
+            elif message_type == "search":
+                # 全文检索，回复中带上原查询以便客户端丢弃过期的联想结果
+                query = message.get("query") or ""
+                try:
+                    limit = min(max(int(message.get("limit") or 20), 1), max_search_limit)
+                    start_date, end_date = parse_dates(message.get("start_date"), message.get("end_date"))
+                    events = await async_db.search_events(
+                        query, limit, start_date, end_date, message.get("prefix", True)
+                    )
+                    await manager.send_personal_message(
+                        serializer.encode_message("search_results", query=query, events=events), websocket
+                    )
+                except Exception as e:
+                    await manager.send_personal_message({
+                        "type": "error",
+                        "message": f"检索失败: {str(e)}"
+                    }, websocket)
+            
             else:
                 # print("未知的消息类型" ,data)
                 await manager.send_personal_message({
                     "type": "error",
                     "message": "未知的消息类型" ,
                 }, websocket)
+            
+            ws_message_timers.get(message_type, ws_message_timers["unknown"]).observe(time.perf_counter() - started)
                 
     except WebSocketDisconnect:
         await manager.disconnect_websocket(websocket)
@@ -261,39 +365,152 @@ async def websocket_endpoint(websocket: WebSocket):
 # # 静态文件服务
 # app.mount("/static", StaticFiles(directory="."), name="static")
 
-# 根路径返回HTML文件
+# 根路径返回HTML文件：每次向服务端验证，内容未变时返回304
 @app.get(subpath+"/")
-async def read_index():
-    response = FileResponse('index.html')
-    # 禁用缓存的响应头
-    response.headers["Cache-Control"] = "no-cache, no-store, must-revalidate"
-    response.headers["Pragma"] = "no-cache"
-    response.headers["Expires"] = "0"
-    return response
+async def read_index(request: Request):
+    return assets.response(request, assets.get("index.html"))
+
+# 静态文件：带内容哈希的文件名永久缓存
+@app.get(subpath+"/static/{name}")
+async def read_static(request: Request, name: str):
+    asset = assets.get(name)
+    if asset is None:
+        raise HTTPException(status_code=404, detail="文件不存在")
+    return assets.response(request, asset)
 
 # REST API端点（可选，用于调试和管理）
+def parse_dates(*values: Optional[str]) -> tuple:
+    """校验可选的日期参数（YYYY-MM-DD），None原样返回，不合法时抛出ValueError"""
+    return tuple(None if value is None else parse_date(value) for value in values)
+
+def check_dates(*values: Optional[str]):
+    """校验查询参数中的日期（YYYY-MM-DD），不合法时返回400"""
+    try:
+        parse_dates(*values)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+def stream_events_ndjson(start_date: Optional[str], end_date: Optional[str]):
+    """按块从数据库读取并逐行输出NDJSON"""
+    for chunk in db.iter_event_dicts(stream_chunk_size, start_date, end_date):
+        yield "".join(serializer.encode_event_dict(event) + "\n" for event in chunk)
+
 @app.get(subpath+"/api/events")
-async def get_events(start_date: Optional[str] = None, end_date: Optional[str] = None):
-    """获取事件列表"""
+async def get_events(request: Request, start_date: Optional[str] = None, end_date: Optional[str] = None,
+                     limit: Optional[int] = None, cursor: Optional[str] = None,
+                     format: Optional[str] = None, tz: Optional[str] = None):
+    """
+    获取事件列表
+    
+    - format=ndjson（或 Accept: application/x-ndjson）时流式返回每行一个事件
+    - 指定 limit 或 cursor 时按 (date, time, id) 分页，返回 next_cursor
+    - 指定 start_date / end_date 时可以传入客户端时区 tz（IANA名称），日期范围按该时区理解
+    """
+    check_dates(start_date, end_date)
+    if format == "ndjson" or "application/x-ndjson" in request.headers.get("accept", ""):
+        return StreamingResponse(
+            stream_events_ndjson(start_date, end_date),
+            media_type="application/x-ndjson"
+        )
+    
+    if limit is not None or cursor:
+        limit = min(max(limit or max_page_limit, 1), max_page_limit)
+        try:
+            after = decode_page_cursor(cursor) if cursor else None
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        events, next_key = await async_db.get_events_page(limit, after, start_date, end_date)
+        return json_response(serializer.encode_object(
+            events=events,
+            next_cursor=encode_page_cursor(next_key) if next_key else None
+        ))
+    
     if start_date and end_date:
-        events = db.get_events_in_range(start_date, end_date)
+        try:
+            events = await async_db.get_events_in_range(start_date, end_date, tz)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
     else:
-        events = db.get_all_events()
-    return {"events": [event.dict() for event in events]}
+        events = await async_db.get_all_events()
+    return json_response(serializer.encode_object(events=events))
+
+@app.get(subpath+"/api/counts")
+async def get_event_counts(start_date: str, end_date: str):
+    """范围内每天的事件数和各颜色的事件数（含重复事件的展开），用于月/年概览"""
+    check_dates(start_date, end_date)
+    counts = await async_db.get_daily_counts(start_date, end_date)
+    return json_response(serializer.encode_object(start_date=start_date, end_date=end_date, **counts))
+
+@app.get(subpath+"/api/search")
+async def search_events(q: str, limit: int = 20, start_date: Optional[str] = None,
+                        end_date: Optional[str] = None, prefix: bool = True):
+    """
+    按标题和描述全文检索事件，按相关度排序
+
+    - 多个关键词之间为 AND；prefix=true 时最后的字母数字部分按前缀匹配
+    - start_date / end_date 可选，限定事件日期（重复系列按跨度重叠）
+    """
+    check_dates(start_date, end_date)
+    limit = min(max(limit, 1), max_search_limit)
+    events = await async_db.search_events(q, limit, start_date, end_date, prefix)
+    return json_response(serializer.encode_object(query=q, events=events))
+
+@app.get(subpath+"/api/calendar.ics")
+async def export_ics(start_date: Optional[str] = None, end_date: Optional[str] = None):
+    """导出为 iCalendar；重复系列按原始规则导出一次，指定日期范围时只导出在范围内有发生的系列"""
+    check_dates(start_date, end_date)
+    return StreamingResponse(
+        iter_ics(db.iter_event_dicts(stream_chunk_size, start_date, end_date, expand=False)),
+        media_type="text/calendar",
+        headers={"Content-Disposition": 'attachment; filename="calendar.ics"'}
+    )
+
+@app.post(subpath+"/api/calendar.ics")
+async def import_ics(request: Request):
+    """
+    从 iCalendar 导入（请求体为 .ics 文本），按UID覆盖已有事件
+
+    请求体边接收边解析，每 IMPORT_CHUNK_SIZE 个事件写入一个事务；
+    完成后通知所有客户端重新同步当前视图
+    """
+    parser = ICSParser()
+    decoder = codecs.getincrementaldecoder("utf-8")("replace")
+    result = {"created": 0, "updated": 0, "skipped": 0}
+    pending = []
+    
+    async def flush(batch):
+        counts = await async_db.import_events(batch)
+        result["created"] += counts["created"]
+        result["updated"] += counts["updated"]
+    
+    async for data in request.stream():
+        pending.extend(parser.feed(decoder.decode(data)))
+        while len(pending) >= import_chunk_size:
+            await flush(pending[:import_chunk_size])
+            del pending[:import_chunk_size]
+    pending.extend(parser.feed(decoder.decode(b"", final=True)))
+    pending.extend(parser.close())
+    for i in range(0, len(pending), import_chunk_size):
+        await flush(pending[i:i + import_chunk_size])
+    result["skipped"] = parser.errors
+    
+    imported = result["created"] + result["updated"]
+    if imported:
+        await manager.broadcast_all({"type": "events_imported", "count": imported})
+    return result
 
 @app.post(subpath+"/api/events")
 async def create_event_api(event: Event):
     """创建事件（REST API）"""
     try:
-        created_event = db.create_event(event)
+        created_event = await async_db.create_event(event)
         
         # 通过WebSocket广播
-        await manager.broadcast_to_interested_clients({
-            "type": "event_created",
-            "event": created_event.dict()
-        }, created_event.date)
+        await manager.broadcast_to_clients_for_events(
+            serializer.encode_message("event_created", event=created_event), [created_event]
+        )
         
-        return {"event": created_event.dict()}
+        return json_response(serializer.encode_object(event=created_event))
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
 
@@ -301,48 +518,133 @@ async def create_event_api(event: Event):
 async def update_event_api(event_id: str, event: Event):
     """更新事件（REST API）"""
     event.id = event_id
-    updated_event = db.update_event(event)
+    previous = await previous_series(event)
+    try:
+        updated_event = await async_db.update_event(event)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     
     if not updated_event:
         raise HTTPException(status_code=404, detail="事件不存在")
     
     # 通过WebSocket广播
-    await manager.broadcast_to_interested_clients({
-        "type": "event_updated",
-        "event": updated_event.dict()
-    }, updated_event.date)
+    await manager.broadcast_to_clients_for_events(
+        serializer.encode_message("event_updated", event=updated_event), [updated_event] + previous
+    )
     
-    return {"event": updated_event.dict()}
+    return json_response(serializer.encode_object(event=updated_event))
 
 @app.delete(subpath+"/api/events/{event_id}")
 async def delete_event_api(event_id: str):
     """删除事件（REST API）"""
-    event = db.get_event_by_id(event_id)
+    event = await async_db.get_event_by_id(event_id)
     if not event:
         raise HTTPException(status_code=404, detail="事件不存在")
     
-    deleted = db.delete_event(event_id)
+    deleted = await async_db.delete_event(event_id)
     if not deleted:
         raise HTTPException(status_code=400, detail="删除失败")
     
     # 通过WebSocket广播
-    await manager.broadcast_to_interested_clients({
-        "type": "event_deleted",
-        "event_id": event_id
-    }, event.date)
+    await manager.broadcast_to_clients_for_events(
+        serializer.encode_message("event_deleted", event_id=event_id), [event]
+    )
     
     return {"message": "事件已删除"}
 
+@app.post(subpath+"/api/events/batch")
+async def batch_events_api(batch: BatchRequest):
+    """批量创建/更新/删除事件（REST API），在一个事务中执行"""
+    try:
+        result = await async_db.apply_batch(batch.creates, batch.updates, batch.deletes)
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    # 通过WebSocket聚合广播
+    await broadcast_batch(result)
+    
+    return json_response(serializer.encode_object(**batch_fields(result)))
+
+@app.delete(subpath+"/api/events")
+async def delete_events_in_range_api(start_date: str, end_date: str):
+    """删除指定日期范围内的所有事件（REST API）"""
+    check_dates(start_date, end_date)
+    result = await async_db.delete_events_in_range(start_date, end_date)
+    
+    # 通过WebSocket聚合广播
+    await broadcast_batch(result)
+    
+    return json_response(serializer.encode_object(
+        deleted_count=len(result["deleted"]),
+        deleted_events=result["deleted"],
+        updated_events=result["updated"]
+    ))
+
 @app.get(subpath+"/api/health")
 async def health_check():
     """健康检查"""
     return {
         "status": "healthy",
-        "online_users": len(manager.active_connections),
-        "timestamp": datetime.now(SHANGHAI_TZ).isoformat(),
-        "timezone": "Asia/Shanghai"
+        "online_users": manager.online_count(),
+        "local_connections": len(manager.active_connections),
+        "timestamp": clock.now_iso(),
+        "timezone": CALENDAR_TZ.zone,
+        "db_pool": db.get_pool_stats(),
+        "serializer": serializer.get_stats(),
+        "range_cache": db.get_cache_stats(),
+        "fanout": manager.get_fanout_stats(),
+        "write_batches": async_db.writes.get_stats(),
+        "backplane": manager.backplane.get_stats()
     }
 
+# 抓取时读取的现有状态
+metrics.callback("calendar_ws_connections", "当前WebSocket连接数", lambda: len(manager.active_connections))
+metrics.callback("calendar_ws_send_queue_max_depth", "所有连接中最大的发送队列深度",
+                 lambda: max((sender.depth for sender in manager.active_connections.values()), default=0))
+metrics.callback("calendar_ws_send_queue_frames", "所有连接发送队列中的帧总数",
+                 lambda: sum(sender.depth for sender in manager.active_connections.values()))
+metrics.callback("calendar_ws_frames_enqueued_total", "放入发送队列的帧数",
+                 lambda: manager.stats["frames_enqueued"], kind="counter")
+metrics.callback("calendar_db_pool", "数据库连接池统计", db.get_pool_stats, label="stat")
+metrics.callback("calendar_range_cache", "范围缓存统计", db.get_cache_stats, label="stat")
+metrics.callback("calendar_serializer_cache", "序列化缓存统计", serializer.get_stats, label="stat")
+metrics.callback("calendar_static_assets", "静态资源响应统计", assets.get_stats, label="stat")
+metrics.callback("calendar_write_batches", "写操作组提交统计", async_db.writes.get_stats, label="stat")
+
+@app.get(subpath+"/api/metrics")
+async def metrics_endpoint():
+    """Prometheus 文本格式的指标"""
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
+@app.on_event("startup")
+async def startup():
+    """
+    执行数据库迁移并加载静态资源；连接背板：其他worker的写入先刷新本进程缓存，再广播给本地客户端；
+    启动连接心跳检测
+    """
+    await async_db.run(db.init_database)
+    assets.load()
+    manager.on_remote_change = async_db.sync_external_changes
+    await manager.start_backplane()
+    manager.heartbeat.start()
+
+@app.on_event("shutdown")
+async def shutdown():
+    """停止心跳检测，断开背板，关闭数据库线程池和连接池"""
+    manager.heartbeat.stop()
+    await manager.stop_backplane()
+    async_db.shutdown()
+    db.close()
+
 if __name__ == "__main__":
     import uvicorn
-    uvicorn.run(app, host="0.0.0.0", port = port , log_level="info"   )
+    # 多个worker时通过背板共享广播和在线人数（WORKERS > 1 默认使用本机Unix套接字背板）
+    workers = int(os.getenv("WORKERS", 1))
+    # 传输层的 permessage-deflate 对每个连接的每一帧单独压缩；客户端通过 hello 协商了
+    # 应用层压缩（每次广播只压缩一次）时可以设置 WS_PER_MESSAGE_DEFLATE=0 关闭
+    per_message_deflate = os.getenv("WS_PER_MESSAGE_DEFLATE", "1") != "0"
+    if workers > 1:
+        uvicorn.run("main:app", host="0.0.0.0", port=port, log_level="info", workers=workers,
+                    ws_per_message_deflate=per_message_deflate)
+    else:
+        uvicorn.run(app, host="0.0.0.0", port = port , log_level="info", ws_per_message_deflate=per_message_deflate)
@@ -0,0 +1,957 @@
+// 二进制帧首字节的标志位（与服务端 WireFormat.py 一致）
+const FRAME_ZLIB = 0x01;
+const FRAME_MSGPACK = 0x02;
+const SUPPORTS_ZLIB = typeof DecompressionStream !== 'undefined';
+
+// 精简的MessagePack解码器，只包含服务端会产生的类型
+function decodeMsgpack(bytes) {
+    const view = new DataView(bytes.buffer, bytes.byteOffset, bytes.byteLength);
+    const text = new TextDecoder();
+    let pos = 0;
+    const str = (n) => { const s = text.decode(bytes.subarray(pos, pos + n)); pos += n; return s; };
+    const arr = (n) => { const a = new Array(n); for (let i = 0; i < n; i++) a[i] = read(); return a; };
+    const map = (n) => { const o = {}; for (let i = 0; i < n; i++) { const k = read(); o[k] = read(); } return o; };
+    function read() {
+        const b = bytes[pos++];
+        if (b <= 0x7f) return b;
+        if (b >= 0xe0) return b - 0x100;
+        if ((b & 0xf0) === 0x80) return map(b & 0x0f);
+        if ((b & 0xf0) === 0x90) return arr(b & 0x0f);
+        if ((b & 0xe0) === 0xa0) return str(b & 0x1f);
+        let v;
+        switch (b) {
+            case 0xc0: return null;
+            case 0xc2: return false;
+            case 0xc3: return true;
+            case 0xc4: v = bytes[pos]; pos += 1; pos += v; return bytes.slice(pos - v, pos);
+            case 0xc5: v = view.getUint16(pos); pos += 2; pos += v; return bytes.slice(pos - v, pos);
+            case 0xc6: v = view.getUint32(pos); pos += 4; pos += v; return bytes.slice(pos - v, pos);
+            case 0xca: v = view.getFloat32(pos); pos += 4; return v;
+            case 0xcb: v = view.getFloat64(pos); pos += 8; return v;
+            case 0xcc: return bytes[pos++];
+            case 0xcd: v = view.getUint16(pos); pos += 2; return v;
+            case 0xce: v = view.getUint32(pos); pos += 4; return v;
+            case 0xcf: v = Number(view.getBigUint64(pos)); pos += 8; return v;
+            case 0xd0: v = view.getInt8(pos); pos += 1; return v;
+            case 0xd1: v = view.getInt16(pos); pos += 2; return v;
+            case 0xd2: v = view.getInt32(pos); pos += 4; return v;
+            case 0xd3: v = Number(view.getBigInt64(pos)); pos += 8; return v;
+            case 0xd9: v = bytes[pos]; pos += 1; return str(v);
+            case 0xda: v = view.getUint16(pos); pos += 2; return str(v);
+            case 0xdb: v = view.getUint32(pos); pos += 4; return str(v);
+            case 0xdc: v = view.getUint16(pos); pos += 2; return arr(v);
+            case 0xdd: v = view.getUint32(pos); pos += 4; return arr(v);
+            case 0xde: v = view.getUint16(pos); pos += 2; return map(v);
+            case 0xdf: v = view.getUint32(pos); pos += 4; return map(v);
+        }
+        throw new Error('不支持的MessagePack类型: 0x' + b.toString(16));
+    }
+    return read();
+}
+
+async function inflate(bytes) {
+    const stream = new Blob([bytes]).stream().pipeThrough(new DecompressionStream('deflate'));
+    return new Uint8Array(await new Response(stream).arrayBuffer());
+}
+
+// 文本帧为JSON；二进制帧首字节为标志位，其后是（可能压缩的）JSON或MessagePack
+async function decodeFrame(data) {
+    if (typeof data === 'string') {
+        return JSON.parse(data);
+    }
+    const frame = new Uint8Array(data);
+    let payload = frame.subarray(1);
+    if (frame[0] & FRAME_ZLIB) {
+        payload = await inflate(payload);
+    }
+    if (frame[0] & FRAME_MSGPACK) {
+        return decodeMsgpack(payload);
+    }
+    return JSON.parse(new TextDecoder().decode(payload));
+}
+
+class Calendar {
+    constructor() {
+        this.currentDate = new Date();
+        this.events = JSON.parse(localStorage.getItem('calendarEvents')) || [];
+        this.selectedColor = 'blue';
+        this.currentEventId = null;
+        this.viewMode = 'month';
+        this.currentWeekStart = null;
+
+        // WebSocket重连配置
+        this.reconnectAttempts = 0;
+        this.maxReconnectAttempts = 10;
+        this.reconnectDelay = 1000; // 初始重连延迟1秒
+        this.maxReconnectDelay = 30000; // 最大重连延迟30秒
+        this.heartbeatInterval = null;
+        this.heartbeatTimeout = null;
+        this.isManualClose = false;
+        this.isPageVisible = true;
+        // 服务端过载时建议的重连等待时间 (毫秒)
+        this.retryAfter = 0;
+
+        // 增量同步：最后一次收到的变更序号
+        this.lastSeq = null;
+
+        this.init();
+    }
+
+    init() {
+        this.connectWebSocket();
+        this.bindEvents();
+        this.renderCalendar();
+        this.updateCurrentPeriod();
+        this.setupPageVisibilityHandler();
+    }
+
+    // 设置页面可见性处理
+    setupPageVisibilityHandler() {
+        document.addEventListener('visibilitychange', () => {
+            this.isPageVisible = !document.hidden;
+
+            if (this.isPageVisible) {
+                // 页面变为可见时，检查连接状态
+                if (!this.websocket || this.websocket.readyState !== WebSocket.OPEN) {
+                    console.log('页面重新可见，检查WebSocket连接');
+                    this.connectWebSocket();
+                }
+            }
+        });
+
+        // 监听网络状态变化
+        window.addEventListener('online', () => {
+            console.log('网络重新连接');
+            this.showNotification('网络已恢复，正在重新连接...', 'info');
+            this.connectWebSocket();
+        });
+
+        window.addEventListener('offline', () => {
+            console.log('网络断开');
+            this.showNotification('网络连接断开', 'error');
+            this.updateConnectionStatus('disconnected');
+        });
+    }
+
+    // 优化的WebSocket连接管理
+    connectWebSocket() {
+        // 如果已有连接且状态正常，不重复连接
+        if (this.websocket && this.websocket.readyState === WebSocket.OPEN) {
+            return;
+        }
+
+        // 清理现有连接
+        this.cleanupWebSocket();
+
+        try {
+            const protocol = window.location.protocol === 'https:' ? 'wss:' : 'ws:';
+            const wsUrl = `${protocol}//${window.location.host}${window.location.pathname.replace(/\/$/, '')}/ws`;
+            // console.log('WebSocket URL:', wsUrl);
+
+            this.websocket = new WebSocket(wsUrl);
+            this.websocket.binaryType = 'arraybuffer';
+            // 解压是异步的，用一条Promise链保证按到达顺序处理消息
+            this.inbound = Promise.resolve();
+            this.updateConnectionStatus('connecting');
+
+            // 设置连接超时
+            const connectionTimeout = setTimeout(() => {
+                if (this.websocket.readyState === WebSocket.CONNECTING) {
+                    console.log('WebSocket连接超时');
+                    this.websocket.close();
+                }
+            }, 10000); // 10秒超时
+
+            this.websocket.onopen = () => {
+                clearTimeout(connectionTimeout);
+                console.log('WebSocket连接已建立');
+                this.updateConnectionStatus('connected');
+                this.reconnectAttempts = 0;
+                this.isManualClose = false;
+
+                // 启动心跳检测
+                this.startHeartbeat();
+
+                // 协商紧凑的帧格式，服务端不支持时继续使用JSON文本
+                this.sendWebSocketMessage({
+                    type: 'hello',
+                    formats: ['msgpack', 'json'],
+                    compression: SUPPORTS_ZLIB ? ['zlib'] : []
+                });
+
+                if (this.lastSeq !== null) {
+                    // 重连时只拉取断线期间的变更
+                    this.syncViewRange();
+                } else {
+                    // view_range 的回复已包含范围内的事件（含重复事件的展开）
+                    this.sendViewRange();
+                }
+
+                this.showNotification('连接已建立', 'success');
+            };
+
+            this.websocket.onmessage = (event) => {
+                this.inbound = this.inbound
+                    .then(() => decodeFrame(event.data))
+                    .then(data => this.handleWebSocketMessage(data))
+                    .catch(error => console.error('处理WebSocket消息失败:', error));
+                // 收到消息时重置心跳
+                this.resetHeartbeat();
+            };
+
+            this.websocket.onclose = (event) => {
+                clearTimeout(connectionTimeout);
+                this.stopHeartbeat();
+
+                console.log('WebSocket连接已关闭', event.code, event.reason);
+                this.updateConnectionStatus('disconnected');
+
+                // 只有在非手动关闭且页面可见时才尝试重连
+                if (!this.isManualClose && this.isPageVisible) {
+                    this.attemptReconnect();
+                }
+            };
+
+            this.websocket.onerror = (error) => {
+                clearTimeout(connectionTimeout);
+                console.error('WebSocket错误:', error);
+                this.updateConnectionStatus('disconnected');
+            };
+        } catch (error) {
+            console.error('WebSocket连接失败:', error);
+            this.updateConnectionStatus('disconnected');
+            this.attemptReconnect();
+        }
+    }
+
+    // 清理WebSocket连接
+    cleanupWebSocket() {
+        if (this.websocket) {
+            this.isManualClose = true;
+            this.stopHeartbeat();
+
+            if (this.websocket.readyState === WebSocket.OPEN || 
+                this.websocket.readyState === WebSocket.CONNECTING) {
+                this.websocket.close();
+            }
+
+            this.websocket = null;
+        }
+    }
+
+    // 启动心跳检测
+    startHeartbeat() {
+        this.stopHeartbeat();
+
+        this.heartbeatInterval = setInterval(() => {
+            if (this.websocket && this.websocket.readyState === WebSocket.OPEN) {
+                this.websocket.send(JSON.stringify({ type: 'ping' }));
+
+                // 设置心跳超时
+                this.heartbeatTimeout = setTimeout(() => {
+                    console.log('心跳超时，关闭连接');
+                    this.websocket.close();
+                }, 5000);
+            }
+        }, 30000); // 每30秒发送一次心跳
+    }
+
+    // 重置心跳
+    resetHeartbeat() {
+        if (this.heartbeatTimeout) {
+            clearTimeout(this.heartbeatTimeout);
+            this.heartbeatTimeout = null;
+        }
+    }
+
+    // 停止心跳检测
+    stopHeartbeat() {
+        if (this.heartbeatInterval) {
+            clearInterval(this.heartbeatInterval);
+            this.heartbeatInterval = null;
+        }
+
+        if (this.heartbeatTimeout) {
+            clearTimeout(this.heartbeatTimeout);
+            this.heartbeatTimeout = null;
+        }
+    }
+
+    // 优化的重连机制
+    attemptReconnect() {
+        // 如果页面不可见或网络离线，不进行重连
+        if (!this.isPageVisible || !navigator.onLine) {
+            console.log('页面不可见或网络离线，暂停重连');
+            return;
+        }
+
+        if (this.reconnectAttempts < this.maxReconnectAttempts) {
+            this.reconnectAttempts++;
+
+            // 指数退避算法计算延迟时间，服务端过载时至少等待其建议的时间
+            const delay = Math.max(Math.min(
+                this.reconnectDelay * Math.pow(2, this.reconnectAttempts - 1),
+                this.maxReconnectDelay
+            ), this.retryAfter);
+            this.retryAfter = 0;
+
+            console.log(`尝试重连 (${this.reconnectAttempts}/${this.maxReconnectAttempts})，${delay}ms后重试`);
+            this.showNotification(`连接断开，${Math.ceil(delay/1000)}秒后重试 (${this.reconnectAttempts}/${this.maxReconnectAttempts})`, 'info');
+
+            setTimeout(() => {
+                if (!this.isManualClose && this.isPageVisible) {
+                    this.connectWebSocket();
+                }
+            }, delay);
+        } else {
+            console.log('达到最大重连次数，停止重连');
+            this.showNotification('连接失败，请手动刷新页面重试', 'error');
+        }
+    }
+
+    updateConnectionStatus(status) {
+        const statusElement = document.getElementById('connectionStatus');
+        const statusText = document.getElementById('statusText');
+
+        statusElement.className = `connection-status status-${status}`;
+
+        switch (status) {
+            case 'connected':
+                statusText.innerHTML = '<i class="fas fa-check-circle mr-2"></i>已连接';
+                break;
+            case 'connecting':
+                statusText.innerHTML = '<div class="loading-spinner mr-2"></div>连接中...';
+                break;
+            case 'disconnected':
+                statusText.innerHTML = '<i class="fas fa-exclamation-circle mr-2"></i>连接断开';
+                break;
+        }
+    }
+
+    handleWebSocketMessage(data) {
+        switch (data.type) {
+            case 'events_list':
+                this.events = data.events;
+                if (data.seq !== undefined) {
+                    this.lastSeq = data.seq;
+                }
+                this.renderCalendar();
+                break;
+            case 'events_delta':
+                if (data.full) {
+                    this.events = data.events;
+                } else {
+                    const deletedIds = new Set(data.deleted_ids);
+                    const changed = new Map(data.events.map(e => [e.id, e]));
+                    this.events = this.events
+                        .filter(e => !deletedIds.has(e.id) && !changed.has(e.id))
+                        .concat(data.events);
+                }
+                this.lastSeq = data.seq;
+                this.renderCalendar();
+                break;
+            case 'event_created':
+                if (data.event.recurrence) {
+                    // 重复事件由服务端按视图范围展开
+                    this.sendViewRange();
+                    this.showNotification('新事件已添加', 'success');
+                    break;
+                }
+                this.events.push(data.event);
+                this.renderCalendar();
+                this.showNotification('新事件已添加', 'success');
+                break;
+            case 'event_updated':
+                if (data.event.recurrence || this.events.some(e => e.id === data.event.id && e.series_start)) {
+                    this.events = this.events.filter(e => e.id !== data.event.id);
+                    this.sendViewRange();
+                    this.showNotification('事件已更新', 'info');
+                    break;
+                }
+                const updateIndex = this.events.findIndex(e => e.id === data.event.id);
+                if (updateIndex !== -1) {
+                    this.events[updateIndex] = data.event;
+                    this.renderCalendar();
+                    this.showNotification('事件已更新', 'info');
+                }
+                break;
+            case 'event_deleted':
+                this.events = this.events.filter(e => e.id !== data.event_id);
+                this.renderCalendar();
+                this.showNotification('事件已删除', 'info');
+                break;
+            case 'events_batch': {
+                const removedIds = new Set(data.deleted_ids);
+                const changed = new Map(data.updated.map(e => [e.id, e]));
+                this.events = this.events
+                    .filter(e => !removedIds.has(e.id))
+                    .map(e => changed.get(e.id) || e)
+                    .concat(data.created);
+                if (data.created.concat(data.updated).some(e => e.recurrence)) {
+                    this.sendViewRange();
+                }
+                this.renderCalendar();
+                this.showNotification('事件已批量更新', 'info');
+                break;
+            }
+            case 'events_imported':
+                // 批量导入只发通知，按当前视图增量同步
+                if (this.lastSeq !== null) {
+                    this.syncViewRange();
+                } else {
+                    this.sendViewRange();
+                }
+                this.showNotification(`已导入 ${data.count} 个事件`, 'info');
+                break;
+            case 'welcome':
+                this.wireFormat = data;
+                break;
+            case 'online_users':
+                document.getElementById('onlineUsers').textContent = `${data.count}`;
+                break;
+            case 'pong':
+                // 收到pong消息时重置心跳
+                this.resetHeartbeat();
+                break;
+            case 'ping':
+                // 服务端对空闲连接的心跳检测
+                this.sendWebSocketMessage({ type: 'pong' });
+                break;
+            case 'overloaded':
+                // 服务端连接数已满，按建议的时间后再重连
+                this.retryAfter = data.retry_after * 1000;
+                break;
+            case 'error':
+                console.error('WebSocket错误:', data);
+                // this.showNotification(data.message, 'error');
+                break;
+        }
+    }
+
+    sendWebSocketMessage(data) {
+        if (this.websocket && this.websocket.readyState === WebSocket.OPEN) {
+            this.websocket.send(JSON.stringify(data));
+            return true;
+        } else {
+            this.showNotification('连接断开，消息发送失败，正在重连...', 'error');
+            // 尝试重新连接
+            this.connectWebSocket();
+            return false;
+        }
+    }
+
+    sendViewRange() {
+        if (this.currentViewRange.start && this.currentViewRange.end) {
+            this.sendWebSocketMessage({
+                type: 'view_range',
+                start_date: this.currentViewRange.start,
+                end_date: this.currentViewRange.end
+            });
+        }
+    }
+
+    syncViewRange() {
+        if (this.currentViewRange.start && this.currentViewRange.end) {
+            this.sendWebSocketMessage({
+                type: 'sync_range',
+                start_date: this.currentViewRange.start,
+                end_date: this.currentViewRange.end,
+                since_seq: this.lastSeq
+            });
+        }
+    }
+
+    requestEvents() {
+        this.sendWebSocketMessage({ type: 'get_events' });
+    }
+
+    calculateViewRange() {
+        if (this.viewMode === 'month') {
+            const year = this.currentDate.getFullYear();
+            const month = this.currentDate.getMonth();
+            const firstDay = new Date(`${year}-${String(month + 1).padStart(2, '0')}-01T00:00:00+08:00`);
+            const lastDay = new Date(`${year}-${String(month + 2).padStart(2, '0')}-01T00:00:00+08:00`);
+            const startDate = new Date(firstDay.getTime());
+            startDate.setDate(startDate.getDate() - firstDay.getDay());
+            const endDate = new Date(startDate);
+            endDate.setDate(startDate.getDate() + 41); // 6周
+
+            this.currentViewRange = {
+                start: this.formatDate(startDate),
+                end: this.formatDate(endDate)
+            };
+        } else {
+            const endDate = new Date(this.currentWeekStart);
+            endDate.setDate(this.currentWeekStart.getDate() + 6);
+
+            this.currentViewRange = {
+                start: this.formatDate(this.currentWeekStart),
+                end: this.formatDate(endDate)
+            };
+        }
+    }
+
+    showNotification(message, type = 'info') {
+        const notification = document.getElementById('notification');
+        const notificationText = document.getElementById('notificationText');
+
+        notification.className = `notification notification-${type}`;
+        notificationText.textContent = message;
+        notification.classList.add('show');
+
+        setTimeout(() => {
+            notification.classList.remove('show');
+        }, 3000);
+    }
+
+    bindEvents() {
+        // 导航按钮
+        document.getElementById('prevPeriod').addEventListener('click', () => this.previousPeriod());
+        document.getElementById('nextPeriod').addEventListener('click', () => this.nextPeriod());
+        document.getElementById('todayBtn').addEventListener('click', () => this.goToToday());
+
+        // 视图切换
+        document.getElementById('monthView').addEventListener('click', () => this.switchToMonthView());
+        document.getElementById('weekView').addEventListener('click', () => this.switchToWeekView());
+
+        // 模态框控制
+        document.getElementById('addEventBtn').addEventListener('click', () => this.openEventModal());
+        document.getElementById('closeModal').addEventListener('click', () => this.closeEventModal());
+        document.getElementById('cancelEvent').addEventListener('click', () => this.closeEventModal());
+        document.getElementById('closeDetailModal').addEventListener('click', () => this.closeDetailModal());
+
+        // 表单提交
+        document.getElementById('eventForm').addEventListener('submit', (e) => this.saveEvent(e));
+
+        // 颜色选择
+        document.querySelectorAll('.color-option').forEach(btn => {
+            btn.addEventListener('click', (e) => this.selectColor(e));
+        });
+
+        // 事件操作
+        document.getElementById('deleteEvent').addEventListener('click', () => this.deleteEvent());
+        document.getElementById('editEvent').addEventListener('click', () => this.editEvent());
+
+        // 默认选择蓝色
+        document.querySelector('[data-color="blue"]').classList.add('border-gray-800');
+    }
+
+    switchToMonthView() {
+        this.viewMode = 'month';
+        document.getElementById('monthView').className = 'px-3 py-2 bg-blue-100 text-blue-700 rounded-lg font-medium';
+        document.getElementById('weekView').className = 'px-3 py-2 text-gray-600 hover:bg-gray-100 rounded-lg';
+        this.renderCalendar();
+        this.updateCurrentPeriod();
+        this.calculateViewRange();
+        this.sendViewRange();
+    }
+
+    switchToWeekView() {
+        this.viewMode = 'week';
+        document.getElementById('monthView').className = 'px-3 py-2 text-gray-600 hover:bg-gray-100 rounded-lg';
+        document.getElementById('weekView').className = 'px-3 py-2 bg-blue-100 text-blue-700 rounded-lg font-medium';
+        this.setCurrentWeek();
+        this.renderCalendar();
+        this.updateCurrentPeriod();
+        this.calculateViewRange();
+        this.sendViewRange();
+    }
+
+    // 在setCurrentWeek方法中
+    setCurrentWeek() {
+        const today = new Date(this.currentDate);
+        const dayOfWeek = today.getDay();
+        this.currentWeekStart = new Date(today);
+        this.currentWeekStart.setDate(today.getDate() - dayOfWeek);
+    }
+
+    renderCalendar() {
+        if (this.viewMode === 'month') {
+            this.renderMonthView();
+        } else {
+            this.renderWeekView();
+        }
+        this.calculateViewRange();
+    }
+
+    renderMonthView() {
+        const grid = document.getElementById('calendarGrid');
+        grid.innerHTML = '';
+        grid.className = 'calendar-grid';
+
+        const year = this.currentDate.getFullYear();
+        const month = this.currentDate.getMonth();
+
+        const firstDay = new Date(year, month, 1);
+        const lastDay = new Date(year, month + 1, 0);
+        const startDate = new Date(firstDay);
+        startDate.setDate(startDate.getDate() - firstDay.getDay());
+
+        for (let week = 0; week < 6; week++) {
+            for (let day = 0; day < 7; day++) {
+
+                const cellDate = new Date(startDate);
+
+                cellDate.setDate(startDate.getDate() + (week * 7) + day);
+
+                const cell = this.createDayCell(cellDate, month);
+                grid.appendChild(cell);
+            }
+        }
+    }
+
+    renderWeekView() {
+        const grid = document.getElementById('calendarGrid');
+        grid.innerHTML = '';
+        grid.className = 'week-grid';
+
+        this.updateWeekHeader();
+
+        for (let day = 0; day < 7; day++) {
+
+            const cellDate = new Date(this.currentWeekStart);
+            cellDate.setDate(this.currentWeekStart.getDate() + day);
+
+            const cell = this.createWeekDayCell(cellDate);
+            grid.appendChild(cell);
+        }
+    }
+
+    updateWeekHeader() {
+        const header = document.getElementById('weekHeader');
+        header.innerHTML = '';
+
+        const weekDays = ['周日', '周一', '周二', '周三', '周四', '周五', '周六'];
+
+        for (let day = 0; day < 7; day++) {
+            const cellDate = new Date(this.currentWeekStart);
+            cellDate.setDate(this.currentWeekStart.getDate() + day);
+
+            const headerCell = document.createElement('div');
+            headerCell.className = 'p-4 text-center border-r last:border-r-0';
+            headerCell.innerHTML = `
+                <div class="font-semibold text-gray-700">${weekDays[day]}</div>
+                <div class="text-lg font-bold mt-1 ${this.isToday(cellDate) ? 'text-blue-600' : 'text-gray-900'}">
+                    ${cellDate.getDate()}
+                </div>
+            `;
+            header.appendChild(headerCell);
+        }
+    }
+
+    createWeekDayCell(date) {
+
+        const cell = document.createElement('div');
+        const isToday = this.isToday(date);
+        const dateStr = this.formatDate(date);
+
+        cell.className = `week-day-cell border-r border-b p-2 last:border-r-0 ${isToday ? 'bg-blue-50' : 'bg-white'} hover:bg-gray-100 cursor-pointer`;
+
+        const dayEvents = this.events.filter(event => event.date === dateStr);
+        dayEvents.forEach(event => {
+            const eventEl = document.createElement('div');
+            eventEl.className = `event truncate md:whitespace-normal w-9 md:w-auto  bg-${event.color}-100 text-${event.color}-800 border-l-2 border-${event.color}-500 mb-2`;
+            eventEl.innerHTML = `
+                <div class="font-medium ">${event.title}</div>
+                ${event.time ? `<div class="text-xs opacity-75">${event.time}</div>` : ''}
+            `;
+            eventEl.addEventListener('click', (e) => {
+                e.stopPropagation();
+                this.showEventDetail(event);
+            });
+            cell.appendChild(eventEl);
+        });
+
+        cell.addEventListener('click', () => {
+            this.openEventModal(dateStr);
+        });
+
+        return cell;
+    }
+
+    createDayCell(date, currentMonth) {
+
+        const cell = document.createElement('div');
+        const isCurrentMonth = date.getMonth() === currentMonth;
+        const isToday = this.isToday(date);
+        const dateStr = this.formatDate(date);
+
+        cell.className = `day-cell border-r border-b p-2 ${isCurrentMonth ? 'bg-white' : 'bg-gray-50'} hover:bg-gray-100 cursor-pointer`;
+
+        const dayNumber = document.createElement('div');
+        dayNumber.className = `text-sm font-medium mb-1 ${isCurrentMonth ? 'text-gray-900' : 'text-gray-400'} ${isToday ? 'bg-blue-600 text-white rounded-full w-6 h-6 flex items-center justify-center' : ''}`;
+        dayNumber.textContent = date.getDate();
+        cell.appendChild(dayNumber);
+
+        const dayEvents = this.events.filter(event => event.date === dateStr);
+        dayEvents.forEach(event => {
+            const eventEl = document.createElement('div');
+            eventEl.className = `event truncate md:whitespace-normal w-9 md:w-auto bg-${event.color}-100 text-${event.color}-800 border-l-2 border-${event.color}-500`;
+            eventEl.textContent = event.title;
+            eventEl.addEventListener('click', (e) => {
+                e.stopPropagation();
+                this.showEventDetail(event);
+            });
+            cell.appendChild(eventEl);
+        });
+
+        cell.addEventListener('click', () => {
+            this.openEventModal(dateStr);
+        });
+
+        return cell;
+    }
+
+    previousPeriod() {
+        if (this.viewMode === 'month') {
+            this.currentDate.setMonth(this.currentDate.getMonth() - 1);
+        } else {
+            this.currentWeekStart.setDate(this.currentWeekStart.getDate() - 7);
+        }
+        this.renderCalendar();
+        this.updateCurrentPeriod();
+        this.sendViewRange();
+    }
+
+    nextPeriod() {
+        if (this.viewMode === 'month') {
+            this.currentDate.setMonth(this.currentDate.getMonth() + 1);
+        } else {
+            this.currentWeekStart.setDate(this.currentWeekStart.getDate() + 7);
+        }
+        this.renderCalendar();
+        this.updateCurrentPeriod();
+        this.sendViewRange();
+    }
+
+    goToToday() {
+        this.currentDate = new Date();
+        if (this.viewMode === 'week') {
+            this.setCurrentWeek();
+        }
+        this.renderCalendar();
+        this.updateCurrentPeriod();
+        this.sendViewRange();
+    }
+
+    updateCurrentPeriod() {
+        const periodElement = document.getElementById('currentPeriod');
+
+        if (this.viewMode === 'month') {
+            const monthNames = [
+                '一月', '二月', '三月', '四月', '五月', '六月',
+                '七月', '八月', '九月', '十月', '十一月', '十二月'
+            ];
+            const monthText = `${this.currentDate.getFullYear()}年 ${monthNames[this.currentDate.getMonth()]}`;
+            periodElement.textContent = monthText;
+        } else {
+            const weekEnd = new Date(this.currentWeekStart);
+            weekEnd.setDate(this.currentWeekStart.getDate() + 6);
+
+            const startMonth = this.currentWeekStart.getMonth() + 1;
+            const startDay = this.currentWeekStart.getDate();
+            const endMonth = weekEnd.getMonth() + 1;
+            const endDay = weekEnd.getDate();
+            const year = this.currentWeekStart.getFullYear();
+
+            if (startMonth === endMonth) {
+                periodElement.textContent = `${year}年${startMonth}月${startDay}日-${endDay}日`;
+            } else {
+                periodElement.textContent = `${year}年${startMonth}月${startDay}日-${endMonth}月${endDay}日`;
+            }
+        }
+    }
+
+    openEventModal(date = null) {
+        const modal = document.getElementById('eventModal');
+        const dateInput = document.getElementById('eventDate');
+        const modalTitle = document.getElementById('modalTitle');
+
+        if (this.currentEventId) {
+            modalTitle.textContent = '编辑事件';
+        } else {
+            modalTitle.textContent = '添加新事件';
+        }
+
+        if (date) {
+            dateInput.value = date;
+        } else if (!this.currentEventId) { // 只有在非编辑模式下才设置当前日期
+            dateInput.value = this.formatDate(new Date());
+        }
+
+        modal.classList.add('show');
+    }
+
+    closeEventModal() {
+        const modal = document.getElementById('eventModal');
+        modal.classList.remove('show');
+        document.getElementById('eventForm').reset();
+        this.currentEventId = null; // 重置事件ID
+
+        document.querySelectorAll('.color-option').forEach(btn => {
+            btn.classList.remove('border-gray-800');
+        });
+        document.querySelector('[data-color="blue"]').classList.add('border-gray-800');
+        this.selectedColor = 'blue';
+    }
+
+    selectColor(e) {
+        document.querySelectorAll('.color-option').forEach(btn => {
+            btn.classList.remove('border-gray-800');
+        });
+        e.target.classList.add('border-gray-800');
+        this.selectedColor = e.target.dataset.color;
+    }
+
+    saveEvent(e) {
+        e.preventDefault();
+
+        const title = document.getElementById('eventTitle').value;
+        const date = document.getElementById('eventDate').value;
+        const time = document.getElementById('eventTime').value;
+        const description = document.getElementById('eventDescription').value;
+
+        const eventData = {
+            title,
+            date,
+            time,
+            description,
+            color: this.selectedColor
+        };
+
+        if (this.currentEventId) {
+            eventData.id = this.currentEventId;
+            // 编辑重复事件的某次发生时修改整个系列，保留重复规则
+            const original = this.events.find(e => e.id === this.currentEventId);
+            if (original && original.recurrence) {
+                eventData.recurrence = original.recurrence;
+                eventData.series_start = original.series_start;
+            }
+            this.sendWebSocketMessage({
+                type: 'update_event',
+                event: eventData
+            });
+        } else {
+            this.sendWebSocketMessage({
+                type: 'create_event',
+                event: eventData
+            });
+        }
+
+        this.closeEventModal();
+    }
+
+    showEventDetail(event) {
+        const modal = document.getElementById('eventDetailModal');
+        const content = document.getElementById('eventDetailContent');
+
+        content.innerHTML = `
+            <div class="space-y-4">
+                <div>
+                    <h4 class="font-semibold text-gray-900 text-lg">${event.title}</h4>
+                </div>
+                <div class="flex items-center text-gray-600">
+                    <i class="fas fa-calendar mr-2"></i>
+                    <span>${this.formatDisplayDate(event.date)}</span>
+                </div>
+                ${event.time ? `
+                    <div class="flex items-center text-gray-600">
+                        <i class="fas fa-clock mr-2"></i>
+                        <span>${event.time} (上海时间)</span>
+                    </div>
+                ` : ''}
+                ${event.description ? `
+                    <div>
+                        <h5 class="font-medium text-gray-700 mb-2">描述</h5>
+                        <p class="text-gray-600">${event.description}</p>
+                    </div>
+                ` : ''}
+                <div class="flex items-center">
+                    <span class="w-4 h-4 rounded-full bg-${event.color}-500 mr-2"></span>
+                    <span class="text-gray-600 capitalize">${event.color}</span>
+                </div>
+            </div>
+        `;
+
+        this.currentEventId = event.id;
+        modal.classList.add('show');
+    }
+
+    closeDetailModal() {
+        const modal = document.getElementById('eventDetailModal');
+        modal.classList.remove('show');
+        this.currentEventId = null;
+    }
+
+    editEvent() {
+        const event = this.events.find(e => e.id === this.currentEventId);
+        if (!event) return;
+
+        // 先设置表单数据
+        document.getElementById('eventTitle').value = event.title;
+        document.getElementById('eventDate').value = event.date;
+        document.getElementById('eventTime').value = event.time || '';
+        document.getElementById('eventDescription').value = event.description || '';
+
+        document.querySelectorAll('.color-option').forEach(btn => {
+            btn.classList.remove('border-gray-800');
+        });
+        document.querySelector(`[data-color="${event.color}"]`).classList.add('border-gray-800');
+        this.selectedColor = event.color;
+
+        // 保存当前事件ID
+        const eventId = this.currentEventId;
+
+        this.closeDetailModal();
+
+        // 恢复事件ID并打开模态框
+        this.currentEventId = eventId;
+        this.openEventModal(); // 不传递日期参数，保持表单中已设置的日期
+    }
+
+    deleteEvent() {
+        if (confirm('确定要删除这个事件吗？')) {
+            this.sendWebSocketMessage({
+                type: 'delete_event',
+                event_id: this.currentEventId
+            });
+            this.closeDetailModal();
+        }
+    }
+
+    formatDate(date) {
+        // return date.toISOString().split('T')[0];
+        // 确保使用本地时区格式化
+        let year = date.getFullYear();
+        let month = String(date.getMonth() + 1).padStart(2, '0');
+        let day = String(date.getDate()).padStart(2, '0');
+        return `${year}-${month}-${day}`;       
+    }
+
+    // formatDisplayDate(dateStr) {
+    //     const date = new Date(dateStr + 'T00:00:00');
+    //     const year = date.getFullYear();
+    //     const month = date.getMonth() + 1;
+    //     const day = date.getDate();
+    //     return `${year}年${month}月${day}日`;
+    // }
+
+    formatDisplayDate(dateStr) {
+        // 使用本地日期解析，避免时区问题
+        const parts = dateStr.split('-');
+        const year = parseInt(parts[0]);
+        const month = parseInt(parts[1]);
+        const day = parseInt(parts[2]);
+        return `${year}年${month}月${day}日`;
+    }
+
+    isToday(date) {
+        const today = new Date();
+        return date.toDateString() === today.toDateString();
+    }
+}
+
+// 初始化日历
+document.addEventListener('DOMContentLoaded', () => {
+    new Calendar();
+});
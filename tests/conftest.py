@@ -0,0 +1,23 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from DatabaseManager import DatabaseManager
+
+# 三种读取路径：直接查询SQLite、按月的范围缓存、常驻内存的事件存储
+READ_MODES = {
+    "sqlite": {"range_cache_months": 0, "memory_store": False},
+    "range_cache": {"range_cache_months": 48, "memory_store": False},
+    "memory_store": {"memory_store": True},
+}
+
+
+@pytest.fixture(params=sorted(READ_MODES))
+def db(request, tmp_path):
+    """临时目录中的数据库（已执行迁移），每种读取路径各运行一次，测试结束后关闭"""
+    manager = DatabaseManager(str(tmp_path / "calendar.db"), **READ_MODES[request.param])
+    yield manager
+    manager.close()
@@ -0,0 +1,42 @@
+from Event import Event, Recurrence
+
+
+def test_snapshot_expands_series_without_second_reader(db):
+    # 只有一个读连接：展开重复系列时若仍持有快照的读连接，再次借读连接会超时
+    db.pool.max_readers = 1
+    db.pool.acquire_timeout = 0.5
+    seq = db.get_current_seq()
+    db.create_event(Event(title="单次", date="2024-03-05"))
+    db.create_event(Event(title="周会", date="2024-03-04", recurrence=Recurrence(freq="weekly", count=2)))
+    changes = db.get_changes_since(seq, "2024-03-01", "2024-03-31")
+    assert changes["full"] is True
+    assert [(e.date, e.title) for e in changes["events"]] == [
+        ("2024-03-04", "周会"), ("2024-03-05", "单次"), ("2024-03-11", "周会")]
+
+
+def test_delta_reports_moves_out_of_range(db):
+    event = db.create_event(Event(title="单次", date="2024-03-05"))
+    seq = db.get_current_seq()
+    event.date = "2024-04-05"
+    db.update_event(event)
+    changes = db.get_changes_since(seq, "2024-03-01", "2024-03-31")
+    assert changes == {"seq": seq + 1, "full": False, "events": [], "deleted_ids": [event.id]}
+
+
+def test_client_timezone_filters_like_range_read(db):
+    seq = db.get_current_seq()
+    for title, date, time in [("早上", "2024-03-15", "09:00"), ("次日早上", "2024-03-16", "09:00"),
+                              ("全天", "2024-03-15", None), ("次日全天", "2024-03-16", None)]:
+        db.create_event(Event(title=title, date=date, time=time))
+    expected = [e.title for e in db.get_events_in_range("2024-03-15", "2024-03-15", "America/New_York")]
+    assert expected == ["全天", "次日早上"]
+
+    delta = db.get_changes_since(seq, "2024-03-15", "2024-03-15", "America/New_York")
+    assert delta["full"] is False
+    assert [e.title for e in delta["events"]] == expected
+    assert len(delta["deleted_ids"]) == 2
+
+    db.create_event(Event(title="周会", date="2024-03-08", recurrence=Recurrence(freq="weekly", count=2)))
+    snapshot = db.get_changes_since(seq, "2024-03-15", "2024-03-15", "America/New_York")
+    assert snapshot["full"] is True
+    assert [e.title for e in snapshot["events"]] == ["全天", "周会", "次日早上"]
@@ -0,0 +1,29 @@
+from Event import Event, Recurrence
+
+
+def test_delete_range_removes_singles_and_series_occurrences(db):
+    db.create_event(Event(title="单次", date="2024-03-05"))
+    kept = db.create_event(Event(title="范围外", date="2024-04-01", time="09:00"))
+    inside = db.create_event(Event(title="周会", date="2024-03-04", recurrence=Recurrence(freq="weekly", count=2)))
+    daily = db.create_event(Event(title="早会", date="2024-02-28", recurrence=Recurrence(freq="daily")))
+
+    result = db.delete_events_in_range("2024-03-01", "2024-03-31")
+
+    assert sorted(e.title for e in result["deleted"]) == sorted(["单次", "周会"])
+    assert [e.id for e in result["updated"]] == [daily.id]
+    assert db.get_event_by_id(inside.id) is None
+    assert db.get_event_by_id(kept.id) is not None
+    assert db.get_events_in_range("2024-03-01", "2024-03-31") == []
+    assert db.get_daily_counts("2024-03-01", "2024-03-31")["total"] == 0
+    remaining = db.get_events_in_range("2024-02-01", "2024-04-02")
+    assert [(e.title, e.date) for e in remaining] == [
+        ("早会", "2024-02-28"), ("早会", "2024-02-29"),
+        ("早会", "2024-04-01"), ("范围外", "2024-04-01"), ("早会", "2024-04-02"),
+    ]
+
+
+def test_delete_range_without_series_occurrences_keeps_series(db):
+    series = db.create_event(Event(title="月会", date="2024-01-15", recurrence=Recurrence(freq="monthly")))
+    result = db.delete_events_in_range("2024-03-01", "2024-03-10")
+    assert result == {"created": [], "updated": [], "deleted": []}
+    assert db.get_event_by_id(series.id).recurrence.exdates == []
@@ -0,0 +1,36 @@
+from ICalendar import import_stream
+
+ICS = """BEGIN:VCALENDAR
+BEGIN:VEVENT
+UID:weekly
+SUMMARY:周会
+DTSTART;VALUE=DATE:20240304
+RRULE:FREQ=WEEKLY;BYDAY=MO;COUNT=3
+END:VEVENT
+BEGIN:VEVENT
+UID:twice-a-week
+SUMMARY:健身
+DTSTART;VALUE=DATE:20240304
+RRULE:FREQ=WEEKLY;BYDAY=MO,TH
+END:VEVENT
+BEGIN:VEVENT
+UID:first-monday
+SUMMARY:月会
+DTSTART;VALUE=DATE:20240304
+RRULE:FREQ=MONTHLY;BYDAY=1MO
+END:VEVENT
+BEGIN:VEVENT
+UID:huge-interval
+SUMMARY:间隔过大
+DTSTART;VALUE=DATE:20240304
+RRULE:FREQ=DAILY;INTERVAL=10000000
+END:VEVENT
+END:VCALENDAR
+"""
+
+
+def test_unsupported_rrule_parts_are_skipped(db):
+    result = import_stream(db, [ICS])
+    assert result == {"created": 1, "updated": 0, "skipped": 3}
+    assert [e.date for e in db.get_events_in_range("2024-03-01", "2024-03-31")] == [
+        "2024-03-04", "2024-03-11", "2024-03-18"]
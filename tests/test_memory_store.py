@@ -0,0 +1,13 @@
+from Event import Event
+from MemoryEventStore import MemoryEventStore
+
+
+def test_reads_return_independent_events():
+    store = MemoryEventStore()
+    store.put(Event(id="a", title="原标题", date="2024-03-01", created_at="x", updated_at="x"))
+    first = store.get("a")
+    first.title = "调用方修改"
+    first.date = "2024-04-01"
+    assert store.get("a").title == "原标题"
+    assert [e.date for e in store.get_range("2024-03-01", "2024-03-31")] == ["2024-03-01"]
+    assert store.get_range("2024-03-01", "2024-03-31")[0] is not store.get_all()[0]
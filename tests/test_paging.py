@@ -0,0 +1,45 @@
+from DatabaseManager import page_key
+from Event import Event, Recurrence
+
+
+def fill(db):
+    for day in range(1, 11):
+        db.create_event(Event(title=f"单次{day}", date=f"2024-03-{day:02d}", time="09:00" if day % 2 else None))
+    db.create_event(Event(title="周会", date="2024-03-04", time="10:00", recurrence=Recurrence(freq="weekly", count=3)))
+    db.create_event(Event(title="早会", date="2024-03-01", recurrence=Recurrence(freq="daily")))
+
+
+def read_all_pages(db, limit, start_date=None, end_date=None):
+    events, after, pages = [], None, 0
+    while True:
+        page, after = db.get_events_page(limit, after, start_date, end_date)
+        assert len(page) <= limit
+        events.extend(page)
+        pages += 1
+        if after is None:
+            return events, pages
+
+
+def test_pages_include_series_occurrences_in_range(db):
+    fill(db)
+    expected = [page_key(e) for e in sorted(db.get_events_in_range("2024-03-01", "2024-03-31"), key=page_key)]
+    for limit in (1, 3, 7, 100):
+        events, _ = read_all_pages(db, limit, "2024-03-01", "2024-03-31")
+        assert [page_key(e) for e in events] == expected
+    assert len(expected) == 10 + 3 + 31
+
+
+def test_pages_without_range_return_series_once(db):
+    fill(db)
+    events, pages = read_all_pages(db, 4)
+    assert sorted(page_key(e) for e in events) == sorted(page_key(e) for e in db.get_all_events())
+    assert [e.title for e in events].count("早会") == 1
+    assert pages == 3
+
+
+def test_page_cursor_is_strictly_increasing(db):
+    fill(db)
+    page, after = db.get_events_page(5, None, "2024-03-01", "2024-03-31")
+    next_page, _ = db.get_events_page(5, after, "2024-03-01", "2024-03-31")
+    assert after == page_key(page[-1])
+    assert all(page_key(e) > after for e in next_page)
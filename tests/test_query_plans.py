@@ -0,0 +1,45 @@
+import pytest
+
+from CalendarTime import day_number
+from DatabaseManager import (DatabaseManager, SQL_SELECT_RANGE, SQL_SELECT_BUCKET, SQL_SELECT_PAGE, SQL_DELETE_RANGE,
+                             SQL_SELECT_CHANGES, SQL_SELECT_DAILY_COUNTS, SQL_SEARCH_EVENTS, SQL_SEARCH_SERIES)
+from Event import Event
+
+MARCH = (day_number("2024-03-01"), day_number("2024-03-31"))
+
+# (查询, 参数, 执行计划中必须出现的内容, 不允许出现的内容)
+CHECKS = {
+    "range": (SQL_SELECT_RANGE, MARCH, "USING COVERING INDEX idx_events_day", "TEMP B-TREE"),
+    "bucket": (SQL_SELECT_BUCKET, (MARCH[0], day_number("2024-04-01")),
+               "USING COVERING INDEX idx_events_day", "TEMP B-TREE"),
+    "page": (SQL_SELECT_PAGE, MARCH + (MARCH[0], -1, "", 100), "USING COVERING INDEX idx_events_day", "TEMP B-TREE"),
+    "delete_range": (SQL_DELETE_RANGE, MARCH, "idx_events_day", "SCAN events"),
+    "changes": (SQL_SELECT_CHANGES, (0, 10, "2024-03-01", "2024-03-31", "2024-03-01", "2024-03-31"),
+                "USING INTEGER PRIMARY KEY", "SCAN change_log"),
+    "daily_counts": (SQL_SELECT_DAILY_COUNTS, ("2024-03-01", "2024-03-31"), "USING PRIMARY KEY", "SCAN daily_counts"),
+    # 全文检索的结果经 search_keys 的整数主键和事件表的主键逐行连接，不扫描事件表
+    "search_events": (SQL_SEARCH_EVENTS, ('"seed"', "2024-03-01", "2024-03-31", 20),
+                      "SEARCH e USING INDEX sqlite_autoindex_events_1", "SCAN k"),
+    "search_series": (SQL_SEARCH_SERIES, ('"seed"', "2024-03-31", "2024-03-01", 20),
+                      "SEARCH r USING INDEX sqlite_autoindex_recurring_events_1", "SCAN k"),
+}
+
+
+@pytest.fixture(scope="module")
+def seeded(tmp_path_factory):
+    db = DatabaseManager(str(tmp_path_factory.mktemp("plans") / "calendar.db"))
+    db.create_events([Event(title=f"seed {i}", date=f"2024-{i % 12 + 1:02d}-{i % 28 + 1:02d}", time="09:00")
+                      for i in range(2000)])
+    with db.pool.writer() as conn:
+        conn.execute("ANALYZE")
+    yield db
+    db.close()
+
+
+@pytest.mark.parametrize("name", sorted(CHECKS))
+def test_query_plan(seeded, name):
+    sql, params, expected, forbidden = CHECKS[name]
+    with seeded.pool.reader() as conn:
+        plan = [row[3] for row in conn.execute("EXPLAIN QUERY PLAN " + sql, params)]
+    assert any(expected in line for line in plan), plan
+    assert not any(forbidden in line for line in plan), plan
@@ -0,0 +1,28 @@
+from Event import Event, Recurrence
+
+
+def test_range_read_merges_singles_and_series(db):
+    db.create_event(Event(title="全天", date="2024-03-11"))
+    db.create_event(Event(title="下午", date="2024-03-11", time="15:00"))
+    db.create_event(Event(title="范围外", date="2024-04-11", time="15:00"))
+    db.create_event(Event(title="周会", date="2024-02-26", time="10:00",
+                          recurrence=Recurrence(freq="weekly", until="2024-03-18", exdates=["2024-03-04"])))
+    events = db.get_events_in_range("2024-03-01", "2024-03-31")
+    assert [(e.date, e.time, e.title) for e in events] == [
+        ("2024-03-11", None, "全天"), ("2024-03-11", "10:00", "周会"), ("2024-03-11", "15:00", "下午"),
+        ("2024-03-18", "10:00", "周会"),
+    ]
+    assert {e.series_start for e in events if e.title == "周会"} == {"2024-02-26"}
+    assert db.get_daily_counts("2024-03-01", "2024-03-31")["days"] == {"2024-03-11": 3, "2024-03-18": 1}
+
+
+def test_range_read_sees_writes(db):
+    assert db.get_events_in_range("2024-03-01", "2024-03-31") == []
+    event = db.create_event(Event(title="新建", date="2024-03-05"))
+    assert [e.id for e in db.get_events_in_range("2024-03-01", "2024-03-31")] == [event.id]
+    event.date = "2024-04-05"
+    db.update_event(event)
+    assert db.get_events_in_range("2024-03-01", "2024-03-31") == []
+    assert [e.id for e in db.get_events_in_range("2024-04-01", "2024-04-30")] == [event.id]
+    db.delete_event(event.id)
+    assert db.get_events_in_range("2024-04-01", "2024-04-30") == []
@@ -0,0 +1,47 @@
+import sqlite3
+
+import pytest
+
+from Event import Event, Recurrence
+from Recurrence import MAX_INTERVAL, expand_dates, validate_recurrence
+
+
+def test_interval_out_of_range_is_rejected():
+    with pytest.raises(ValueError):
+        validate_recurrence(Recurrence(freq="daily", interval=MAX_INTERVAL + 1), "2024-03-01")
+    with pytest.raises(ValueError):
+        validate_recurrence(Recurrence(freq="daily", interval=0), "2024-03-01")
+    validate_recurrence(Recurrence(freq="daily", interval=MAX_INTERVAL), "2024-03-01")
+
+
+def test_count_and_until_are_checked():
+    with pytest.raises(ValueError):
+        validate_recurrence(Recurrence(freq="weekly", count=0), "2024-03-01")
+    with pytest.raises(ValueError):
+        validate_recurrence(Recurrence(freq="weekly", until="2024-02-01"), "2024-03-01")
+    with pytest.raises(ValueError):
+        validate_recurrence(Recurrence(freq="weekly", until="2024-02-30"), "2024-03-01")
+
+
+@pytest.mark.parametrize("freq", ["DAILY", "WEEKLY", "MONTHLY", "YEARLY"])
+def test_expansion_stops_at_date_max(freq):
+    rrule = f"FREQ={freq};INTERVAL=10000000"
+    assert expand_dates(rrule, "", "2024-03-01", "2024-01-01", "9999-12-31") == ("2024-03-01",)
+    assert expand_dates(f"FREQ={freq};INTERVAL=1", "", "9999-12-01", "9999-01-01", "9999-12-31")[0] == "9999-12-01"
+
+
+def test_stored_series_with_huge_interval_does_not_break_reads(db):
+    db.create_event(Event(title="周会", date="2024-03-04", recurrence=Recurrence(freq="weekly")))
+    db.close()
+    conn = sqlite3.connect(db.db_path)
+    conn.execute("UPDATE recurring_events SET rrule = 'FREQ=DAILY;INTERVAL=10000000'")
+    conn.commit()
+    conn.close()
+
+    reopened = type(db)(db.db_path)
+    try:
+        events = reopened.get_events_in_range("2024-01-01", "9999-12-31")
+        assert [e.date for e in events] == ["2024-03-04"]
+        assert reopened.get_daily_counts("2024-03-01", "2024-03-31")
+    finally:
+        reopened.close()
@@ -0,0 +1,35 @@
+import pytest
+
+from Event import Event, Recurrence
+
+
+def weekly(db):
+    return db.create_event(Event(title="周会", date="2024-03-04", time="10:00",
+                                 recurrence=Recurrence(freq="weekly", count=4)))
+
+
+def test_occurrence_edit_applies_to_series(db):
+    series = weekly(db)
+    occurrence = db.get_events_in_range("2024-03-11", "2024-03-11")[0]
+    occurrence.title = "周例会"
+    db.update_event(occurrence)
+    events = db.get_events_in_range("2024-03-01", "2024-03-31")
+    assert [e.date for e in events] == ["2024-03-04", "2024-03-11", "2024-03-18", "2024-03-25"]
+    assert {e.title for e in events} == {"周例会"}
+    assert db.get_event_by_id(series.id).date == "2024-03-04"
+
+
+def test_occurrence_date_change_is_rejected(db):
+    weekly(db)
+    occurrence = db.get_events_in_range("2024-03-11", "2024-03-11")[0]
+    occurrence.date = "2024-03-12"
+    occurrence.title = "改期"
+    with pytest.raises(ValueError):
+        db.update_event(occurrence)
+    batch_occurrence = db.get_events_in_range("2024-03-18", "2024-03-18")[0]
+    batch_occurrence.date = "2024-03-19"
+    with pytest.raises(ValueError):
+        db.apply_batch(updates=[batch_occurrence])
+    events = db.get_events_in_range("2024-03-01", "2024-03-31")
+    assert [e.date for e in events] == ["2024-03-04", "2024-03-11", "2024-03-18", "2024-03-25"]
+    assert {e.title for e in events} == {"周会"}